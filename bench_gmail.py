@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Gmail Cleaner contra a Gmail API falsa (fake_gmail_server.py).
+
+Mede mensagens/segundo, latência p50/p99 das chamadas à API e pico de
+memória (RSS) dos caminhos de listagem, amostra e deleção do gmail_cleaner,
+e o tempo de inicialização até a primeira chamada à API (cenário startup).
+Cada cenário roda em um processo separado, com uma caixa sintética nova,
+para que o pico de memória de um não contamine o outro.
+
+Uso:
+    python bench_gmail.py --messages 100000 --latency 0.02
+    python bench_gmail.py --scenarios delete stream --workers 8 --output bench.json
+    python bench_gmail.py --baseline bench.json --max-regression 0.2
+    python bench_gmail.py --scenarios startup --startup-runs 10
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import contextlib
+import multiprocessing
+
+import gmail_transport
+
+SCENARIOS = ['startup', 'list', 'preview', 'delete', 'stream']
+
+# Processo novo que importa o gmail_cleaner, autentica e faz uma chamada à API
+STARTUP_SCRIPT = (
+    "import gmail_cleaner; "
+    "service = gmail_cleaner.authenticate_gmail(); "
+    "gmail_cleaner.execute_request(service.users().getProfile(userId='me'), 'getProfile')"
+)
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _serve(args, url_queue):
+    """
+    Processo do servidor falso (separado, para não disputar o GIL com o cliente).
+    """
+    import fake_gmail_server
+
+    api = fake_gmail_server.FakeGmailApi(
+        fake_gmail_server.FakeMailbox(args.messages),
+        latency=args.latency, jitter=args.jitter,
+        quota_per_second=args.quota, error_rate=args.error_rate
+    )
+    server, url = fake_gmail_server.start_fake_server(api)
+    url_queue.put(url)
+    while True:
+        time.sleep(3600)
+
+def measure_startup(url, runs):
+    """
+    Mede o tempo desde o início de um processo Python novo até a resposta
+    da primeira chamada à API (importações, credenciais e build do serviço).
+
+    Returns:
+        Tupla (mediana do tempo até a primeira chamada, mediana do tempo de um
+        interpretador vazio), em segundos
+    """
+    env = dict(os.environ, GMAIL_API_ROOT_URL=url)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def timed(command):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+        return _percentile(timings, 0.5)
+
+    return timed([sys.executable, '-c', STARTUP_SCRIPT]), timed([sys.executable, '-c', 'pass'])
+
+def run_scenario(args):
+    """
+    Executa um cenário contra um servidor falso iniciado em um processo auxiliar.
+
+    Returns:
+        Dicionário com as métricas do cenário (o RSS é apenas o do cliente)
+    """
+    import gmail_cleaner
+
+    url_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(args, url_queue), daemon=True)
+    server.start()
+    url = url_queue.get()
+
+    if args.scenario == 'startup':
+        first_call, interpreter = measure_startup(url, args.startup_runs)
+        server.terminate()
+        return {
+            'scenario': 'startup',
+            'workers': args.workers,
+            'messages': 0,
+            'seconds': round(first_call, 3),
+            'messages_per_second': 0.0,
+            'api_calls': 1,
+            'p50_ms': round(first_call * 1000, 2),
+            'p99_ms': round(first_call * 1000, 2),
+            'interpreter_ms': round(interpreter * 1000, 2),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        }
+
+    gmail_cleaner.API_ROOT_URL = url
+    gmail_cleaner.rate_limiter.units_per_second = args.client_quota
+    gmail_cleaner.configure_transport(args.transport, args.workers)
+
+    # Mede a latência de cada chamada à API feita pelo gmail_cleaner
+    latencies = []
+    execute_request = gmail_cleaner.execute_request
+
+    def timed_execute_request(*call_args, **call_kwargs):
+        start = time.perf_counter()
+        try:
+            return execute_request(*call_args, **call_kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    gmail_cleaner.execute_request = timed_execute_request
+
+    creds = gmail_cleaner.load_credentials()
+    service = gmail_cleaner.build_service(creds)
+    pool = gmail_cleaner.ServicePool(creds, args.workers) if args.workers > 1 else None
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    # Preparação (fora da medição)
+    message_ids = []
+    if args.scenario in ('preview', 'delete'):
+        with quiet:
+            messages = gmail_cleaner.search_messages(service, args.query, get_all=True)
+        message_ids = [msg['id'] for msg in messages]
+        if args.scenario == 'preview':
+            message_ids = message_ids[:args.preview_size]
+        latencies.clear()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.scenario == 'list':
+            processed = len(gmail_cleaner.search_messages(service, args.query, get_all=True, pool=pool))
+        elif args.scenario == 'preview':
+            processed = len(gmail_cleaner.fetch_message_details_batch(service, message_ids, pool=pool))
+        elif args.scenario == 'delete':
+            processed = gmail_cleaner.delete_messages(service, message_ids, pool=pool)
+        else:
+            processed, _ = gmail_cleaner.stream_delete_messages(
+                service, gmail_cleaner.build_service(creds), args.query, pool=pool
+            )
+    elapsed = time.perf_counter() - start
+    counters = gmail_cleaner.metrics.snapshot()['counters']
+
+    if pool:
+        pool.close()
+    server.terminate()
+
+    return {
+        'scenario': args.scenario,
+        'workers': args.workers,
+        'transport': args.transport,
+        'messages': processed,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(processed / elapsed, 1) if elapsed else 0.0,
+        'api_calls': len(latencies),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'connections_opened': counters.get('http_connections_opened', 0),
+        'connections_reused': counters.get('http_connections_reused', 0),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def _child_command(args, scenario, workers):
+    return [
+        sys.executable, os.path.abspath(__file__), '--child', scenario,
+        '--messages', str(args.messages), '--query', args.query,
+        '--latency', str(args.latency), '--jitter', str(args.jitter),
+        '--quota', str(args.quota), '--client-quota', str(args.client_quota),
+        '--error-rate', str(args.error_rate), '--preview-size', str(args.preview_size),
+        '--workers', str(workers), '--startup-runs', str(args.startup_runs),
+        '--transport', args.transport,
+    ]
+
+def compare_with_baseline(results, baseline_path, max_regression):
+    """
+    Compara mensagens/segundo (ou o tempo até a primeira chamada, no cenário
+    startup) com um resultado anterior.
+
+    Returns:
+        Lista de descrições das regressões encontradas
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = {(r['scenario'], r['workers']): r for r in json.load(baseline_file)}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['scenario'], result['workers']))
+        if previous and result['scenario'] == 'startup':
+            change = result['seconds'] / previous['seconds'] - 1 if previous['seconds'] else 0
+            if change > max_regression:
+                regressions.append(f"startup: {previous['p50_ms']} -> {result['p50_ms']} ms "
+                                   f"até a primeira chamada ({change:+.0%})")
+            continue
+        if not previous or not previous['messages_per_second']:
+            continue
+        change = result['messages_per_second'] / previous['messages_per_second'] - 1
+        if change < -max_regression:
+            regressions.append(f"{result['scenario']} (workers={result['workers']}): "
+                               f"{previous['messages_per_second']} -> {result['messages_per_second']} msg/s "
+                               f"({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do Gmail Cleaner contra a Gmail API falsa')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--messages', type=int, default=20_000, help='Tamanho da caixa sintética')
+    parser.add_argument('--query', default='', help='Query usada na listagem')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latência por requisição do servidor (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latência aleatória adicional máxima (s)')
+    parser.add_argument('--quota', type=int, default=0, help='Quota do servidor em unidades/s (0 = ilimitado)')
+    parser.add_argument('--client-quota', type=int, default=1_000_000,
+                        help='Limite de quota do cliente em unidades/s (padrão: praticamente ilimitado)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de requisições que falham com 503')
+    parser.add_argument('--preview-size', type=int, default=1000, help='Mensagens no cenário preview')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='Números de workers a medir')
+    parser.add_argument('--transport', choices=gmail_transport.TRANSPORTS, default=gmail_transport.DEFAULT_TRANSPORT,
+                        help='Transporte HTTP do cliente (ver gmail_cleaner.py --transport)')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='Execuções do cenário startup (é usada a mediana)')
+    parser.add_argument('--output', help='Arquivo JSON onde gravar os resultados')
+    parser.add_argument('--baseline', help='Arquivo JSON de uma execução anterior para comparação')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Queda máxima aceitável de mensagens/segundo em relação ao baseline (padrão: 0.2)')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.scenario = args.child
+        args.workers = args.workers[0]
+        print(json.dumps(run_scenario(args)))
+        return
+
+    print(f"🏁 Benchmark: {args.messages} mensagens, latência {args.latency * 1000:.0f}ms")
+    print(f"{'cenário':<10} {'workers':>7} {'msgs':>9} {'seg':>8} {'msg/s':>10} "
+          f"{'chamadas':>9} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    results = []
+    for scenario in args.scenarios:
+        for workers in ([1] if scenario == 'startup' else args.workers):
+            output = subprocess.run(_child_command(args, scenario, workers),
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{scenario:<10} {workers:>7} {result['messages']:>9} {result['seconds']:>8} "
+                  f"{result['messages_per_second']:>10} {result['api_calls']:>9} "
+                  f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['peak_rss_mb']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"💾 Resultados gravados em {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print("❌ Regressões de desempenho:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print("✅ Sem regressões em relação ao baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP local que imita a Gmail API, para benchmarks e testes offline.
+
+Implementa messages.list/get/trash/untrash/modify/delete/batchModify/batchDelete,
+threads.list/get/trash/untrash/modify, labels.list/get, history.list,
+getProfile e o endpoint de requisições batch (multipart), sobre uma caixa
+sintética que pode ter milhões de mensagens (os dados de cada mensagem são
+derivados do seu índice; apenas as alterações ficam em memória).
+
+Latência, limite de quota e injeção de erros são configuráveis. Como a API
+real, aplica o parâmetro fields (máscara de campos) e compacta as respostas
+com gzip quando o cliente envia Accept-Encoding e User-Agent com "gzip".
+
+Uso:
+    python fake_gmail_server.py --messages 1000000 --latency 0.05 --quota 250
+    GMAIL_API_ROOT_URL=http://127.0.0.1:8080/ python gmail_cleaner.py --test
+"""
+
+import re
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+from email.parser import Parser
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from gmail_cleaner import QUOTA_UNITS
+
+# Labels de sistema e os termos de busca que os selecionam
+SYSTEM_LABELS = {
+    'INBOX': 'in:inbox', 'SENT': 'in:sent', 'DRAFT': 'in:drafts', 'SPAM': 'in:spam', 'TRASH': 'in:trash',
+    'UNREAD': 'is:unread', 'STARRED': 'is:starred', 'IMPORTANT': 'is:important',
+    'CATEGORY_PERSONAL': 'category:primary', 'CATEGORY_SOCIAL': 'category:social',
+    'CATEGORY_PROMOTIONS': 'category:promotions', 'CATEGORY_UPDATES': 'category:updates',
+    'CATEGORY_FORUMS': 'category:forums',
+}
+
+# internalDate da mensagem de índice 0 (ms) e intervalo entre mensagens
+BASE_INTERNAL_DATE = 1_600_000_000_000
+MESSAGE_INTERVAL_MS = 60_000
+
+def parse_field_mask(fields):
+    """
+    Interpreta uma máscara de campos da API do Google.
+
+    Ex: 'messages(id,threadId),nextPageToken,payload/headers' ->
+    {'messages': {'id': {}, 'threadId': {}}, 'nextPageToken': {}, 'payload': {'headers': {}}}
+    """
+    position = 0
+
+    def parse_selection():
+        nonlocal position
+        tree = {}
+        while position < len(fields) and fields[position] != ')':
+            parse_path(tree)
+            if position < len(fields) and fields[position] == ',':
+                position += 1
+        return tree
+
+    def parse_path(tree):
+        nonlocal position
+        start = position
+        while position < len(fields) and fields[position] not in ',/()':
+            position += 1
+        node = tree.setdefault(fields[start:position].strip(), {})
+        if position < len(fields) and fields[position] == '/':
+            position += 1
+            parse_path(node)
+        elif position < len(fields) and fields[position] == '(':
+            position += 1
+            node.update(parse_selection())
+            position += 1
+
+    return parse_selection()
+
+def apply_field_mask(value, tree):
+    """Mantém em value apenas os campos selecionados pela máscara."""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [apply_field_mask(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {name: apply_field_mask(value[name], subtree) for name, subtree in tree.items() if name in value}
+    return value
+
+class FakeApiError(Exception):
+    """Erro a ser devolvido ao cliente no formato da Gmail API."""
+
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.message = message
+
+    def body(self):
+        return {'error': {'code': self.status, 'message': self.message,
+                          'errors': [{'reason': self.reason, 'message': self.message}]}}
+
+class FakeMailbox:
+    """
+    Caixa de correio sintética. A mensagem de índice i tem ID f'{i:016x}'.
+    """
+
+    def __init__(self, size, senders=1000, domains=50, thread_size=4):
+        self.size = size
+        self.senders = senders
+        self.domains = domains
+        self.thread_size = thread_size
+        self.trashed = set()
+        self.deleted = set()
+        self.label_changes = {}
+        self.history_id = 1000
+        self.min_history_id = 1000
+        self.history = []
+        self.lock = threading.Lock()
+
+    # Dados sintéticos -------------------------------------------------------
+
+    @staticmethod
+    def message_id(index):
+        return f'{index:016x}'
+
+    def index_of(self, message_id):
+        try:
+            index = int(message_id, 16)
+        except ValueError:
+            index = -1
+        if index < 0 or index >= self.size or index in self.deleted:
+            raise FakeApiError(404, 'notFound', 'Requested entity was not found.')
+        return index
+
+    def sender(self, index):
+        number = index % self.senders
+        return f'Sender {number} <sender{number}@domain{number % self.domains}.example>'
+
+    def thread_id(self, index):
+        return self.message_id(index - index % self.thread_size)
+
+    def internal_date(self, index):
+        return BASE_INTERNAL_DATE + index * MESSAGE_INTERVAL_MS
+
+    def labels(self, index):
+        labels = {'INBOX'} if index % 2 == 0 else {'CATEGORY_PROMOTIONS'}
+        if index % 3 == 0:
+            labels.add('UNREAD')
+        added, removed = self.label_changes.get(index, ((), ()))
+        labels = (labels | set(added)) - set(removed)
+        if index in self.trashed:
+            labels.add('TRASH')
+        return sorted(labels)
+
+    def message(self, index):
+        date = datetime.fromtimestamp(self.internal_date(index) / 1000)
+        return {
+            'id': self.message_id(index),
+            'threadId': self.thread_id(index),
+            'labelIds': self.labels(index),
+            'snippet': f'Mensagem sintética número {index}',
+            'sizeEstimate': 2000 + (index * 7919) % 200_000,
+            'historyId': str(self.min_history_id),
+            'internalDate': str(self.internal_date(index)),
+            'payload': {'headers': [
+                {'name': 'From', 'value': self.sender(index)},
+                {'name': 'Subject', 'value': f'Assunto {index % 97}'},
+                {'name': 'Date', 'value': date.strftime('%a, %d %b %Y %H:%M:%S +0000')},
+            ]},
+        }
+
+    # Busca ------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_date(value):
+        if value.isdigit():
+            return int(value) * 1000
+        return int(datetime.strptime(value, '%Y/%m/%d').timestamp() * 1000)
+
+    def date_window(self, query):
+        """
+        Faixa de índices (primeiro, último) permitida pelos termos after: e
+        before: da query; as mensagens estão em ordem de data.
+        """
+        first, last = 0, self.size - 1
+        for term in re.sub(r'[()]', ' ', query or '').split():
+            key, _, value = term.partition(':')
+            if key.lower() == 'after':
+                offset = (self._parse_date(value) - BASE_INTERNAL_DATE) // MESSAGE_INTERVAL_MS + 1
+                first = max(first, offset)
+            elif key.lower() == 'before':
+                offset = -((BASE_INTERNAL_DATE - self._parse_date(value)) // MESSAGE_INTERVAL_MS) - 1
+                last = min(last, offset)
+        return first, last
+
+    def compile_query(self, query):
+        """
+        Converte a query em um predicado sobre o índice da mensagem.
+
+        Suporta from:, after:, before:, label:, os termos de labels de sistema
+        (in:inbox, is:unread, category:promotions...), in:trash e in:anywhere;
+        os demais termos são ignorados.
+        """
+        label_terms = {term: label for label, term in SYSTEM_LABELS.items() if label != 'TRASH'}
+        checks = []
+        include_trash = False
+        only_trash = False
+        for term in re.sub(r'[()]', ' ', query or '').split():
+            key, _, value = term.partition(':')
+            key = key.lower()
+            if term.lower() in label_terms:
+                checks.append(lambda i, v=label_terms[term.lower()]: v in self.labels(i))
+            elif key == 'from':
+                checks.append(lambda i, v=value.lower(): v in self.sender(i).lower())
+            elif key == 'after':
+                checks.append(lambda i, v=self._parse_date(value): self.internal_date(i) > v)
+            elif key == 'before':
+                checks.append(lambda i, v=self._parse_date(value): self.internal_date(i) < v)
+            elif key == 'label':
+                checks.append(lambda i, v=value.upper(): v in self.labels(i))
+            elif key == 'in' and value.lower() == 'trash':
+                only_trash = True
+            elif key == 'in' and value.lower() == 'anywhere':
+                include_trash = True
+
+        def matches(index):
+            if index in self.deleted:
+                return False
+            trashed = index in self.trashed
+            if only_trash and not trashed:
+                return False
+            if trashed and not (only_trash or include_trash):
+                return False
+            return all(check(index) for check in checks)
+
+        return matches
+
+    def list_messages(self, query, max_results, page_token, include_spam_trash=False):
+        """
+        Lista do mais novo para o mais antigo. O pageToken é um cursor pelo
+        índice, por isso não pula mensagens quando outras são removidas.
+
+        Como no Gmail, resultSizeEstimate é aproximado: considera apenas a
+        janela de datas da query.
+        """
+        if include_spam_trash:
+            query = f'{query} in:anywhere'
+        matches = self.compile_query(query)
+        first, last = self.date_window(query)
+        cursor = min(int(page_token) if page_token else self.size - 1, last)
+        found = []
+        while cursor >= first and len(found) < max_results:
+            if matches(cursor):
+                found.append(cursor)
+            cursor -= 1
+        result = {
+            'messages': [{'id': self.message_id(i), 'threadId': self.thread_id(i)} for i in found],
+            'resultSizeEstimate': max(len(found), min(last - first + 1,
+                                                      self.size - len(self.deleted) - len(self.trashed))),
+        }
+        if cursor >= first:
+            result['nextPageToken'] = str(cursor)
+        if not found:
+            del result['messages']
+        return result
+
+    def thread_indexes(self, thread_id):
+        """Índices das mensagens (não removidas) de uma conversa."""
+        start = self.index_of(thread_id)
+        if start % self.thread_size:
+            raise FakeApiError(404, 'notFound', 'Requested entity was not found.')
+        return [index for index in range(start, min(start + self.thread_size, self.size))
+                if index not in self.deleted]
+
+    def thread(self, thread_id):
+        indexes = self.thread_indexes(thread_id)
+        return {'id': thread_id, 'historyId': str(self.history_id),
+                'messages': [self.message(index) for index in indexes]}
+
+    def list_threads(self, query, max_results, page_token, include_spam_trash=False):
+        """
+        Lista as conversas com alguma mensagem que combina com a query, da
+        mais nova para a mais antiga (cursor pelo índice, como em list_messages).
+        """
+        if include_spam_trash:
+            query = f'{query} in:anywhere'
+        matches = self.compile_query(query)
+        first, last = self.date_window(query)
+        cursor = min(int(page_token) if page_token else self.size - 1, last)
+        found = []
+        while cursor >= first and len(found) < max_results:
+            if matches(cursor):
+                found.append(cursor - cursor % self.thread_size)
+                cursor = found[-1]
+            cursor -= 1
+        result = {
+            'threads': [{'id': self.message_id(i), 'snippet': f'Mensagem sintética número {i}',
+                         'historyId': str(self.history_id)} for i in found],
+            'resultSizeEstimate': max(len(found), (last - first + 1) // self.thread_size),
+        }
+        if cursor >= first:
+            result['nextPageToken'] = str(cursor)
+        if not found:
+            del result['threads']
+        return result
+
+    def list_labels(self):
+        user_labels = {label for added, _ in self.label_changes.values() for label in added}
+        labels = [{'id': label, 'name': label, 'type': 'system'} for label in SYSTEM_LABELS]
+        labels += [{'id': label, 'name': label, 'type': 'user'} for label in sorted(user_labels - set(SYSTEM_LABELS))]
+        return {'labels': labels}
+
+    def get_label(self, label_id):
+        """Contadores do label, incluindo (como no Gmail) mensagens na Lixeira."""
+        if label_id not in SYSTEM_LABELS and not any(label_id in added for added, _ in self.label_changes.values()):
+            raise FakeApiError(404, 'notFound', 'Requested entity was not found.')
+        total = unread = 0
+        for index in range(self.size):
+            if index in self.deleted:
+                continue
+            labels = self.labels(index)
+            if label_id in labels:
+                total += 1
+                unread += 'UNREAD' in labels
+        return {'id': label_id, 'name': label_id, 'messagesTotal': total, 'messagesUnread': unread,
+                'threadsTotal': total // self.thread_size, 'threadsUnread': unread // self.thread_size}
+
+    # Alterações -------------------------------------------------------------
+
+    def _bump_history(self):
+        self.history_id += 1
+        return self.history_id
+
+    def modify(self, index, add_label_ids=(), remove_label_ids=()):
+        with self.lock:
+            if 'TRASH' in add_label_ids:
+                self.trashed.add(index)
+            if 'TRASH' in remove_label_ids:
+                self.trashed.discard(index)
+            added = set(add_label_ids) - {'TRASH'}
+            removed = set(remove_label_ids) - {'TRASH'}
+            if added or removed:
+                old_added, old_removed = self.label_changes.get(index, (set(), set()))
+                self.label_changes[index] = ((set(old_added) - removed) | added,
+                                             (set(old_removed) - added) | removed)
+            history_id = self._bump_history()
+            if add_label_ids:
+                self.history.append((history_id, index, 'labelsAdded'))
+            if remove_label_ids:
+                self.history.append((history_id, index, 'labelsRemoved'))
+
+    def delete(self, index):
+        with self.lock:
+            self.deleted.add(index)
+            self.trashed.discard(index)
+            self.label_changes.pop(index, None)
+            self._bump_history()
+
+    def add_messages(self, count):
+        """Simula a chegada de `count` novas mensagens."""
+        with self.lock:
+            for _ in range(count):
+                self.history.append((self._bump_history(), self.size, 'messagesAdded'))
+                self.size += 1
+
+    def list_history(self, start_history_id, max_results, page_token, history_types=None):
+        start_history_id = int(start_history_id)
+        if start_history_id < self.min_history_id:
+            raise FakeApiError(404, 'notFound', 'Requested entity was not found.')
+        offset = int(page_token) if page_token else 0
+        # historyTypes usa o singular (messageAdded); o registro, o plural (messagesAdded)
+        kinds = {f"{kind[:-5]}sAdded" if kind.endswith('Added') else f"{kind[:-7]}sRemoved"
+                 for kind in history_types or ()}
+        records = [(hid, index, kind) for hid, index, kind in self.history
+                   if hid > start_history_id and (not kinds or kind in kinds)]
+        page = records[offset:offset + max_results]
+        result = {'historyId': str(self.history_id)}
+        if page:
+            result['history'] = [
+                {'id': str(hid), kind: [{'message': {'id': self.message_id(index),
+                                                     'labelIds': self.labels(index)}}]}
+                for hid, index, kind in page
+            ]
+        if offset + max_results < len(records):
+            result['nextPageToken'] = str(offset + max_results)
+        return result
+
+class FakeGmailApi:
+    """
+    Roteamento das requisições REST para a FakeMailbox, com quota, latência e erros.
+    """
+
+    ROUTES = [
+        ('GET', r'profile', 'getProfile'),
+        ('GET', r'history', 'history.list'),
+        ('GET', r'labels', 'labels.list'),
+        ('GET', r'labels/(?P<id>[^/]+)', 'labels.get'),
+        ('GET', r'messages', 'messages.list'),
+        ('POST', r'messages/batchModify', 'messages.batchModify'),
+        ('POST', r'messages/batchDelete', 'messages.batchDelete'),
+        ('GET', r'messages/(?P<id>[^/]+)', 'messages.get'),
+        ('DELETE', r'messages/(?P<id>[^/]+)', 'messages.delete'),
+        ('POST', r'messages/(?P<id>[^/]+)/trash', 'messages.trash'),
+        ('POST', r'messages/(?P<id>[^/]+)/untrash', 'messages.untrash'),
+        ('POST', r'messages/(?P<id>[^/]+)/modify', 'messages.modify'),
+        ('GET', r'threads', 'threads.list'),
+        ('GET', r'threads/(?P<id>[^/]+)', 'threads.get'),
+        ('POST', r'threads/(?P<id>[^/]+)/trash', 'threads.trash'),
+        ('POST', r'threads/(?P<id>[^/]+)/untrash', 'threads.untrash'),
+        ('POST', r'threads/(?P<id>[^/]+)/modify', 'threads.modify'),
+    ]
+
+    def __init__(self, mailbox, latency=0.0, jitter=0.0, quota_per_second=0, error_rate=0.0):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_second = quota_per_second
+        self.error_rate = error_rate
+        self._tokens = float(quota_per_second)
+        self._last = time.monotonic()
+        self._quota_lock = threading.Lock()
+        self.request_count = 0
+        self._routes = [(verb, re.compile(rf'/gmail/v1/users/[^/]+/{pattern}$'), method)
+                        for verb, pattern, method in self.ROUTES]
+
+    def simulate_latency(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _charge_quota(self, method):
+        if not self.quota_per_second:
+            return
+        with self._quota_lock:
+            now = time.monotonic()
+            self._tokens = min(self.quota_per_second,
+                               self._tokens + (now - self._last) * self.quota_per_second)
+            self._last = now
+            cost = QUOTA_UNITS.get(method, 5)
+            if self._tokens < cost:
+                raise FakeApiError(429, 'rateLimitExceeded', 'Rate Limit Exceeded')
+            self._tokens -= cost
+
+    def handle(self, verb, path, query, body):
+        """
+        Processa uma requisição REST e retorna (status, corpo JSON ou None).
+        """
+        self.request_count += 1
+        try:
+            for route_verb, pattern, method in self._routes:
+                match = pattern.match(path)
+                if match and route_verb == verb:
+                    break
+            else:
+                raise FakeApiError(404, 'notFound', f'Not found: {verb} {path}')
+
+            self._charge_quota(method)
+            if self.error_rate and random.random() < self.error_rate:
+                raise FakeApiError(503, 'backendError', 'Backend Error')
+            payload = self._dispatch(method, match, query, body)
+            if payload is not None and 'fields' in query:
+                payload = apply_field_mask(payload, parse_field_mask(query['fields'][0]))
+            return 200, payload
+        except FakeApiError as error:
+            return error.status, error.body()
+
+    def _dispatch(self, method, match, query, body):
+        mailbox = self.mailbox
+        param = lambda name, default=None: query.get(name, [default])[0]
+
+        if method == 'getProfile':
+            return {'emailAddress': 'fake@example.com', 'messagesTotal': mailbox.size - len(mailbox.deleted),
+                    'threadsTotal': mailbox.size // mailbox.thread_size, 'historyId': str(mailbox.history_id)}
+        if method == 'history.list':
+            return mailbox.list_history(param('startHistoryId'), int(param('maxResults', 100)),
+                                        param('pageToken'), query.get('historyTypes'))
+        if method == 'labels.list':
+            return mailbox.list_labels()
+        if method == 'labels.get':
+            return mailbox.get_label(match.group('id'))
+        if method == 'messages.list':
+            return mailbox.list_messages(param('q', ''), min(int(param('maxResults', 100)), 500),
+                                         param('pageToken'), param('includeSpamTrash') == 'true')
+        if method == 'threads.list':
+            return mailbox.list_threads(param('q', ''), min(int(param('maxResults', 100)), 500),
+                                        param('pageToken'), param('includeSpamTrash') == 'true')
+        if method.startswith('threads.'):
+            thread_id = match.group('id')
+            for index in mailbox.thread_indexes(thread_id):
+                if method == 'threads.trash':
+                    mailbox.modify(index, ['TRASH'])
+                elif method == 'threads.untrash':
+                    mailbox.modify(index, (), ['TRASH'])
+                elif method == 'threads.modify':
+                    mailbox.modify(index, body.get('addLabelIds', []), body.get('removeLabelIds', []))
+            thread = mailbox.thread(thread_id)
+            if method == 'threads.get' and param('format') == 'metadata' and 'metadataHeaders' in query:
+                wanted = {name.lower() for name in query['metadataHeaders']}
+                for message in thread['messages']:
+                    message['payload']['headers'] = [h for h in message['payload']['headers']
+                                                      if h['name'].lower() in wanted]
+            return thread
+        if method == 'messages.batchModify':
+            indexes = [mailbox.index_of(message_id) for message_id in body.get('ids', [])]
+            if len(indexes) > 1000:
+                raise FakeApiError(400, 'invalidArgument', 'Too many ids')
+            for index in indexes:
+                mailbox.modify(index, body.get('addLabelIds', []), body.get('removeLabelIds', []))
+            return None
+        if method == 'messages.batchDelete':
+            indexes = [mailbox.index_of(message_id) for message_id in body.get('ids', [])]
+            if len(indexes) > 1000:
+                raise FakeApiError(400, 'invalidArgument', 'Too many ids')
+            for index in indexes:
+                mailbox.delete(index)
+            return None
+
+        index = mailbox.index_of(match.group('id'))
+        if method == 'messages.get':
+            message = mailbox.message(index)
+            if param('format') == 'minimal':
+                del message['payload']
+            elif param('format') == 'metadata' and 'metadataHeaders' in query:
+                wanted = {name.lower() for name in query['metadataHeaders']}
+                message['payload']['headers'] = [h for h in message['payload']['headers']
+                                                  if h['name'].lower() in wanted]
+            return message
+        if method == 'messages.delete':
+            mailbox.delete(index)
+            return None
+        if method == 'messages.trash':
+            mailbox.modify(index, ['TRASH'])
+        elif method == 'messages.untrash':
+            mailbox.modify(index, (), ['TRASH'])
+        elif method == 'messages.modify':
+            mailbox.modify(index, body.get('addLabelIds', []), body.get('removeLabelIds', []))
+        return mailbox.message(index)
+
+    def handle_batch(self, content_type, raw_body):
+        """
+        Processa uma requisição batch multipart/mixed e retorna (content-type, corpo).
+        """
+        envelope = Parser().parsestr(f'Content-Type: {content_type}\r\n\r\n' + raw_body.decode('utf-8'))
+        boundary = 'batch_' + format(random.getrandbits(64), 'x')
+        parts = []
+        for part in envelope.get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            verb, target, _ = request_line.strip().split(' ', 2)
+            head, _, body = rest.replace('\r\n', '\n').partition('\n\n')
+            url = urlsplit(target)
+            status, payload = self.handle(verb, url.path, parse_qs(url.query), json.loads(body) if body.strip() else {})
+            content = json.dumps(payload) if payload is not None else ''
+            content_id = (part['Content-ID'] or '').strip('<>')
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status < 300 else "Error"}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n'
+                f'Content-Length: {len(content.encode())}\r\n\r\n{content}\r\n'
+            )
+        body = ''.join(parts) + f'--{boundary}--\r\n'
+        return f'multipart/mixed; boundary={boundary}', body.encode('utf-8')
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json; charset=UTF-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        # Como o Google: gzip apenas com Accept-Encoding e User-Agent contendo "gzip"
+        if body and 'gzip' in self.headers.get('Accept-Encoding', '') \
+                and 'gzip' in self.headers.get('User-Agent', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, verb):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        url = urlsplit(self.path)
+        self.api.simulate_latency()
+
+        if url.path == '/batch' or url.path.startswith('/batch/'):
+            content_type, body = self.api.handle_batch(self.headers['Content-Type'], raw_body)
+            self._send(200, body, content_type)
+            return
+        if url.path == '/_admin/add_messages':
+            self.api.mailbox.add_messages(int(parse_qs(url.query).get('count', ['1'])[0]))
+            self._send(200, b'{}')
+            return
+
+        status, payload = self.api.handle(verb, url.path, parse_qs(url.query),
+                                          json.loads(raw_body) if raw_body.strip() else {})
+        if payload is None:
+            self._send(204, b'')
+        else:
+            self._send(status, json.dumps(payload).encode('utf-8'))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+def start_fake_server(api, host='127.0.0.1', port=0):
+    """
+    Inicia o servidor em uma thread daemon.
+
+    Returns:
+        Tupla (servidor, URL raiz a usar em GMAIL_API_ROOT_URL)
+    """
+    handler = type('FakeGmailHandler', (_Handler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/'
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local que imita a Gmail API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--messages', type=int, default=100_000, help='Tamanho da caixa sintética')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latência fixa por requisição (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latência aleatória adicional máxima (s)')
+    parser.add_argument('--quota', type=int, default=0, help='Unidades de quota por segundo (0 = ilimitado)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de requisições que falham com 503')
+    args = parser.parse_args()
+
+    api = FakeGmailApi(FakeMailbox(args.messages), latency=args.latency, jitter=args.jitter,
+                       quota_per_second=args.quota, error_rate=args.error_rate)
+    server, url = start_fake_server(api, args.host, args.port)
+    print(f"🧪 Gmail API falsa em {url} ({args.messages} mensagens)")
+    print(f"   Use: GMAIL_API_ROOT_URL={url} python gmail_cleaner.py --test")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
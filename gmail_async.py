@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+API assíncrona (asyncio) do Gmail Cleaner para uso embutido em serviços async.
+
+Executa muitas requisições REST da Gmail API em paralelo em um único event
+loop, com limite de concorrência configurável, usando as mesmas credenciais
+de authenticate_gmail e o mesmo limitador de quota do gmail_cleaner.
+
+Requer o pacote opcional aiohttp (pip install aiohttp).
+
+Exemplo:
+    async with AsyncGmailCleaner(concurrency=100) as gmail:
+        ids = await gmail.search('from:newsletter@exemplo.com')
+        details = await gmail.fetch_details(ids[:50])
+        trashed, failed = await gmail.trash(ids)
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from google.auth.transport.requests import Request
+
+from gmail_cleaner import (
+    API_ROOT_URL, BATCH_MODIFY_MAX_IDS, LIST_PAGE_SIZE, MAX_RETRIES, METADATA_HEADERS, QUOTA_UNITS,
+    LIST_FIELDS, DETAILS_FIELDS,
+    rate_limiter, load_credentials, _backoff_delay, _is_retryable_status, _parse_message_details
+)
+from gmail_metrics import metrics
+from gmail_auth import CredentialManager
+
+# Endereço base da Gmail API REST
+GMAIL_API_URL = (API_ROOT_URL or 'https://gmail.googleapis.com/') + 'gmail/v1'
+
+# Número padrão de requisições simultâneas
+DEFAULT_CONCURRENCY = 50
+
+class AsyncGmailError(Exception):
+    """Erro retornado pela Gmail API em uma requisição assíncrona."""
+
+    def __init__(self, status, content):
+        super().__init__(f"HTTP {status}: {content[:200]}")
+        self.status = status
+        self.content = content
+
+class AsyncGmailCleaner:
+    """
+    Motor assíncrono de busca, detalhes, contagem e deleção de mensagens.
+    """
+
+    def __init__(self, creds=None, concurrency=DEFAULT_CONCURRENCY, user_id='me',
+                 base_url=GMAIL_API_URL, max_retries=MAX_RETRIES):
+        if aiohttp is None:
+            raise RuntimeError("O modo assíncrono requer o pacote aiohttp: pip install aiohttp")
+        self.creds = creds
+        self.concurrency = concurrency
+        self.user_id = user_id
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._refresh_lock = asyncio.Lock()
+        self._session = None
+        self._credential_manager = None
+
+    async def __aenter__(self):
+        if self.creds is None:
+            loop = asyncio.get_running_loop()
+            creds = await loop.run_in_executor(None, load_credentials)
+            if creds is None:
+                raise RuntimeError("Falha na autenticação. Verifique suas credenciais.")
+            # Renovação antecipada em segundo plano: as tarefas raramente recebem 401
+            self._credential_manager = CredentialManager(creds).start()
+            self.creds = self._credential_manager.credentials()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        if self._credential_manager:
+            self._credential_manager.stop()
+
+    async def _token(self, force_refresh=False):
+        """Retorna um access token válido, renovando-o (uma vez para todas as tarefas) se preciso."""
+        if self.creds.valid and not force_refresh:
+            return self.creds.token
+        async with self._refresh_lock:
+            if not self.creds.valid or force_refresh:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.creds.refresh, Request())
+        return self.creds.token
+
+    async def _request(self, method, http_method, path, params=None, body=None):
+        """
+        Executa uma requisição REST respeitando quota, concorrência e backoff.
+        """
+        url = f"{self.base_url}/users/{self.user_id}/{path}"
+        units = QUOTA_UNITS.get(method, 5)
+        force_refresh = False
+
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(rate_limiter.reserve(units))
+            headers = {'Authorization': f"Bearer {await self._token(force_refresh)}",
+                       'Accept-Encoding': 'gzip', 'User-Agent': 'gmail-cleaner-async (gzip)'}
+            force_refresh = False
+
+            async with self._semaphore:
+                start = time.perf_counter()
+                async with self._session.request(http_method, url, params=params,
+                                                 json=body, headers=headers) as response:
+                    content = await response.read()
+                metrics.record_call(method, time.perf_counter() - start, units, error=response.status >= 300)
+                metrics.record_http(method, response.status, 0, len(content))
+                if response.status < 300:
+                    return json.loads(content) if content else {}
+                content = content.decode('utf-8', 'replace')
+
+            if response.status == 401 and attempt < self.max_retries:
+                force_refresh = True
+                continue
+            if not _is_retryable_status(response.status, content) or attempt == self.max_retries:
+                raise AsyncGmailError(response.status, content)
+            delay = _backoff_delay(attempt)
+            metrics.record_retry(method, delay)
+            rate_limiter.pause(delay)
+
+    async def iter_search(self, query, max_results=None, fields=LIST_FIELDS):
+        """
+        Gera as páginas de IDs que combinam com a query.
+        """
+        page_token = None
+        returned = 0
+        while True:
+            params = {'q': query, 'maxResults': LIST_PAGE_SIZE}
+            if page_token:
+                params['pageToken'] = page_token
+            if fields:
+                params['fields'] = fields
+            results = await self._request('messages.list', 'GET', 'messages', params=params)
+
+            message_ids = [msg['id'] for msg in results.get('messages', [])]
+            if max_results is not None:
+                message_ids = message_ids[:max_results - returned]
+            returned += len(message_ids)
+            yield message_ids
+
+            page_token = results.get('nextPageToken')
+            if not page_token or (max_results is not None and returned >= max_results):
+                break
+
+    async def search(self, query, max_results=None):
+        """
+        Retorna a lista de IDs das mensagens que combinam com a query.
+        """
+        message_ids = []
+        async for page in self.iter_search(query, max_results):
+            message_ids.extend(page)
+        return message_ids
+
+    async def count(self, query):
+        """
+        Conta exatamente as mensagens que combinam com a query (sem guardar os IDs).
+        """
+        total = 0
+        async for page in self.iter_search(query):
+            total += len(page)
+        return total
+
+    async def _get_details(self, message_id):
+        params = [('format', 'metadata'), ('fields', DETAILS_FIELDS)] + \
+            [('metadataHeaders', header) for header in METADATA_HEADERS]
+        message = await self._request('messages.get', 'GET', f'messages/{message_id}', params=params)
+        return _parse_message_details(message)
+
+    async def fetch_details(self, message_ids):
+        """
+        Obtém os detalhes das mensagens com requisições simultâneas.
+
+        Returns:
+            Dicionário {id da mensagem: detalhes}; mensagens com erro são omitidas
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        results = await asyncio.gather(
+            *(self._get_details(message_id) for message_id in message_ids),
+            return_exceptions=True
+        )
+        details = {}
+        for message_id, result in zip(message_ids, results):
+            if isinstance(result, Exception):
+                print(f"❌ Erro ao obter detalhes da mensagem {message_id}: {result}")
+            else:
+                details[message_id] = result
+        return details
+
+    async def _trash_chunk(self, chunk):
+        try:
+            await self._request('messages.batchModify', 'POST', 'messages/batchModify',
+                                body={'ids': chunk, 'addLabelIds': ['TRASH'], 'removeLabelIds': []})
+            return len(chunk), []
+        except AsyncGmailError as error:
+            # Erros de permissão, cota ou do servidor (após as novas tentativas) valem para
+            # todo o lote: tentar mensagem a mensagem só multiplicaria as chamadas recusadas
+            if error.status not in (400, 404):
+                return 0, list(chunk)
+
+        # Fallback: processa individualmente apenas o lote com IDs inválidos (400/404)
+        results = await asyncio.gather(
+            *(self._request('messages.trash', 'POST', f'messages/{message_id}/trash') for message_id in chunk),
+            return_exceptions=True
+        )
+        failed_ids = [message_id for message_id, result in zip(chunk, results) if isinstance(result, Exception)]
+        return len(chunk) - len(failed_ids), failed_ids
+
+    async def trash(self, message_ids):
+        """
+        Move as mensagens para a Lixeira com batchModify (até 1000 IDs por chamada).
+
+        Returns:
+            Tupla (número de mensagens movidas, lista de IDs com falha)
+        """
+        chunks = [message_ids[i:i + BATCH_MODIFY_MAX_IDS]
+                  for i in range(0, len(message_ids), BATCH_MODIFY_MAX_IDS)]
+        results = await asyncio.gather(*(self._trash_chunk(chunk) for chunk in chunks))
+        trashed_count = sum(ok for ok, _ in results)
+        failed_ids = [message_id for _, failed in results for message_id in failed]
+        return trashed_count, failed_ids
+
+async def _main(args):
+    async with AsyncGmailCleaner(concurrency=args.concurrency) as gmail:
+        if args.count:
+            total = await gmail.count(args.filter)
+            print(f"📊 Total exato de mensagens: {total}")
+            return
+
+        message_ids = await gmail.search(args.filter, args.max_results)
+        details = await gmail.fetch_details(message_ids)
+        print(f"📧 Encontradas {len(message_ids)} mensagens")
+        for message_id in message_ids:
+            if message_id in details:
+                print(f"   {details[message_id]['subject']} - {details[message_id]['from']}")
+
+def main():
+    """
+    Demonstração do motor assíncrono pela linha de comando.
+    """
+    parser = argparse.ArgumentParser(description='Busca e contagem assíncronas no Gmail')
+    parser.add_argument('filter', nargs='?', default='', help='Filtro de busca Gmail')
+    parser.add_argument('--max-results', type=int, default=50,
+                        help='Número máximo de mensagens para buscar (padrão: 50)')
+    parser.add_argument('--count', action='store_true', help='Apenas contar as mensagens que combinam com o filtro')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Número de requisições simultâneas (padrão: {DEFAULT_CONCURRENCY})')
+    asyncio.run(_main(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Credenciais do Gmail Cleaner: token salvo em JSON e renovação antecipada.
+
+O token é gravado em token.json (no lugar do antigo token.pickle) com
+escrita atômica e um lock de arquivo, para que vários processos possam
+compartilhá-lo. O CredentialManager renova o access token em segundo plano
+antes de ele expirar e entrega a todas as threads o mesmo token, evitando
+que cada requisição em andamento receba 401 e renove o token ao mesmo tempo.
+"""
+
+import os
+import time
+import pickle
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from google.auth import credentials as google_credentials
+
+# Arquivo do token OAuth do usuário
+TOKEN_PATH = 'token.json'
+
+# Arquivo do token no formato antigo (migrado automaticamente)
+LEGACY_TOKEN_PATH = 'token.pickle'
+
+# Antecedência (em segundos) com que o access token é renovado antes de expirar
+REFRESH_MARGIN_SECONDS = 300
+
+# Intervalo mínimo (em segundos) entre renovações provocadas por respostas 401
+MIN_FORCED_REFRESH_INTERVAL = 30
+
+@contextlib.contextmanager
+def _token_file_lock(token_path):
+    """Lock exclusivo entre processos para ler/renovar/gravar o token."""
+    if fcntl is None or not token_path:
+        yield
+        return
+    with open(f'{token_path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def read_token(token_path, scopes=None):
+    """
+    Lê as credenciais OAuth gravadas em JSON.
+
+    Returns:
+        Credenciais, ou None se o arquivo não existir
+    """
+    if not token_path or not os.path.exists(token_path):
+        return None
+    from google.oauth2.credentials import Credentials
+    return Credentials.from_authorized_user_file(token_path, scopes)
+
+def write_token(creds, token_path):
+    """
+    Grava as credenciais em JSON de forma atômica (arquivo temporário + rename).
+    """
+    temp_path = f'{token_path}.{os.getpid()}.tmp'
+    with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as token:
+        token.write(creds.to_json())
+    os.replace(temp_path, token_path)
+
+def load_saved_credentials(scopes, token_path=TOKEN_PATH, legacy_path=LEGACY_TOKEN_PATH):
+    """
+    Carrega o token salvo, migrando o token.pickle antigo para JSON.
+
+    O token.pickle é usado quando não há token.json ou quando é mais novo
+    (ex: gravado por fix_permissions.py após uma nova autenticação).
+
+    Returns:
+        Credenciais salvas, ou None se não houver token
+    """
+    with _token_file_lock(token_path):
+        if legacy_path and os.path.exists(legacy_path) and (
+                not os.path.exists(token_path)
+                or os.path.getmtime(legacy_path) > os.path.getmtime(token_path)):
+            with open(legacy_path, 'rb') as token:
+                creds = pickle.load(token)
+            write_token(creds, token_path)
+            print(f"🔁 Token migrado de {legacy_path} para {token_path}")
+            return creds
+        return read_token(token_path, scopes)
+
+def _seconds_to_expiry(creds):
+    if not creds.expiry:
+        return None
+    # google-auth usa datetimes UTC sem fuso horário
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+class CredentialManager:
+    """
+    Mantém um único access token válido para todas as threads do processo.
+
+    Uma thread em segundo plano renova o token REFRESH_MARGIN_SECONDS antes
+    de expirar; as renovações são feitas sob um lock (e sob o lock do arquivo
+    de token, quando há um), de modo que apenas uma thread renova por vez.
+    """
+
+    def __init__(self, creds, token_path=TOKEN_PATH, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self.creds = creds
+        self.token_path = token_path
+        self.refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_forced_refresh = None
+
+    @property
+    def refreshable(self):
+        """Se as credenciais expiram e podem ser renovadas (credenciais anônimas não)."""
+        return self.creds.expiry is not None or not self.creds.valid
+
+    def _needs_refresh(self):
+        if not self.creds.valid:
+            return True
+        remaining = _seconds_to_expiry(self.creds)
+        return remaining is not None and remaining <= self.refresh_margin
+
+    def refresh(self, force=False):
+        """
+        Renova o access token se estiver perto de expirar (ou sempre, com force).
+
+        Antes de chamar o servidor OAuth, relê o arquivo de token: se outro
+        processo já o renovou, apenas adota o token gravado.
+
+        Returns:
+            True se o token foi renovado ou substituído
+        """
+        with self._lock:
+            if not self.refreshable or not (force or self._needs_refresh()):
+                return False
+            with _token_file_lock(self.token_path):
+                saved = read_token(self.token_path) if self.token_path else None
+                remaining = _seconds_to_expiry(saved) if saved else None
+                if (saved and saved.token and saved.token != self.creds.token
+                        and remaining is not None and remaining > self.refresh_margin):
+                    self.creds.token = saved.token
+                    self.creds.expiry = saved.expiry
+                else:
+                    from google.auth.transport.requests import Request
+                    self.creds.refresh(Request())
+                    if self.token_path:
+                        write_token(self.creds, self.token_path)
+            return True
+
+    def refresh_after_unauthorized(self, stale_token=None):
+        """
+        Renova o token após uma resposta 401, uma única vez para todas as threads.
+
+        stale_token é o token com que a requisição recusada foi enviada: se o
+        token atual já é outro (outra thread ou a renovação em segundo plano
+        já o trocou), não renova de novo. Renovações forçadas seguidas (ex:
+        um token novo também recusado) respeitam MIN_FORCED_REFRESH_INTERVAL.
+        """
+        with self._lock:
+            if stale_token is not None and self.creds.token != stale_token:
+                return
+            if self._last_forced_refresh is not None and \
+                    time.monotonic() - self._last_forced_refresh < MIN_FORCED_REFRESH_INTERVAL:
+                return
+            self.refresh(force=True)
+            self._last_forced_refresh = time.monotonic()
+
+    def _run(self):
+        while True:
+            remaining = _seconds_to_expiry(self.creds)
+            wait = 60 if remaining is None else max(5, remaining - self.refresh_margin)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.refresh()
+            except Exception as error:
+                print(f"⚠️  Falha ao renovar o token em segundo plano: {error}")
+
+    def start(self):
+        """Inicia a renovação em segundo plano (não faz nada para credenciais que não expiram)."""
+        if self.refreshable and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='gmail-token-refresh', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def credentials(self):
+        """Retorna credenciais que sempre usam o token atual deste gerenciador."""
+        return SharedCredentials(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class SharedCredentials(google_credentials.Credentials):
+    """
+    Credenciais entregues aos serviços e workers: leem o token do
+    CredentialManager e delegam a ele as renovações.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+        # Token aplicado à última requisição de cada thread (o que um 401 recusou)
+        self._applied = threading.local()
+        super().__init__()
+
+    @property
+    def token(self):
+        return self._manager.creds.token
+
+    @token.setter
+    def token(self, value):
+        pass
+
+    @property
+    def expiry(self):
+        return self._manager.creds.expiry
+
+    @expiry.setter
+    def expiry(self, value):
+        pass
+
+    def apply(self, headers, token=None):
+        self._applied.token = token or self._manager.creds.token
+        self._manager.creds.apply(headers, token)
+
+    def refresh(self, request):
+        if self._manager.creds.valid and not self._manager.refreshable:
+            return
+        self._manager.refresh_after_unauthorized(getattr(self._applied, 'token', None))
@@ -4,33 +4,288 @@ Script para conectar ao Gmail via OAuth e deletar mensagens conforme filtros.
 """
 
 import os
-import pickle
+import copy
+import json
+import time
+import random
+import signal
+import shlex
 import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from gmail_store import (DEFAULT_DB_PATH, DEFAULT_CACHE_TTL_HOURS, open_db, RunJournal,
+                         MessageIndex, SyncState)
+from gmail_metrics import metrics, current_call
+from gmail_transport import TRANSPORTS, DEFAULT_TRANSPORT, create_http, configure as configure_transport
+from gmail_auth import TOKEN_PATH, CredentialManager, load_saved_credentials, write_token
+from gmail_report import MailboxReport, format_bytes
+from gmail_predicate import PredicateError, compile_predicate
+from gmail_watch import create_subscriber
 
 # Escopo necessário para acessar o Gmail (inclui permissão para deletar)
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
-def authenticate_gmail():
+# Escopo completo, exigido para deletar permanentemente (users.messages.batchDelete)
+FULL_MAIL_SCOPES = ['https://mail.google.com/']
+
+# Número máximo de mensagens por página de messages.list
+LIST_PAGE_SIZE = 500
+
+# Margem (em segundos) aplicada ao filtro after: quando o historyId expirou
+INCREMENTAL_SLACK_SECONDS = 3600
+
+# Tipos de registro do histórico lidos pelo modo incremental (mensagens novas ou com labels alterados)
+INCREMENTAL_HISTORY_TYPES = ['messageAdded', 'labelAdded', 'labelRemoved']
+
+# Número máximo de janelas de datas listadas por regra ao aplicar as regras a mensagens avulsas
+MATCH_MAX_WINDOWS = 8
+
+# Número de páginas de IDs aguardando no modo streaming (backpressure)
+STREAM_QUEUE_PAGES = 4
+
+# Endereço alternativo da Gmail API (ex: fake_gmail_server.py); vazio usa o Google
+API_ROOT_URL = os.environ.get('GMAIL_API_ROOT_URL', '')
+
+# Limite de IDs por chamada users.messages.batchModify
+BATCH_MODIFY_MAX_IDS = 1000
+
+# Limite de chamadas por requisição HTTP batch (multipart)
+BATCH_GET_MAX_REQUESTS = 100
+
+# Cabeçalhos lidos na amostra de mensagens
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+
+# Máscaras de campos (parâmetro fields) de cada chamada: a API devolve apenas o que é lido
+LIST_FIELDS = 'messages(id),nextPageToken'
+LIST_SAMPLE_FIELDS = 'messages(id),nextPageToken,resultSizeEstimate'
+DETAILS_FIELDS = 'id,threadId,labelIds,snippet,sizeEstimate,internalDate,historyId,payload/headers'
+HISTORY_FIELDS = ('history(messagesAdded/message(id,labelIds),labelsAdded/message(id,labelIds),'
+                  'labelsRemoved/message(id,labelIds)),nextPageToken')
+THREAD_LIST_FIELDS = 'threads(id),nextPageToken'
+THREAD_DETAILS_FIELDS = 'id,messages(id,payload/headers)'
+THREAD_MODIFY_FIELDS = 'id,messages/id'
+
+# Conversas por requisição HTTP batch no modo --threads (cada chamada custa 10 unidades)
+THREAD_BATCH_SIZE = 50
+
+# Custo em unidades de quota de cada método da Gmail API
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    'getProfile': 1,
+    'labels.get': 1,
+    'labels.list': 1,
+    'history.list': 2,
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.modify': 5,
+    'messages.trash': 5,
+    'messages.untrash': 5,
+    'messages.delete': 10,
+    'messages.batchModify': 50,
+    'messages.batchDelete': 50,
+    'threads.list': 10,
+    'threads.get': 10,
+    'threads.modify': 10,
+    'threads.trash': 10,
+    'threads.untrash': 10,
+    'watch': 100,
+    'stop': 50,
+}
+
+# Limite de unidades de quota por segundo por usuário
+DEFAULT_QUOTA_PER_SECOND = 250
+
+# Número máximo de novas tentativas para erros temporários (429, 5xx, 403 de limite)
+MAX_RETRIES = 5
+
+# Mensagens avaliadas por vez pelo filtro local (--where)
+FILTER_CHUNK_SIZE = 1000
+
+# Número de workers usados por --undo quando --workers não é informado
+UNDO_WORKERS = 4
+
+# Intervalo (em segundos) para renovar o users.watch do modo daemon (expira em 7 dias)
+WATCH_RENEW_SECONDS = 24 * 3600
+
+# Número máximo de queries listadas ao mesmo tempo no modo de várias regras
+MULTI_QUERY_LIST_WORKERS = 8
+
+# Termos de busca que equivalem a um único label de sistema (contagem via labels.get)
+LABEL_QUERY_ALIASES = {
+    'in:inbox': 'INBOX',
+    'in:sent': 'SENT',
+    'in:drafts': 'DRAFT',
+    'in:trash': 'TRASH',
+    'in:spam': 'SPAM',
+    'is:unread': 'UNREAD',
+    'is:starred': 'STARRED',
+    'is:important': 'IMPORTANT',
+    'category:primary': 'CATEGORY_PERSONAL',
+    'category:social': 'CATEGORY_SOCIAL',
+    'category:promotions': 'CATEGORY_PROMOTIONS',
+    'category:updates': 'CATEGORY_UPDATES',
+    'category:forums': 'CATEGORY_FORUMS',
+}
+
+# Data (epoch em segundos) de lançamento do Gmail (abril de 2004), usada para dividir o período
+GMAIL_EPOCH = 1080777600
+
+# Estimativa de mensagens acima da qual uma janela de datas é subdividida
+SHARD_TARGET_MESSAGES = 5000
+
+# Largura mínima (em segundos) de uma janela de datas
+SHARD_MIN_SECONDS = 3600
+
+# Número máximo de partes em que uma janela é subdividida de uma vez
+SHARD_MAX_SPLIT = 8
+
+# Número máximo de janelas de uma query
+MAX_QUERY_SHARDS = 256
+
+class RateLimiter:
     """
-    Autentica com o Gmail usando OAuth 2.0.
-    Retorna o serviço autenticado.
+    Token bucket que limita as unidades de quota consumidas por segundo.
+    
+    Cada chamada reserva o seu custo; se o balde ficar negativo, a thread
+    espera até a dívida ser paga. Compartilhado por todas as threads do processo.
+    """
+    
+    def __init__(self, units_per_second=DEFAULT_QUOTA_PER_SECOND):
+        self.units_per_second = units_per_second
+        self._tokens = float(units_per_second)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._tokens = min(self.units_per_second, self._tokens + elapsed * self.units_per_second)
+    
+    def reserve(self, units):
+        """
+        Reserva `units` unidades de quota sem bloquear.
+        Retorna quantos segundos o chamador deve esperar antes da requisição.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            return -self._tokens / self.units_per_second if self._tokens < 0 else 0
+    
+    def acquire(self, units):
+        """Reserva `units` unidades de quota, bloqueando se necessário."""
+        wait = self.reserve(units)
+        if wait > 0:
+            time.sleep(wait)
+    
+    def pause(self, seconds):
+        """Suspende o consumo de quota de todas as threads por `seconds` segundos."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.units_per_second
+
+rate_limiter = RateLimiter()
+
+def _is_retryable_status(status, content):
+    """
+    Indica se uma resposta HTTP da API é um erro temporário (limite de taxa ou falha do servidor).
+    """
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        content = content.decode('utf-8', 'ignore') if isinstance(content, bytes) else str(content)
+        return 'rateLimitExceeded' in content or 'userRateLimitExceeded' in content
+    return False
+
+def _is_retryable_error(error):
+    """
+    Indica se um erro da API é temporário (limite de taxa ou falha do servidor).
+    """
+    if not isinstance(error, HttpError):
+        return False
+    return _is_retryable_status(error.resp.status, error.content)
+
+def _backoff_delay(attempt):
+    """
+    Tempo de espera com backoff exponencial e jitter para a tentativa `attempt`.
+    """
+    return min(64, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def execute_request(request, method, calls=1, max_retries=MAX_RETRIES):
+    """
+    Executa uma requisição da Gmail API respeitando o limite de quota.
+    
+    Repete a requisição com backoff exponencial em erros 429, 5xx e 403 de limite de taxa.
+    
+    Args:
+        request: Requisição (HttpRequest ou BatchHttpRequest) a executar
+        method: Nome do método da API (ex: 'messages.list'), usado para o custo de quota
+        calls: Número de chamadas contidas na requisição (para requisições batch)
+        max_retries: Número máximo de novas tentativas
+    
+    Returns:
+        Resposta da API
+    """
+    units = QUOTA_UNITS.get(method, 5) * calls
+    current_call.method = method
+    
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire(units)
+        start = time.perf_counter()
+        try:
+            response = request.execute()
+            metrics.record_call(method, time.perf_counter() - start, units)
+            return response
+        except HttpError as error:
+            metrics.record_call(method, time.perf_counter() - start, units, error=True)
+            if not _is_retryable_error(error) or attempt == max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+            print(f"   ⏳ {method}: limite/erro temporário ({error.resp.status}), "
+                  f"nova tentativa em {delay:.1f}s ({attempt + 1}/{max_retries})")
+            metrics.record_retry(method, delay)
+            rate_limiter.pause(delay)
+
+def _has_scopes(creds, scopes):
+    """
+    Indica se o token salvo concede os escopos (o escopo completo inclui todos).
+    Tokens antigos sem a lista de escopos são aceitos.
+    """
+    granted = set(getattr(creds, 'scopes', None) or [])
+    return not granted or FULL_MAIL_SCOPES[0] in granted or set(scopes) <= granted
+
+def load_credentials(scopes=SCOPES):
+    """
+    Carrega (ou obtém via OAuth 2.0) as credenciais do Gmail.
+    
+    Se o token salvo não conceder os escopos pedidos (ex: o escopo completo
+    para deletar permanentemente), autentica de novo pedindo esses escopos.
+    Retorna as credenciais válidas ou None.
     """
-    creds = None
+    # Servidor alternativo local (benchmarks) não exige OAuth
+    if API_ROOT_URL:
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+    
+    # Verifica se já existe um token salvo (token.json; token.pickle é migrado)
+    creds = load_saved_credentials(None)
     
-    # Verifica se já existe um token salvo
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
+    if creds and not _has_scopes(creds, scopes):
+        print(f"🔄 O token salvo não concede o escopo necessário: {', '.join(scopes)}")
+        print("📋 IMPORTANTE: Certifique-se de conceder TODAS as permissões solicitadas!")
+        creds = None
     
     # Se não há credenciais válidas, solicita autenticação
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+            # Renova e grava o token (sob lock, se outro processo também estiver renovando)
+            CredentialManager(creds).refresh()
         else:
             # Verifica se existe o arquivo de credenciais
             if not os.path.exists('credentials.json'):
@@ -43,21 +298,143 @@ def authenticate_gmail():
                 print("5. Baixe o arquivo JSON e renomeie para 'credentials.json'")
                 return None
             
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
+                'credentials.json', scopes)
             creds = flow.run_local_server(port=0)
-        
-        # Salva as credenciais para a próxima execução
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+            
+            # Salva as credenciais para a próxima execução
+            write_token(creds, TOKEN_PATH)
+    
+    return creds
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+def get_discovery_document():
+    """
+    Retorna o documento de descoberta da Gmail API já interpretado.
+    
+    O documento é lido da cópia distribuída com o googleapiclient (sem
+    acesso à rede) e interpretado uma única vez por processo. Cada chamada
+    recebe uma cópia própria, pois build_from_document altera o dicionário
+    recebido e os serviços dos workers são criados em threads diferentes.
+    
+    Returns:
+        Cópia do dicionário do documento, ou None se o googleapiclient não tiver a cópia local
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            static_doc = get_static_doc('gmail', 'v1')
+            if static_doc is None:
+                return None
+            document = json.loads(static_doc)
+            if API_ROOT_URL:
+                document['rootUrl'] = document['mtlsRootUrl'] = API_ROOT_URL
+            _discovery_document = document
+        return copy.deepcopy(_discovery_document)
+
+def build_service(creds):
+    """
+    Cria um serviço Gmail com sua própria conexão HTTP autorizada.
+    
+    A conexão httplib2 não é thread-safe, por isso cada thread deve
+    usar o seu próprio serviço. O transporte é escolhido com
+    gmail_transport.configure (ver --transport).
+    """
+    http = AuthorizedHttp(creds, http=create_http())
+    document = get_discovery_document()
+    if document is not None:
+        return build_from_document(document, http=http)
+    return build('gmail', 'v1', http=http)
+
+def authenticate_gmail(creds=None):
+    """
+    Autentica com o Gmail usando OAuth 2.0.
+    Retorna o serviço autenticado.
+    
+    Args:
+        creds: Credenciais já carregadas (opcional; por padrão usa load_credentials)
+    """
+    creds = creds or load_credentials()
+    if not creds:
+        return None
     
     try:
-        service = build('gmail', 'v1', credentials=creds)
+        service = build_service(creds)
         return service
     except Exception as e:
         print(f"❌ Erro ao criar serviço Gmail: {e}")
         return None
 
+class ServicePool:
+    """
+    Pool de threads em que cada worker usa o seu próprio serviço Gmail.
+    """
+    
+    def __init__(self, creds, workers):
+        self.creds = creds
+        self.workers = workers
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gmail-worker')
+    
+    def service(self):
+        """Retorna o serviço da thread atual, criando-o na primeira chamada."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build_service(self.creds)
+            self._local.service = service
+        return service
+    
+    def submit(self, func, item):
+        """Agenda func(service, item) no pool e retorna o Future."""
+        return self._executor.submit(lambda: func(self.service(), item))
+    
+    def imap_unordered(self, func, items):
+        """
+        Executa func(service, item) para cada item no pool.
+        Retorna os resultados na ordem em que terminam.
+        
+        Se a espera for interrompida (Ctrl-C), os itens ainda não iniciados
+        são cancelados e os resultados dos que já estavam em andamento ainda
+        são entregues, para que o chamador registre (ex: no diário) tudo o
+        que de fato foi feito, antes de a interrupção seguir adiante.
+        """
+        futures = [self._executor.submit(lambda item=item: func(self.service(), item)) for item in items]
+        pending = set(futures)
+        try:
+            for future in as_completed(futures):
+                pending.discard(future)
+                yield future.result()
+        except KeyboardInterrupt:
+            running = [future for future in pending if not future.cancel()]
+            for future in as_completed(running):
+                if future.exception() is None:
+                    yield future.result()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def close(self):
+        # Itens ainda na fila (ex: após Ctrl-C) não devem ser executados
+        self._executor.shutdown(wait=True, cancel_futures=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _run_tasks(service, pool, func, items):
+    """
+    Executa func(service, item) para cada item, no pool de workers se houver.
+    """
+    if pool is None:
+        return (func(service, item) for item in items)
+    return pool.imap_unordered(func, items)
+
 def test_gmail_connection(service):
     """
     Testa a conexão com o Gmail e verifica se há mensagens.
@@ -65,20 +442,22 @@ def test_gmail_connection(service):
     try:
         # Testa buscar todas as mensagens (sem filtro)
         print("🔍 Testando conexão com Gmail...")
-        results = service.users().messages().list(
+        results = execute_request(service.users().messages().list(
             userId='me', 
-            maxResults=1
-        ).execute()
+            maxResults=1,
+            fields='resultSizeEstimate'
+        ), 'messages.list')
         
         total_messages = results.get('resultSizeEstimate', 0)
         print(f"✅ Conexão OK! Total estimado de mensagens: {total_messages}")
         
         # Testa buscar mensagens com filtro vazio
         print("🔍 Testando busca sem filtro...")
-        results_no_filter = service.users().messages().list(
+        results_no_filter = execute_request(service.users().messages().list(
             userId='me', 
-            maxResults=5
-        ).execute()
+            maxResults=5,
+            fields=LIST_FIELDS
+        ), 'messages.list')
         
         messages_no_filter = results_no_filter.get('messages', [])
         print(f"📧 Mensagens encontradas sem filtro: {len(messages_no_filter)}")
@@ -89,7 +468,170 @@ def test_gmail_connection(service):
         print(f"❌ Erro ao testar conexão: {error}")
         return False, 0, []
 
-def search_messages(service, query, max_results=50, get_all=False):
+def iter_message_pages(service, query, page_size=LIST_PAGE_SIZE, page_token=None, fields=LIST_FIELDS):
+    """
+    Gera as páginas de resultados de messages.list, uma de cada vez.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        query: Query de busca
+        page_size: Número de mensagens por página (máximo 500)
+        page_token: Token da página inicial (opcional)
+        fields: Máscara de campos da resposta (padrão: apenas IDs e nextPageToken)
+    
+    Yields:
+        Resposta de cada página (com 'messages' e 'nextPageToken')
+    """
+    while True:
+        results = execute_request(service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=page_size,
+            pageToken=page_token,
+            fields=fields
+        ), 'messages.list')
+        
+        yield results
+        
+        # Verifica se há mais páginas
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+def _shard_query(query, window):
+    """
+    Restringe a query à janela de datas [start, stop), em segundos.
+    
+    after: e before: são exclusivos, por isso a janela usa after:{start - 1}
+    e before:{stop}: janelas vizinhas ([a, b) e [b, c)) não têm nenhum
+    segundo em comum, e a listagem e a contagem em janelas
+    (iter_sharded_message_ids e count_messages) não precisam descartar
+    repetições.
+    """
+    start, stop = window
+    terms = [f'({query})'] if query else []
+    if start is not None:
+        terms.append(f'after:{start - 1}')
+    if stop is not None:
+        terms.append(f'before:{stop}')
+    return ' '.join(terms)
+
+def _estimate_window(service, item):
+    query, window = item
+    results = execute_request(service.users().messages().list(
+        userId='me',
+        q=_shard_query(query, window),
+        maxResults=1,
+        fields=LIST_SAMPLE_FIELDS
+    ), 'messages.list')
+    if not results.get('messages'):
+        return window, 0
+    return window, max(1, results.get('resultSizeEstimate', 1))
+
+def _split_window(window, parts, now):
+    start, stop = window
+    low = GMAIL_EPOCH if start is None else start
+    high = now if stop is None else stop
+    step = max(SHARD_MIN_SECONDS, (high - low) // parts)
+    bounds = list(range(low, high, step))[1:parts]
+    return list(zip([start] + bounds, bounds + [stop]))
+
+def plan_query_shards(service, query, pool=None, target=SHARD_TARGET_MESSAGES,
+                      max_shards=MAX_QUERY_SHARDS):
+    """
+    Divide uma query em janelas de datas (after:/before:) vizinhas e sem lacunas.
+    
+    Começa com uma única janela aberta e subdivide, nível a nível, as janelas
+    cuja estimativa (resultSizeEstimate) passa de `target`, em partes
+    proporcionais à estimativa; janelas vazias são descartadas. As
+    estimativas de cada nível são pedidas em paralelo no pool.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        query: Query de busca
+        pool: ServicePool opcional para estimar as janelas em paralelo
+        target: Número de mensagens desejado por janela
+        max_shards: Número máximo de janelas
+    
+    Returns:
+        Lista de queries, uma por janela, da mais antiga para a mais nova
+    """
+    now = int(time.time()) + 86400
+    pending = [(None, None)]
+    shards = []
+    while pending:
+        estimates = list(_run_tasks(service, pool, _estimate_window, [(query, w) for w in pending]))
+        pending = []
+        for position, (window, estimate) in enumerate(estimates):
+            if not estimate:
+                continue
+            start, stop = window
+            width = (now if stop is None else stop) - (GMAIL_EPOCH if start is None else start)
+            # Cada janela ainda não avaliada ocupa ao menos uma vaga
+            room = max_shards - len(shards) - len(pending) - (len(estimates) - position - 1)
+            parts = min(SHARD_MAX_SPLIT, -(-estimate // target), room, width // SHARD_MIN_SECONDS)
+            if parts > 1:
+                pending.extend(_split_window(window, parts, now))
+            else:
+                shards.append(window)
+    
+    shards.sort(key=lambda window: GMAIL_EPOCH - 1 if window[0] is None else window[0])
+    return [_shard_query(query, window) for window in shards] or [query]
+
+def iter_sharded_message_ids(service, query, pool=None, shards=None):
+    """
+    Lista uma query em janelas de datas paginadas em paralelo.
+    
+    A paginação de messages.list é sequencial (cada página depende do
+    nextPageToken da anterior); com várias janelas, cada worker do pool
+    pagina a sua e as páginas são unidas em um único fluxo. As janelas não
+    se sobrepõem (ver _shard_query), por isso nenhum ID se repete.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        query: Query de busca
+        pool: ServicePool opcional para paginar as janelas em paralelo
+        shards: Queries das janelas (padrão: plan_query_shards)
+    
+    Yields:
+        Lista de IDs de cada página, na ordem em que chegam
+    """
+    if shards is None:
+        shards = plan_query_shards(service, query, pool)
+    
+    if pool is None or len(shards) == 1:
+        for shard_query in shards:
+            for results in iter_message_pages(service, shard_query):
+                yield [msg['id'] for msg in results.get('messages', [])]
+        return
+    
+    page_queue = queue.Queue(maxsize=STREAM_QUEUE_PAGES * pool.workers)
+    stop_event = threading.Event()
+    futures = [
+        pool.submit(lambda shard_service, shard_query:
+                    _produce_id_pages(shard_service, shard_query, page_queue, stop_event), shard_query)
+        for shard_query in shards
+    ]
+    try:
+        finished = 0
+        while finished < len(shards):
+            item = page_queue.get()
+            if item is None:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item[0]
+    finally:
+        # Libera produtores bloqueados na fila cheia
+        stop_event.set()
+        while not all(future.done() for future in futures):
+            try:
+                page_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def search_messages(service, query, max_results=50, get_all=False, pool=None):
     """
     Busca mensagens no Gmail com base na query fornecida.
     
@@ -98,6 +640,8 @@ def search_messages(service, query, max_results=50, get_all=False):
         query: Query de busca (ex: "gmail", "from:exemplo@gmail.com", etc.)
         max_results: Número máximo de resultados para amostra
         get_all: Se True, busca TODAS as mensagens que combinam com o filtro
+        pool: ServicePool opcional; com get_all, lista a query em janelas de
+            datas paginadas em paralelo
     
     Returns:
         Lista de IDs das mensagens encontradas
@@ -113,41 +657,34 @@ def search_messages(service, query, max_results=50, get_all=False):
         if get_all:
             print("📊 Buscando TODAS as mensagens que combinam com o filtro...")
             all_messages = []
-            page_token = None
             
-            while True:
-                # Busca um lote de mensagens
-                results = service.users().messages().list(
-                    userId='me', 
-                    q=query, 
-                    maxResults=500,  # Máximo por lote
-                    pageToken=page_token
-                ).execute()
-                
-                messages = results.get('messages', [])
-                all_messages.extend(messages)
-                
-                print(f"   📧 Lote encontrado: {len(messages)} mensagens (Total: {len(all_messages)})")
-                
-                # Verifica se há mais páginas
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
+            if pool is not None:
+                shards = plan_query_shards(service, query, pool)
+                print(f"🧩 Listando em {len(shards)} janelas de datas com {pool.workers} workers")
+                for message_ids in iter_sharded_message_ids(service, query, pool, shards):
+                    all_messages.extend({'id': message_id} for message_id in message_ids)
+                    print(f"   📧 Lote encontrado: {len(message_ids)} mensagens (Total: {len(all_messages)})")
+            else:
+                for results in iter_message_pages(service, query):
+                    messages = results.get('messages', [])
+                    all_messages.extend(messages)
+                    
+                    print(f"   📧 Lote encontrado: {len(messages)} mensagens (Total: {len(all_messages)})")
             
-            total_estimated = results.get('resultSizeEstimate', len(all_messages))
+            # A listagem completa pede apenas os IDs (LIST_FIELDS), sem resultSizeEstimate
             print(f"📊 Busca completa finalizada:")
             print(f"   - Total de mensagens encontradas: {len(all_messages)}")
-            print(f"   - Total estimado: {total_estimated}")
             
             return all_messages
         else:
             print(f"📊 Buscando amostra de até {max_results} mensagens...")
             
-            results = service.users().messages().list(
+            results = execute_request(service.users().messages().list(
                 userId='me', 
                 q=query, 
-                maxResults=max_results
-            ).execute()
+                maxResults=max_results,
+                fields=LIST_SAMPLE_FIELDS
+            ), 'messages.list')
             
             messages = results.get('messages', [])
             total_estimated = results.get('resultSizeEstimate', 0)
@@ -179,162 +716,1867 @@ def search_messages(service, query, max_results=50, get_all=False):
         print(f"   Detalhes do erro: {error.resp.status} - {error.content}")
         return []
 
-def get_message_details(service, message_id):
+class HistoryExpiredError(Exception):
+    """O historyId gravado é antigo demais para users.history.list."""
+
+def get_mailbox_history_id(service):
     """
-    Obtém detalhes de uma mensagem específica.
+    Retorna o historyId atual da caixa de correio.
+    """
+    profile = execute_request(service.users().getProfile(userId='me', fields='historyId'), 'getProfile')
+    return profile['historyId']
+
+def iter_history_messages(service, start_history_id, history_types=('messageAdded',)):
+    """
+    Gera as mensagens dos registros do histórico da caixa desde
+    start_history_id, na ordem do histórico.
+    
+    Args:
+        history_types: Tipos de registro (messageAdded, labelAdded, labelRemoved...)
+    
+    Yields:
+        Tupla (tipo do registro, mensagem {'id', 'labelIds'}); o tipo é
+        'messagesAdded', 'labelsAdded' ou 'labelsRemoved'
+    
+    Raises:
+        HistoryExpiredError: Se o historyId expirou (a API responde 404)
+    """
+    page_token = None
+    while True:
+        try:
+            results = execute_request(service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=list(history_types),
+                maxResults=500,
+                pageToken=page_token,
+                fields=HISTORY_FIELDS
+            ), 'history.list')
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise HistoryExpiredError(start_history_id) from error
+            raise
+        
+        for record in results.get('history', []):
+            for kind in ('messagesAdded', 'labelsAdded', 'labelsRemoved'):
+                for change in record.get(kind, []):
+                    yield kind, change['message']
+        
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+def iter_history_added_ids(service, start_history_id):
+    """
+    Gera os IDs das mensagens adicionadas à caixa desde start_history_id.
+    
+    Raises:
+        HistoryExpiredError: Se o historyId expirou (a API responde 404)
+    """
+    for _, message in iter_history_messages(service, start_history_id):
+        yield message['id']
+
+def search_messages_incremental(service, query, sync_state, journal=None):
+    """
+    Busca apenas as mensagens que chegaram ou mudaram desde a última execução da query.
+    
+    Usa users.history.list (mensagens adicionadas e labels adicionados ou
+    removidos) para descobrir as mensagens alteradas e aplica o filtro
+    somente a elas (match_new_messages, que lista a query apenas nas janelas
+    de datas dessas mensagens), de modo que mensagens importadas, entregues
+    com atraso ou restauradas também sejam vistas. As alterações de labels
+    das mensagens que a própria execução anterior processou (gravadas no
+    diário) são ignoradas, para que ela não se repita indefinidamente. Na
+    primeira execução, ou se o historyId gravado expirou, faz a listagem
+    completa.
     
     Args:
         service: Serviço Gmail autenticado
-        message_id: ID da mensagem
+        query: Query de busca
+        sync_state: SyncState com o historyId e a execução da última vez
+        journal: RunJournal opcional com os IDs processados pela execução anterior
     
     Returns:
-        Dicionário com detalhes da mensagem
+        Tupla (lista de mensagens, historyId a gravar ao final da execução)
     """
+    history_id = get_mailbox_history_id(service)
+    state = sync_state.get(query)
+    
+    if state is None:
+        print("ℹ️  Primeira execução incremental desta query - listagem completa")
+        return search_messages(service, query, get_all=True), history_id
+    
     try:
-        message = service.users().messages().get(
-            userId='me', 
-            id=message_id,
-            format='metadata',
-            metadataHeaders=['Subject', 'From', 'Date']
-        ).execute()
-        
-        headers = message['payload']['headers']
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'Sem assunto')
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Remetente desconhecido')
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Data desconhecida')
-        
-        return {
-            'id': message_id,
-            'subject': subject,
-            'from': sender,
-            'date': date,
-            'snippet': message.get('snippet', '')
-        }
-    except HttpError as error:
-        print(f"❌ Erro ao obter detalhes da mensagem {message_id}: {error}")
-        return None
+        # O último registro de cada mensagem traz os seus labels mais recentes
+        changed = {}
+        added_ids = set()
+        for kind, message in iter_history_messages(service, state['history_id'], INCREMENTAL_HISTORY_TYPES):
+            changed[message['id']] = message.get('labelIds', [])
+            if kind == 'messagesAdded':
+                added_ids.add(message['id'])
+    except HistoryExpiredError:
+        print("⚠️  historyId expirado - voltando à listagem completa")
+        return search_messages(service, query, get_all=True), history_id
+    
+    # As alterações de labels feitas pela execução anterior não são mudanças novas: as
+    # mensagens que ela processou e que continuam com os labels que ela aplicou são ignoradas
+    own_ids = set()
+    run = journal.get_run(state['run_id']) if journal is not None and state.get('run_id') else None
+    if run:
+        own_ids = set(journal.ids_with_status(run['run_id'], 'done'))
+    
+    def unchanged_by_others(message_id, label_ids):
+        return (message_id in own_ids and message_id not in added_ids
+                and set(run['add_label_ids']) <= set(label_ids)
+                and not set(run['remove_label_ids']) & set(label_ids))
+    
+    # Mensagens na Lixeira ou no Spam não casam com a busca (ex: as deletadas na última execução)
+    candidate_ids = [message_id for message_id, label_ids in changed.items()
+                     if 'TRASH' not in label_ids and 'SPAM' not in label_ids
+                     and not unchanged_by_others(message_id, label_ids)]
+    print(f"🕒 {len(changed)} mensagens novas ou alteradas desde a última execução "
+          f"({len(candidate_ids)} fora da Lixeira e do Spam e não processadas pela execução anterior)")
+    if not candidate_ids:
+        return [], history_id
+    
+    matched = match_new_messages(service, candidate_ids, [query])
+    print(f"📊 {len(matched)} mensagens novas ou alteradas combinam com o filtro")
+    return [{'id': details['id']} for details in matched], history_id
 
-def display_messages(messages):
+def load_rules(rules_path):
     """
-    Exibe as mensagens encontradas de forma organizada.
+    Lê um arquivo de regras: uma query Gmail por linha.
+    
+    Linhas vazias e linhas iniciadas por '#' são ignoradas.
     
     Args:
-        messages: Lista de mensagens com detalhes
+        rules_path: Caminho do arquivo de regras
+    
+    Returns:
+        Lista de queries, sem repetições, na ordem do arquivo
     """
-    if not messages:
-        print("📭 Nenhuma mensagem encontrada com o filtro especificado.")
-        return
+    with open(rules_path, encoding='utf-8') as rules_file:
+        rules = [line.strip() for line in rules_file]
+    return list(dict.fromkeys(rule for rule in rules if rule and not rule.startswith('#')))
+
+def _list_query_ids(service, query):
+    message_ids = []
+    for page in iter_message_pages(service, query):
+        message_ids.extend(msg['id'] for msg in page.get('messages', []))
+    return query, message_ids
+
+def search_messages_multi(service, queries, pool=None):
+    """
+    Lista várias queries (em paralelo, se houver pool) e une os resultados.
     
-    print(f"\n📧 Encontradas {len(messages)} mensagens:")
-    print("=" * 80)
+    Cada mensagem aparece uma única vez no resultado, mesmo que combine
+    com várias regras; ela é atribuída à primeira regra (na ordem dada).
     
-    for i, msg in enumerate(messages, 1):
-        print(f"\n{i:2d}. ID: {msg['id']}")
-        print(f"    📨 De: {msg['from']}")
-        print(f"    📋 Assunto: {msg['subject']}")
-        print(f"    📅 Data: {msg['date']}")
-        print(f"    📝 Preview: {msg['snippet'][:100]}...")
-        print("-" * 80)
+    Args:
+        service: Serviço Gmail autenticado
+        queries: Lista de queries de busca
+        pool: ServicePool opcional para listar as queries em paralelo
+    
+    Returns:
+        Tupla (lista de IDs sem repetições, lista de estatísticas por regra
+        com 'query', 'matched' e 'new')
+    """
+    ids_by_query = {}
+    for query, message_ids in _run_tasks(service, pool, _list_query_ids, queries):
+        ids_by_query[query] = message_ids
+        print(f"   🔎 '{query}': {len(message_ids)} mensagens")
+    
+    all_ids = {}
+    stats = []
+    for query in queries:
+        message_ids = ids_by_query[query]
+        before = len(all_ids)
+        all_ids.update(dict.fromkeys(message_ids))
+        stats.append({'query': query, 'matched': len(message_ids), 'new': len(all_ids) - before})
+    
+    return list(all_ids), stats
+
+def display_rule_stats(stats, total):
+    """
+    Exibe as estatísticas de cada regra e o total de mensagens únicas.
+    """
+    print(f"\n📊 Resultado por regra:")
+    print(f"   {'combinam':>9} {'novas':>9}  regra")
+    for rule in stats:
+        print(f"   {rule['matched']:>9} {rule['new']:>9}  {rule['query']}")
+    matched = sum(rule['matched'] for rule in stats)
+    print(f"   Total: {total} mensagens únicas ({matched - total} repetidas entre regras)")
 
-def delete_messages(service, message_ids):
+def _normalize_label_name(name):
+    # Forma usada pela busca do Gmail: label:"Meus Recibos/2024" -> label:meus-recibos-2024
+    return name.strip('"').lower().replace(' ', '-').replace('/', '-')
+
+def resolve_label_query(service, query):
     """
-    Deleta as mensagens especificadas.
+    Identifica queries formadas por um único label (ex: 'in:inbox', 'label:recibos').
     
     Args:
         service: Serviço Gmail autenticado
-        message_ids: Lista de IDs das mensagens a serem deletadas
+        query: Query de busca
     
     Returns:
-        Número de mensagens deletadas com sucesso
+        ID do label, ou None se a query não for um label puro
     """
-    if not message_ids:
-        return 0
+    terms = (query or '').split()
+    if len(terms) != 1:
+        return None
+    term = terms[0].lower()
+    if term in LABEL_QUERY_ALIASES:
+        return LABEL_QUERY_ALIASES[term]
+    if not term.startswith('label:'):
+        return None
     
-    deleted_count = 0
-    total_messages = len(message_ids)
+    wanted = _normalize_label_name(term[len('label:'):])
+    results = execute_request(service.users().labels().list(
+        userId='me', fields='labels(id,name)'
+    ), 'labels.list')
+    for label in results.get('labels', []):
+        if _normalize_label_name(label['name']) == wanted or label['id'].lower() == wanted:
+            return label['id']
+    return None
+
+def _count_query(service, query, count_page=len):
+    """
+    Conta as mensagens de uma query paginando apenas IDs (que são descartados).
     
-    try:
-        print(f"🗑️ Movendo {total_messages} mensagens para a Lixeira...")
-        
-        # Processa em lotes para melhor performance
-        batch_size = 100
-        for i in range(0, total_messages, batch_size):
-            batch = message_ids[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (total_messages + batch_size - 1) // batch_size
-            
-            print(f"   📦 Processando lote {batch_num}/{total_batches} ({len(batch)} mensagens)...")
-            
-            # Processa cada mensagem do lote
-            for j, message_id in enumerate(batch):
-                try:
-                    service.users().messages().trash(userId='me', id=message_id).execute()
-                    deleted_count += 1
-                    
-                    # Mostra progresso a cada 10 mensagens
-                    if (j + 1) % 10 == 0 or j == len(batch) - 1:
-                        progress = ((i + j + 1) / total_messages) * 100
-                        print(f"      ✅ Progresso: {progress:.1f}% ({deleted_count}/{total_messages})")
-                        
-                except HttpError as error:
-                    print(f"❌ Erro ao deletar mensagem {message_id}: {error}")
-                    continue
-                except Exception as error:
-                    print(f"❌ Erro inesperado ao deletar mensagem {message_id}: {error}")
-                    continue
+    count_page recebe os IDs de cada página e retorna quantos contar.
+    """
+    count = 0
+    for page in iter_message_pages(service, query):
+        count += count_page([msg['id'] for msg in page.get('messages', [])])
+    return count
+
+def count_messages(service, query, pool=None, shards=1):
+    """
+    Conta exatamente as mensagens que combinam com a query, o mais rápido possível.
+    
+    - Label puro (ex: 'in:inbox', 'label:recibos'): lê o contador
+      messagesTotal de labels.get e desconta as mensagens do label que estão
+      na Lixeira ou no Spam (que a busca não inclui).
+    - Demais queries: pagina messages.list pedindo apenas os IDs, sem
+      guardá-los, exibindo a contagem parcial.
+    - Com shards > 1, divide a query em até `shards` janelas de datas
+      (plan_query_shards) contadas em paralelo no pool; como as janelas
+      não se sobrepõem (ver _shard_query), o total é a soma das contagens
+      de cada uma, exatamente como na listagem em janelas.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        query: Query de busca
+        pool: ServicePool opcional para contar os shards em paralelo
+        shards: Número máximo de janelas de datas
+    
+    Returns:
+        Número exato de mensagens
+    """
+    start = time.perf_counter()
+    label_id = resolve_label_query(service, query)
+    
+    if label_id:
+        label = execute_request(service.users().labels().get(
+            userId='me', id=label_id, fields='messagesTotal'
+        ), 'labels.get')
+        total = label.get('messagesTotal', 0)
+        print(f"🏷️  Label {label_id}: {total} mensagens (contador do label)")
+        if label_id not in ('TRASH', 'SPAM'):
+            # O contador do label inclui mensagens na Lixeira e no Spam
+            for hidden in ('in:trash', 'in:spam'):
+                hidden_count = _count_query(service, f'{query} {hidden}')
+                if hidden_count:
+                    print(f"   - {hidden_count} delas em {hidden} (descontadas)")
+                total -= hidden_count
+    else:
+        counted = [0]
+        lock = threading.Lock()
         
-        if deleted_count > 0:
-            print(f"✅ {deleted_count} mensagens movidas para a Lixeira com sucesso!")
-            if deleted_count != total_messages:
-                print(f"⚠️  {total_messages - deleted_count} mensagens não puderam ser deletadas.")
-        else:
-            print("❌ Nenhuma mensagem foi deletada.")
+        def count_page(message_ids):
+            with lock:
+                counted[0] += len(message_ids)
+                print(f"\r🔢 {counted[0]} mensagens...", end='', flush=True)
+            return len(message_ids)
         
-    except Exception as error:
-        print(f"❌ Erro geral ao deletar mensagens: {error}")
+        if shards > 1:
+            shard_queries = plan_query_shards(service, query, pool, max_shards=shards)
+            print(f"🧩 Contando em {len(shard_queries)} janelas de datas")
+            total = sum(_run_tasks(service, pool, lambda shard_service, shard_query:
+                                   _count_query(shard_service, shard_query, count_page), shard_queries))
+        else:
+            total = _count_query(service, query, count_page)
+        print()
     
-    return deleted_count
+    elapsed = time.perf_counter() - start
+    print(f"✅ Total exato: {total} mensagens ({elapsed:.2f}s)")
+    return total
 
-def main():
+def _parse_message_details(message):
     """
-    Função principal do script.
+    Extrai os campos exibidos na amostra a partir de uma resposta messages.get.
     """
-    parser = argparse.ArgumentParser(
-        description='Script para deletar mensagens do Gmail com base em filtros'
-    )
-    parser.add_argument(
-        'filter', 
-        nargs='?',
-        default='',
-        help='Filtro de busca Gmail (ex: "gmail", "from:exemplo@gmail.com", "subject:importante"). Deixe vazio para buscar todas as mensagens.'
-    )
-    parser.add_argument(
-        '--delete', 
-        action='store_true',
-        help='Deletar as mensagens encontradas (sem este flag apenas mostra as mensagens)'
+    headers = message.get('payload', {}).get('headers', [])
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'Sem assunto')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Remetente desconhecido')
+    date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Data desconhecida')
+    
+    return {
+        'id': message['id'],
+        'subject': subject,
+        'from': sender,
+        'date': date,
+        'snippet': message.get('snippet', ''),
+        'thread_id': message.get('threadId'),
+        'label_ids': message.get('labelIds', []),
+        'size_estimate': message.get('sizeEstimate'),
+        'internal_date': int(message['internalDate']) if 'internalDate' in message else None,
+        'history_id': message.get('historyId')
+    }
+
+def _execute_details_batch(service, message_ids):
+    """
+    Envia uma requisição HTTP batch com um messages.get por ID.
+    
+    Returns:
+        Tupla ({id: detalhes}, {id: erro})
+    """
+    details = {}
+    errors = {}
+    
+    def callback(request_id, response, exception):
+        if exception is None:
+            details[request_id] = _parse_message_details(response)
+        else:
+            errors[request_id] = exception
+    
+    # Criar o recurso messages() é caro; é criado uma única vez por lote
+    messages_resource = service.users().messages()
+    batch = service.new_batch_http_request(callback=callback)
+    for message_id in message_ids:
+        batch.add(
+            messages_resource.get(
+                userId='me',
+                id=message_id,
+                format='metadata',
+                metadataHeaders=METADATA_HEADERS,
+                fields=DETAILS_FIELDS
+            ),
+            request_id=message_id
+        )
+    try:
+        execute_request(batch, 'messages.get', calls=len(message_ids))
+    except HttpError as error:
+        for message_id in message_ids:
+            if message_id not in details:
+                errors[message_id] = error
+    
+    return details, errors
+
+def fetch_message_details_batch(service, message_ids, batch_size=BATCH_GET_MAX_REQUESTS,
+                                max_retries=3, pool=None):
+    """
+    Obtém os detalhes de várias mensagens usando requisições HTTP batch (multipart).
+    
+    Agrupa até 100 chamadas messages.get por requisição e reenvia apenas
+    as sub-requisições que falharam com erros temporários.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: Lista de IDs das mensagens
+        batch_size: Número de chamadas por requisição batch (máximo 100)
+        max_retries: Número máximo de novas tentativas para sub-requisições com falha
+        pool: ServicePool opcional para enviar as requisições batch em paralelo
+    
+    Returns:
+        Dicionário {id da mensagem: detalhes da mensagem}
+    """
+    batch_size = max(1, min(batch_size, BATCH_GET_MAX_REQUESTS))
+    pending = list(dict.fromkeys(message_ids))
+    details = {}
+    
+    for attempt in range(max_retries + 1):
+        retry_ids = []
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        
+        for chunk_details, chunk_errors in _run_tasks(service, pool, _execute_details_batch, chunks):
+            details.update(chunk_details)
+            for message_id, error in chunk_errors.items():
+                if _is_retryable_error(error) and attempt < max_retries:
+                    retry_ids.append(message_id)
+                else:
+                    print(f"❌ Erro ao obter detalhes da mensagem {message_id}: {error}")
+        
+        if not retry_ids:
+            break
+        
+        delay = _backoff_delay(attempt)
+        print(f"   🔁 Repetindo {len(retry_ids)} requisições com falha em {delay:.1f}s...")
+        metrics.record_retry('messages.get', delay, len(retry_ids))
+        rate_limiter.pause(delay)
+        pending = retry_ids
+    
+    metrics.increment('messages_fetched', len(details))
+    return details
+
+def fetch_message_details_cached(service, message_ids, index=None,
+                                 max_age_hours=DEFAULT_CACHE_TTL_HOURS, pool=None):
+    """
+    Obtém os detalhes das mensagens lendo primeiro o índice local.
+    
+    Apenas os IDs ausentes no índice (ou com entrada expirada) são buscados
+    na API, e o resultado é gravado no índice.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: Lista de IDs das mensagens
+        index: MessageIndex opcional (sem índice, busca tudo na API)
+        max_age_hours: Idade máxima de uma entrada do índice
+        pool: ServicePool opcional para enviar as requisições batch em paralelo
+    
+    Returns:
+        Dicionário {id da mensagem: detalhes da mensagem}
+    """
+    if index is None:
+        return fetch_message_details_batch(service, message_ids, pool=pool)
+    
+    details = index.get_many(message_ids, max_age_hours) if max_age_hours > 0 else {}
+    missing = [message_id for message_id in message_ids if message_id not in details]
+    print(f"   🗂️  Índice local: {len(details)} encontradas, {len(missing)} buscadas na API")
+    
+    if missing:
+        fetched = fetch_message_details_batch(service, missing, pool=pool)
+        index.upsert_many(fetched.values())
+        details.update(fetched)
+    
+    return details
+
+def filter_messages(service, message_ids, predicate, index=None,
+                    max_age_hours=DEFAULT_CACHE_TTL_HOURS, pool=None, chunk_size=FILTER_CHUNK_SIZE,
+                    verbose=True):
+    """
+    Aplica o filtro local (--where) aos metadados das mensagens.
+    
+    Os metadados são buscados em lote (ou lidos do índice local) em blocos
+    de chunk_size mensagens, avaliados pelo predicado compilado e descartados.
+    Mensagens cujos metadados não puderam ser obtidos são excluídas.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: Lista de IDs das mensagens
+        predicate: Função compilada por gmail_predicate.compile_predicate
+        index: MessageIndex opcional
+        max_age_hours: Idade máxima de uma entrada do índice
+        pool: ServicePool opcional para buscar os metadados em paralelo
+        chunk_size: Número de mensagens avaliadas por vez
+        verbose: Se True, exibe o progresso
+    
+    Returns:
+        Lista dos IDs que passaram no filtro, na ordem original
+    """
+    passed = []
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        details = fetch_message_details_cached(service, chunk, index, max_age_hours, pool=pool)
+        passed.extend(message_id for message_id in chunk
+                      if message_id in details and predicate(details[message_id]))
+        if verbose:
+            print(f"   🔬 Filtro local: {len(passed)} de {start + len(chunk)} mensagens passaram")
+    return passed
+
+def _apply_sample_predicate(sample_details, predicate):
+    if predicate is None:
+        return sample_details
+    passed = [details for details in sample_details if predicate(details)]
+    print(f"🔬 Filtro local: {len(passed)} de {len(sample_details)} mensagens da amostra passaram")
+    return passed
+
+def get_message_details(service, message_id):
+    """
+    Obtém detalhes de uma mensagem específica.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_id: ID da mensagem
+    
+    Returns:
+        Dicionário com detalhes da mensagem
+    """
+    return fetch_message_details_batch(service, [message_id]).get(message_id)
+
+def display_messages(messages):
+    """
+    Exibe as mensagens encontradas de forma organizada.
+    
+    Args:
+        messages: Lista de mensagens com detalhes
+    """
+    if not messages:
+        print("📭 Nenhuma mensagem encontrada com o filtro especificado.")
+        return
+    
+    print(f"\n📧 Encontradas {len(messages)} mensagens:")
+    print("=" * 80)
+    
+    for i, msg in enumerate(messages, 1):
+        print(f"\n{i:2d}. ID: {msg['id']}")
+        print(f"    📨 De: {msg['from']}")
+        print(f"    📋 Assunto: {msg['subject']}")
+        print(f"    📅 Data: {msg['date']}")
+        print(f"    📝 Preview: {msg['snippet'][:100]}...")
+        print("-" * 80)
+
+def build_label_changes(trash=True, archive=False, mark_read=False,
+                        add_labels=None, remove_labels=None):
+    """
+    Monta as listas de labels a adicionar/remover para uma ação em lote.
+    
+    Args:
+        trash: Se True, adiciona o label TRASH (move para a Lixeira)
+        archive: Se True, remove o label INBOX (arquiva)
+        mark_read: Se True, remove o label UNREAD (marca como lida)
+        add_labels: IDs de labels adicionais a adicionar
+        remove_labels: IDs de labels adicionais a remover
+    
+    Returns:
+        Tupla (labels_a_adicionar, labels_a_remover)
+    """
+    add_label_ids = list(add_labels or [])
+    remove_label_ids = list(remove_labels or [])
+    
+    if trash and 'TRASH' not in add_label_ids:
+        add_label_ids.append('TRASH')
+    if archive and 'INBOX' not in remove_label_ids:
+        remove_label_ids.append('INBOX')
+    if mark_read and 'UNREAD' not in remove_label_ids:
+        remove_label_ids.append('UNREAD')
+    
+    return add_label_ids, remove_label_ids
+
+def _modify_single_message(messages_resource, message_id, add_label_ids, remove_label_ids):
+    """
+    Aplica as alterações de labels em uma única mensagem (fallback do lote).
+    
+    O TRASH é aplicado via messages.trash (e removido via messages.untrash);
+    os demais labels via messages.modify.
+    
+    Args:
+        messages_resource: Recurso service.users().messages()
+    """
+    other_add = [label for label in add_label_ids if label != 'TRASH']
+    other_remove = [label for label in remove_label_ids if label != 'TRASH']
+    
+    if 'TRASH' in remove_label_ids:
+        execute_request(messages_resource.untrash(userId='me', id=message_id, fields='id'), 'messages.untrash')
+    
+    if other_add or other_remove:
+        body = {'addLabelIds': other_add, 'removeLabelIds': other_remove}
+        execute_request(
+            messages_resource.modify(userId='me', id=message_id, body=body, fields='id'),
+            'messages.modify'
+        )
+    
+    if 'TRASH' in add_label_ids:
+        execute_request(messages_resource.trash(userId='me', id=message_id, fields='id'), 'messages.trash')
+
+def _modify_chunk(service, chunk, add_label_ids, remove_label_ids):
+    """
+    Aplica batchModify em um lote; se falhar por causa de IDs inválidos
+    (400/404), processa o lote mensagem a mensagem.
+    
+    Outros erros (401/403, ou 429/5xx que execute_request já repetiu até
+    desistir) valem para todo o lote: o lote inteiro é dado como falho, sem
+    o fallback individual, que falharia do mesmo jeito.
+    
+    Returns:
+        Tupla (número de mensagens alteradas, IDs com falha, erro do lote ou None)
+    """
+    messages_resource = service.users().messages()
+    try:
+        execute_request(messages_resource.batchModify(
+            userId='me',
+            body={
+                'ids': chunk,
+                'addLabelIds': add_label_ids,
+                'removeLabelIds': remove_label_ids
+            }
+        ), 'messages.batchModify')
+        return len(chunk), [], None
+    except HttpError as error:
+        if error.resp.status not in (400, 404):
+            return 0, list(chunk), error
+        chunk_error = error
+    
+    # Fallback: processa individualmente apenas o lote que falhou
+    failed_ids = []
+    for position, message_id in enumerate(chunk):
+        try:
+            _modify_single_message(messages_resource, message_id, add_label_ids, remove_label_ids)
+        except HttpError as error:
+            print(f"      ❌ Erro na mensagem {message_id}: {error}")
+            if error.resp.status not in (400, 404):
+                # Erro que não é da mensagem: o restante do lote falharia do mesmo jeito
+                failed_ids.extend(chunk[position:])
+                break
+            failed_ids.append(message_id)
+    
+    return len(chunk) - len(failed_ids), failed_ids, chunk_error
+
+def bulk_modify_messages(service, message_ids, add_label_ids=None, remove_label_ids=None,
+                         chunk_size=BATCH_MODIFY_MAX_IDS, pool=None, verbose=True, on_chunk=None,
+                         index=None):
+    """
+    Aplica alterações de labels em massa usando users.messages.batchModify.
+    
+    Envia até 1000 IDs por chamada. Apenas os lotes que falham são
+    reprocessados mensagem a mensagem.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: Lista de IDs das mensagens
+        add_label_ids: IDs de labels a adicionar (ex: ['TRASH'])
+        remove_label_ids: IDs de labels a remover (ex: ['INBOX', 'UNREAD'])
+        chunk_size: Número de IDs por chamada batchModify (máximo 1000)
+        pool: ServicePool opcional para processar os lotes em paralelo
+        verbose: Se False, exibe apenas os lotes com falha
+        on_chunk: Função opcional on_chunk(lote, ids_com_falha) chamada após cada lote
+        index: MessageIndex opcional; as mensagens alteradas são removidas
+            dele para que os labels não sejam lidos desatualizados
+    
+    Returns:
+        Tupla (número de mensagens alteradas, lista de IDs com falha)
+    """
+    add_label_ids = list(add_label_ids or [])
+    remove_label_ids = list(remove_label_ids or [])
+    chunk_size = max(1, min(chunk_size, BATCH_MODIFY_MAX_IDS))
+    
+    modified_count = 0
+    failed_ids = []
+    total_messages = len(message_ids)
+    chunks = [message_ids[i:i + chunk_size] for i in range(0, total_messages, chunk_size)]
+    
+    def process(service, chunk):
+        return chunk, _modify_chunk(service, chunk, add_label_ids, remove_label_ids)
+    
+    results = _run_tasks(service, pool, process, chunks)
+    for chunk_num, (chunk, (chunk_ok, chunk_failed, chunk_error)) in enumerate(results, 1):
+        modified_count += chunk_ok
+        failed_ids.extend(chunk_failed)
+        if index is not None and chunk_ok:
+            failed = set(chunk_failed)
+            index.delete_many([message_id for message_id in chunk if message_id not in failed])
+        if on_chunk:
+            on_chunk(chunk, chunk_failed)
+        
+        if chunk_error is None:
+            if verbose:
+                print(f"   📦 Lote {chunk_num}/{len(chunks)}: ✅ {chunk_ok} mensagens "
+                      f"({modified_count}/{total_messages})")
+        elif chunk_error.resp.status in (400, 404):
+            print(f"   📦 Lote {chunk_num}/{len(chunks)}: ❌ batchModify falhou "
+                  f"({chunk_error.resp.status}) - fallback individual: {chunk_ok} ok, "
+                  f"{len(chunk_failed)} com falha ({modified_count}/{total_messages})")
+        else:
+            print(f"   📦 Lote {chunk_num}/{len(chunks)}: ❌ batchModify falhou "
+                  f"({chunk_error.resp.status}) - {len(chunk_failed)} mensagens não alteradas: {chunk_error}")
+    
+    metrics.increment('messages_modified', modified_count)
+    metrics.increment('messages_failed', len(failed_ids))
+    return modified_count, failed_ids
+
+def delete_messages(service, message_ids, archive=False, mark_read=False,
+                    add_labels=None, remove_labels=None, trash=True, pool=None, on_chunk=None, index=None):
+    """
+    Deleta (move para a Lixeira) as mensagens especificadas usando batchModify.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: Lista de IDs das mensagens a serem deletadas
+        archive: Se True, também remove o label INBOX
+        mark_read: Se True, também remove o label UNREAD
+        add_labels: IDs de labels adicionais a adicionar
+        remove_labels: IDs de labels adicionais a remover
+        trash: Se False, apenas aplica as alterações de labels sem mover para a Lixeira
+        pool: ServicePool opcional para processar os lotes em paralelo
+        on_chunk: Função opcional chamada após cada lote (ver bulk_modify_messages)
+        index: MessageIndex opcional a atualizar (ver bulk_modify_messages)
+    
+    Returns:
+        Número de mensagens deletadas com sucesso
+    """
+    if not message_ids:
+        return 0
+    
+    deleted_count = 0
+    total_messages = len(message_ids)
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=trash, archive=archive, mark_read=mark_read,
+        add_labels=add_labels, remove_labels=remove_labels
+    )
+    
+    try:
+        if trash:
+            print(f"🗑️ Movendo {total_messages} mensagens para a Lixeira...")
+        else:
+            print(f"🏷️ Alterando labels de {total_messages} mensagens...")
+        
+        deleted_count, failed_ids = bulk_modify_messages(
+            service, message_ids, add_label_ids, remove_label_ids, pool=pool, on_chunk=on_chunk, index=index
+        )
+        
+        if deleted_count > 0:
+            if trash:
+                print(f"✅ {deleted_count} mensagens movidas para a Lixeira com sucesso!")
+            else:
+                print(f"✅ {deleted_count} mensagens alteradas com sucesso!")
+            if failed_ids:
+                print(f"⚠️  {len(failed_ids)} mensagens não puderam ser processadas.")
+        else:
+            print("❌ Nenhuma mensagem foi processada.")
+        
+    except Exception as error:
+        print(f"❌ Erro geral ao deletar mensagens: {error}")
+    
+    return deleted_count
+
+def _batch_delete_chunk(service, chunk):
+    """
+    Deleta permanentemente um lote com batchDelete.
+    
+    Se o lote falhar por causa de IDs inválidos (400/404), divide o lote ao
+    meio e tenta cada metade, até isolar os IDs problemáticos. Os demais
+    erros (permissão, cota ou falha do servidor que persistiram após as
+    novas tentativas) valem para todo o lote, que é marcado como falho sem
+    ser dividido; se um deles ocorrer em uma das metades, o restante do
+    lote também é marcado como falho.
+    
+    Returns:
+        Tupla (número de mensagens deletadas, IDs com falha, erro ou None)
+    """
+    try:
+        execute_request(service.users().messages().batchDelete(
+            userId='me', body={'ids': chunk}
+        ), 'messages.batchDelete')
+        return len(chunk), [], None
+    except HttpError as error:
+        if len(chunk) == 1 or error.resp.status not in (400, 404):
+            return 0, list(chunk), error
+        chunk_error = error
+    
+    middle = len(chunk) // 2
+    deleted = 0
+    failed_ids = []
+    for half in (chunk[:middle], chunk[middle:]):
+        if chunk_error.resp.status not in (400, 404):
+            failed_ids.extend(half)
+            continue
+        half_deleted, half_failed, half_error = _batch_delete_chunk(service, half)
+        deleted += half_deleted
+        failed_ids.extend(half_failed)
+        if half_error is not None and half_error.resp.status not in (400, 404):
+            chunk_error = half_error
+    return deleted, failed_ids, chunk_error
+
+def permanently_delete_messages(service, message_ids, chunk_size=BATCH_MODIFY_MAX_IDS, pool=None, index=None):
+    """
+    Deleta PERMANENTEMENTE as mensagens com users.messages.batchDelete.
+    
+    Envia até 1000 IDs por chamada; os lotes que falham são divididos
+    ao meio repetidamente para isolar os IDs com problema. Exige o escopo
+    completo (FULL_MAIL_SCOPES). As mensagens não podem ser recuperadas.
+    
+    Args:
+        service: Serviço Gmail autenticado com o escopo completo
+        message_ids: Lista de IDs das mensagens
+        chunk_size: Número de IDs por chamada batchDelete (máximo 1000)
+        pool: ServicePool opcional para processar os lotes em paralelo
+        index: MessageIndex opcional de onde as mensagens deletadas são removidas
+    
+    Returns:
+        Tupla (número de mensagens deletadas, lista de IDs com falha)
+    """
+    chunk_size = max(1, min(chunk_size, BATCH_MODIFY_MAX_IDS))
+    total_messages = len(message_ids)
+    chunks = [message_ids[i:i + chunk_size] for i in range(0, total_messages, chunk_size)]
+    deleted_count = 0
+    failed_ids = []
+    
+    print(f"🔥 Deletando permanentemente {total_messages} mensagens...")
+    def process(service, chunk):
+        return chunk, _batch_delete_chunk(service, chunk)
+    
+    for chunk_num, (chunk, (chunk_deleted, chunk_failed, chunk_error)) in enumerate(
+            _run_tasks(service, pool, process, chunks), 1):
+        deleted_count += chunk_deleted
+        failed_ids.extend(chunk_failed)
+        if index is not None and chunk_deleted:
+            failed = set(chunk_failed)
+            index.delete_many([message_id for message_id in chunk if message_id not in failed])
+        if chunk_error is None:
+            print(f"   📦 Lote {chunk_num}/{len(chunks)}: ✅ {chunk_deleted} mensagens "
+                  f"({deleted_count}/{total_messages})")
+        else:
+            print(f"   📦 Lote {chunk_num}/{len(chunks)}: ❌ batchDelete falhou "
+                  f"({chunk_error.resp.status}) - divisão do lote: {chunk_deleted} ok, "
+                  f"{len(chunk_failed)} com falha ({deleted_count}/{total_messages})")
+            if chunk_error.resp.status == 403:
+                print("   💡 Verifique se o token concede o escopo completo (https://mail.google.com/)")
+    
+    metrics.increment('messages_deleted', deleted_count)
+    metrics.increment('messages_failed', len(failed_ids))
+    return deleted_count, failed_ids
+
+def run_permanent_delete(service, args, pool=None):
+    """
+    Modos --delete --permanent e --empty-trash: amostra, confirmação e batchDelete.
+    """
+    if args.empty_trash:
+        query = f'in:trash {args.filter}'.strip()
+        where = " da Lixeira"
+    else:
+        query = args.filter
+        where = ""
+    
+    print(f"\n🔍 Buscando amostra de mensagens com filtro: '{query}'")
+    sample_messages = search_messages(service, query, args.max_results, get_all=False)
+    if not sample_messages:
+        print("📭 Nenhuma mensagem encontrada.")
+        return
+    sample_ids = [msg['id'] for msg in sample_messages]
+    details_by_id = fetch_message_details_batch(service, sample_ids, pool=pool)
+    display_messages(_apply_sample_predicate(
+        [details_by_id[message_id] for message_id in sample_ids if message_id in details_by_id], args.predicate
+    ))
+    
+    print(f"\n🔍 Buscando TODAS as mensagens que combinam com o filtro para deleção...")
+    all_messages = search_messages(service, query, args.max_results, get_all=True, pool=pool)
+    message_ids = [msg['id'] for msg in all_messages]
+    index = None if args.no_cache else MessageIndex(open_db(args.db))
+    if args.predicate and message_ids:
+        message_ids = filter_messages(service, message_ids, args.predicate, index, args.cache_ttl, pool=pool)
+    if not message_ids:
+        print("❌ Nenhuma mensagem encontrada para deletar.")
+        return
+    
+    print(f"\n⚠️  ATENÇÃO: Você está prestes a deletar PERMANENTEMENTE {len(message_ids)} mensagens{where}!")
+    print("   Elas serão apagadas de vez (sem passar pela Lixeira) e NÃO poderão ser recuperadas.")
+    confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return
+    
+    deleted_count, failed_ids = permanently_delete_messages(
+        service, message_ids, pool=pool, index=index
+    )
+    print(f"🎉 Operação concluída! {deleted_count} mensagens foram deletadas permanentemente.")
+    if failed_ids:
+        print(f"⚠️  Nota: {len(failed_ids)} mensagens não puderam ser deletadas.")
+
+def search_threads(service, query, max_results=50, get_all=False):
+    """
+    Busca as conversas com alguma mensagem que combina com a query.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        query: Query de busca
+        max_results: Número máximo de conversas da amostra
+        get_all: Se True, busca TODAS as conversas
+    
+    Returns:
+        Lista de IDs das conversas
+    """
+    print(f"🔍 Buscando conversas com query: '{query}'")
+    thread_ids = []
+    page_token = None
+    while True:
+        results = execute_request(service.users().threads().list(
+            userId='me',
+            q=query,
+            maxResults=LIST_PAGE_SIZE if get_all else max_results,
+            pageToken=page_token,
+            fields=THREAD_LIST_FIELDS
+        ), 'threads.list')
+        threads = results.get('threads', [])
+        thread_ids.extend(thread['id'] for thread in threads)
+        if get_all:
+            print(f"   🧵 Lote encontrado: {len(threads)} conversas (Total: {len(thread_ids)})")
+        
+        page_token = results.get('nextPageToken')
+        if not get_all or not page_token:
+            break
+    
+    print(f"📊 {len(thread_ids)} conversas encontradas")
+    return thread_ids
+
+def _parse_thread_details(thread):
+    """
+    Resume uma resposta threads.get em uma linha: assunto da primeira
+    mensagem, remetente e data da última e número de mensagens.
+    """
+    messages = [_parse_message_details(message) for message in thread.get('messages', [])]
+    first = messages[0] if messages else _parse_message_details({'id': thread['id']})
+    last = messages[-1] if messages else first
+    return {
+        'id': thread['id'],
+        'subject': first['subject'],
+        'from': last['from'],
+        'date': last['date'],
+        'message_count': len(messages),
+        'message_ids': [message['id'] for message in messages],
+    }
+
+def _execute_threads_batch(service, thread_ids, method, make_request):
+    """
+    Envia uma requisição HTTP batch com uma chamada make_request(recurso, id) por conversa.
+    
+    Returns:
+        Tupla ({id: resposta}, {id: erro})
+    """
+    responses = {}
+    errors = {}
+    
+    def callback(request_id, response, exception):
+        if exception is None:
+            responses[request_id] = response or {}
+        else:
+            errors[request_id] = exception
+    
+    threads_resource = service.users().threads()
+    batch = service.new_batch_http_request(callback=callback)
+    for thread_id in thread_ids:
+        batch.add(make_request(threads_resource, thread_id), request_id=thread_id)
+    try:
+        execute_request(batch, method, calls=len(thread_ids))
+    except HttpError as error:
+        for thread_id in thread_ids:
+            if thread_id not in responses:
+                errors[thread_id] = error
+    
+    return responses, errors
+
+def _run_thread_batches(service, thread_ids, method, make_request, pool=None,
+                        max_retries=3, verbose=False, on_chunk=None):
+    """
+    Executa uma chamada por conversa em requisições batch de THREAD_BATCH_SIZE,
+    reenviando apenas as sub-requisições que falharam com erros temporários.
+    
+    on_chunk(respostas) é chamada com as respostas {id: resposta} de cada lote.
+    
+    Returns:
+        Tupla ({id: resposta}, {id: erro} das conversas que falharam)
+    """
+    pending = list(dict.fromkeys(thread_ids))
+    total = len(pending)
+    responses = {}
+    failed = {}
+    
+    for attempt in range(max_retries + 1):
+        retry_ids = []
+        chunks = [pending[i:i + THREAD_BATCH_SIZE] for i in range(0, len(pending), THREAD_BATCH_SIZE)]
+        
+        def process(service, chunk):
+            return _execute_threads_batch(service, chunk, method, make_request)
+        
+        for chunk_num, (chunk_responses, chunk_errors) in enumerate(_run_tasks(service, pool, process, chunks), 1):
+            responses.update(chunk_responses)
+            if on_chunk and chunk_responses:
+                on_chunk(chunk_responses)
+            for thread_id, error in chunk_errors.items():
+                if _is_retryable_error(error) and attempt < max_retries:
+                    retry_ids.append(thread_id)
+                else:
+                    print(f"      ❌ Erro na conversa {thread_id}: {error}")
+                    failed[thread_id] = error
+            if verbose:
+                status = f"✅ {len(chunk_responses)} conversas" if not chunk_errors else \
+                    f"⚠️  {len(chunk_responses)} ok, {len(chunk_errors)} com erro"
+                print(f"   📦 Lote {chunk_num}/{len(chunks)}: {status} ({len(responses)}/{total})")
+        
+        if not retry_ids:
+            break
+        
+        delay = _backoff_delay(attempt)
+        print(f"   🔁 Repetindo {len(retry_ids)} conversas com falha em {delay:.1f}s...")
+        metrics.record_retry(method, delay, len(retry_ids))
+        rate_limiter.pause(delay)
+        pending = retry_ids
+    
+    return responses, failed
+
+def fetch_thread_details_batch(service, thread_ids, pool=None):
+    """
+    Obtém o resumo de várias conversas (threads.get em requisições batch).
+    
+    Returns:
+        Dicionário {id da conversa: detalhes da conversa}
+    """
+    responses, _ = _run_thread_batches(
+        service, thread_ids, 'threads.get',
+        lambda threads, thread_id: threads.get(
+            userId='me', id=thread_id, format='metadata',
+            metadataHeaders=METADATA_HEADERS, fields=THREAD_DETAILS_FIELDS
+        ),
+        pool=pool
+    )
+    return {thread_id: _parse_thread_details(thread) for thread_id, thread in responses.items()}
+
+def display_threads(threads):
+    """
+    Exibe uma linha por conversa, com o número de mensagens.
+    """
+    print(f"\n🧵 Encontradas {len(threads)} conversas:")
+    print("=" * 80)
+    for i, thread in enumerate(threads, 1):
+        print(f"{i:3d}. [{thread['message_count']:>3} msgs] {thread['subject'][:45]} - {thread['from'][:30]}")
+    print("=" * 80)
+    total = sum(thread['message_count'] for thread in threads)
+    print(f"   Total: {total} mensagens em {len(threads)} conversas")
+
+def modify_threads(service, thread_ids, add_label_ids=None, remove_label_ids=None, pool=None,
+                   on_messages=None):
+    """
+    Aplica alterações de labels em conversas inteiras, em requisições batch.
+    
+    O TRASH é aplicado via threads.trash; os demais labels via threads.modify.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        thread_ids: Lista de IDs das conversas
+        add_label_ids: IDs de labels a adicionar (ex: ['TRASH'])
+        remove_label_ids: IDs de labels a remover (ex: ['INBOX', 'UNREAD'])
+        pool: ServicePool opcional para enviar as requisições batch em paralelo
+        on_messages: Função opcional on_messages(ids) chamada com os IDs das
+            mensagens das conversas alteradas em cada lote (ex: para o diário)
+    
+    Returns:
+        Tupla (número de conversas alteradas, número de mensagens dessas
+        conversas, lista de IDs de conversas com falha)
+    """
+    add_label_ids = list(add_label_ids or [])
+    remove_label_ids = list(remove_label_ids or [])
+    other_add = [label for label in add_label_ids if label != 'TRASH']
+    responses = {}
+    failed = {}
+    on_chunk = None
+    if on_messages:
+        on_chunk = lambda chunk_responses: on_messages([
+            message['id'] for thread in chunk_responses.values() for message in thread.get('messages', [])
+        ])
+    
+    if other_add or remove_label_ids:
+        print(f"🏷️ Alterando labels de {len(thread_ids)} conversas...")
+        body = {'addLabelIds': other_add, 'removeLabelIds': remove_label_ids}
+        responses, failed = _run_thread_batches(
+            service, thread_ids, 'threads.modify',
+            lambda threads, thread_id: threads.modify(
+                userId='me', id=thread_id, body=body, fields=THREAD_MODIFY_FIELDS
+            ),
+            pool=pool, verbose=True, on_chunk=on_chunk
+        )
+    
+    if 'TRASH' in add_label_ids:
+        print(f"🗑️ Movendo {len(thread_ids) - len(failed)} conversas para a Lixeira...")
+        responses, trash_failed = _run_thread_batches(
+            service, [thread_id for thread_id in thread_ids if thread_id not in failed], 'threads.trash',
+            lambda threads, thread_id: threads.trash(userId='me', id=thread_id, fields=THREAD_MODIFY_FIELDS),
+            pool=pool, verbose=True, on_chunk=on_chunk
+        )
+        failed.update(trash_failed)
+    
+    message_count = sum(len(thread.get('messages', [])) for thread in responses.values())
+    metrics.increment('threads_modified', len(responses))
+    metrics.increment('threads_failed', len(failed))
+    metrics.increment('messages_modified', message_count)
+    return len(responses), message_count, list(failed)
+
+def run_threads(service, args, modify_labels, pool=None):
+    """
+    Modo --threads: amostra e alterações por conversa em vez de por mensagem.
+    """
+    if args.stream or args.incremental or args.rule or args.rules or args.where:
+        print("⚠️  --stream, --incremental, --rule, --rules e --where são ignorados com --threads.")
+    
+    print(f"\n🔍 Buscando amostra de conversas com filtro: '{args.filter}'")
+    sample_ids = search_threads(service, args.filter, args.max_results)
+    if not sample_ids:
+        print("📭 Nenhuma conversa encontrada.")
+        return
+    
+    details_by_id = fetch_thread_details_batch(service, sample_ids, pool=pool)
+    display_threads([details_by_id[thread_id] for thread_id in sample_ids if thread_id in details_by_id])
+    
+    if not (args.delete or modify_labels):
+        print(f"\n💡 Para deletar as conversas inteiras, execute o comando com --delete:")
+        print(f"   python gmail_cleaner.py '{args.filter}' --threads --delete")
+        return
+    
+    print(f"\n🔍 Buscando TODAS as conversas que combinam com o filtro...")
+    thread_ids = search_threads(service, args.filter, get_all=True)
+    action = "deletar" if args.delete else "alterar os labels de"
+    print(f"\n⚠️  ATENÇÃO: Você está prestes a {action} {len(thread_ids)} conversas inteiras "
+          f"(todas as mensagens de cada conversa)!")
+    confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return
+    
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=args.delete, archive=args.archive, mark_read=args.mark_read,
+        add_labels=args.add_label, remove_labels=args.remove_label
+    )
+    journal, run_id = _start_journal(args, kind='threads')
+    index = MessageIndex(journal.conn)
+    
+    def on_messages(message_ids):
+        journal.record_chunk(run_id, message_ids, [])
+        index.delete_many(message_ids)
+    
+    processed, message_count, failed_ids = modify_threads(
+        service, thread_ids, add_label_ids, remove_label_ids, pool=pool, on_messages=on_messages
+    )
+    journal.finish_run(run_id)
+    done = "deletadas" if args.delete else "alteradas"
+    print(f"🎉 Operação concluída! {processed} conversas ({message_count} mensagens) foram {done}.")
+    if failed_ids:
+        print(f"⚠️  Nota: {len(failed_ids)} conversas não puderam ser {done}.")
+
+def _produce_id_pages(service, query, page_queue, stop_event, page_token=None):
+    """
+    Thread produtora: lista as páginas de IDs e as coloca na fila.
+    
+    Cada item é uma tupla (IDs da página, nextPageToken). Termina com None
+    na fila, ou com a exceção que interrompeu a listagem.
+    """
+    try:
+        for results in iter_message_pages(service, query, page_token=page_token):
+            page = ([msg['id'] for msg in results.get('messages', [])], results.get('nextPageToken'))
+            while not stop_event.is_set():
+                try:
+                    page_queue.put(page, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if stop_event.is_set():
+                return
+        page_queue.put(None)
+    except Exception as error:
+        page_queue.put(error)
+
+def stream_delete_messages(service, list_service, query, archive=False, mark_read=False,
+                           add_labels=None, remove_labels=None, trash=True, pool=None,
+                           queue_pages=STREAM_QUEUE_PAGES, journal=None, run_id=None,
+                           page_token=None, predicate=None, index=None):
+    """
+    Deleta as mensagens enquanto ainda as lista (pipeline produtor/consumidor).
+    
+    Uma thread lista as páginas de IDs e as envia por uma fila limitada;
+    a thread atual aplica batchModify à medida que as páginas chegam.
+    Os IDs não ficam todos em memória.
+    
+    Ao mover para a Lixeira, a listagem é repetida até não restarem mensagens,
+    pois a paginação pode pular mensagens enquanto outras são removidas.
+    
+    Args:
+        service: Serviço Gmail autenticado (usado para as alterações)
+        list_service: Serviço Gmail exclusivo da thread de listagem
+        query: Query de busca
+        archive, mark_read, add_labels, remove_labels, trash: Ver delete_messages
+        pool: ServicePool opcional para processar os lotes em paralelo
+        queue_pages: Número máximo de páginas aguardando na fila
+        journal: RunJournal opcional onde o progresso é gravado a cada lote
+        run_id: ID da execução no diário
+        page_token: Token de página para retomar a primeira passada (--resume)
+        predicate: Filtro local opcional (--where) aplicado antes de cada lote
+        index: MessageIndex opcional usado pelo filtro local
+    
+    Returns:
+        Tupla (número de mensagens processadas, número de mensagens com falha)
+    """
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=trash, archive=archive, mark_read=mark_read,
+        add_labels=add_labels, remove_labels=remove_labels
+    )
+    buffer_size = BATCH_MODIFY_MAX_IDS * (pool.workers if pool else 1)
+    processed_count = 0
+    failed_ids = set()
+    # Mensagens recusadas pelo filtro local continuam casando com a query nas próximas passadas
+    rejected_ids = set()
+    pass_num = 0
+    on_chunk = (lambda chunk, failed: journal.record_chunk(run_id, chunk, failed)) if journal else None
+    # Índice de onde as mensagens alteradas são removidas (o do filtro local ou o do banco do diário)
+    stale_index = index if index is not None else (MessageIndex(journal.conn) if journal else None)
+    
+    while True:
+        pass_num += 1
+        pass_count = 0
+        page_queue = queue.Queue(maxsize=queue_pages)
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target=_produce_id_pages,
+            args=(list_service, query, page_queue, stop_event, page_token),
+            daemon=True
+        )
+        page_token = None
+        print(f"🚰 Passada {pass_num}: listando e processando em paralelo...")
+        producer.start()
+        
+        try:
+            buffer = []
+            buffer_token = None
+            finished = False
+            while not finished:
+                item = page_queue.get()
+                if item is None:
+                    finished = True
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    message_ids, buffer_token = item
+                    if journal:
+                        message_ids = journal.filter_unprocessed(run_id, message_ids)
+                    message_ids = [message_id for message_id in message_ids
+                                   if message_id not in failed_ids and message_id not in rejected_ids]
+                    if predicate and message_ids:
+                        passed = filter_messages(service, message_ids, predicate, index, pool=pool, verbose=False)
+                        rejected_ids.update(set(message_ids).difference(passed))
+                        message_ids = passed
+                    buffer.extend(message_ids)
+                
+                if buffer and (finished or len(buffer) >= buffer_size):
+                    ok, failed = bulk_modify_messages(
+                        service, buffer, add_label_ids, remove_label_ids,
+                        pool=pool, verbose=False, on_chunk=on_chunk, index=stale_index
+                    )
+                    processed_count += ok
+                    pass_count += ok
+                    failed_ids.update(failed)
+                    buffer = []
+                    if journal:
+                        journal.save_page_token(run_id, buffer_token)
+                    rejected = f", recusadas pelo filtro local: {len(rejected_ids)}" if predicate else ""
+                    print(f"   ✅ Processadas: {processed_count} (falhas: {len(failed_ids)}{rejected}, "
+                          f"páginas na fila: {page_queue.qsize()})")
+        finally:
+            stop_event.set()
+            producer.join()
+        
+        # Sem Lixeira a query continua casando; em uma passada sem novidades, terminou
+        if not trash or pass_count == 0:
+            break
+    
+    return processed_count, len(failed_ids)
+
+def report_messages(service, list_service, query, pool=None, index=None,
+                    max_age_hours=DEFAULT_CACHE_TTL_HOURS, queue_pages=STREAM_QUEUE_PAGES, predicate=None):
+    """
+    Gera o relatório de uso (remetentes, domínios, labels, meses, tamanhos)
+    das mensagens que combinam com a query.
+    
+    Como no modo streaming, uma thread lista as páginas de IDs enquanto a
+    thread atual busca os metadados em requisições batch (ou no índice
+    local) e os agrega no MailboxReport; nem os IDs nem os metadados ficam
+    em memória.
+    
+    Args:
+        service: Serviço Gmail autenticado (usado para buscar os metadados)
+        list_service: Serviço Gmail exclusivo da thread de listagem
+        query: Query de busca
+        pool: ServicePool opcional para buscar os metadados em paralelo
+        index: MessageIndex opcional (metadados já conhecidos não são buscados)
+        max_age_hours: Idade máxima de uma entrada do índice
+        queue_pages: Número máximo de páginas aguardando na fila
+        predicate: Filtro local opcional (--where); apenas as mensagens que passam são agregadas
+    
+    Returns:
+        MailboxReport com os totais agregados
+    """
+    report = MailboxReport()
+    buffer_size = max(LIST_PAGE_SIZE, BATCH_GET_MAX_REQUESTS * (pool.workers if pool else 1))
+    page_queue = queue.Queue(maxsize=queue_pages)
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=_produce_id_pages,
+        args=(list_service, query, page_queue, stop_event),
+        daemon=True
+    )
+    print(f"📊 Listando e agregando os metadados das mensagens...")
+    producer.start()
+    
+    try:
+        buffer = []
+        finished = False
+        while not finished:
+            item = page_queue.get()
+            if item is None:
+                finished = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                buffer.extend(item[0])
+            
+            if buffer and (finished or len(buffer) >= buffer_size):
+                details = fetch_message_details_cached(service, buffer, index, max_age_hours, pool=pool)
+                for message_details in details.values():
+                    if predicate is None or predicate(message_details):
+                        report.add(message_details)
+                buffer = []
+                print(f"   📊 {report.messages} mensagens agregadas ({format_bytes(report.bytes)})")
+    finally:
+        stop_event.set()
+        producer.join()
+    
+    return report
+
+def _start_journal(args, query=None, kind='clean'):
+    """
+    Registra uma nova execução no diário e informa o ID para --resume.
+    
+    Args:
+        args: Argumentos da linha de comando
+        query: Query registrada no diário (padrão: o filtro da linha de comando)
+        kind: Modo da execução; apenas 'clean' pode ser retomada com --resume
+    
+    Returns:
+        Tupla (RunJournal, ID da execução)
+    """
+    journal = RunJournal(open_db(args.db))
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=args.delete, archive=args.archive, mark_read=args.mark_read,
+        add_labels=args.add_label, remove_labels=args.remove_label
+    )
+    run_id = journal.create_run(args.filter if query is None else query, add_label_ids, remove_label_ids,
+                                where_expr=args.where, kind=kind)
+    if kind == 'clean':
+        args.run_id = run_id
+        print(f"📓 Execução registrada: {run_id} (se for interrompida, retome com --resume {run_id})")
+    else:
+        print(f"📓 Execução registrada: {run_id} (para desfazer: --undo {run_id})")
+    return journal, run_id
+
+def resume_run(service, creds, journal, run_id, pool=None):
+    """
+    Retoma uma execução interrompida a partir do diário.
+    
+    Se a listagem já estava completa, processa apenas os IDs pendentes;
+    senão, continua a listagem a partir do último nextPageToken gravado,
+    ignorando os IDs já processados e reaplicando o filtro local (--where)
+    gravado na execução.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        creds: Credenciais (para o serviço da thread de listagem)
+        journal: RunJournal com a execução
+        run_id: ID da execução a retomar
+        pool: ServicePool opcional para processar os lotes em paralelo
+    
+    Returns:
+        Número de mensagens processadas
+    """
+    run = journal.get_run(run_id)
+    if run is None:
+        print(f"❌ Execução '{run_id}' não encontrada no diário.")
+        return 0
+    if run['status'] == 'undone':
+        print(f"❌ A execução '{run_id}' foi desfeita com --undo e não pode ser retomada.")
+        return 0
+    if run['kind'] != 'clean':
+        print(f"❌ A execução '{run_id}' (modo {run['kind']}) não pode ser retomada; use --undo para desfazê-la.")
+        return 0
+    
+    trash = 'TRASH' in run['add_label_ids']
+    add_labels = [label for label in run['add_label_ids'] if label != 'TRASH']
+    remove_labels = run['remove_label_ids']
+    on_chunk = lambda chunk, failed: journal.record_chunk(run_id, chunk, failed)
+    try:
+        predicate = compile_predicate(run['where_expr']) if run['where_expr'] else None
+    except PredicateError as error:
+        print(f"❌ Filtro local (--where) gravado na execução é inválido: {error}")
+        return 0
+    
+    print(f"🔄 Retomando execução {run_id}")
+    print(f"   - Query: '{run['query']}'")
+    if predicate:
+        print(f"   - Filtro local: {run['where_expr']}")
+    print(f"   - Já processadas: {journal.count(run_id, 'done')} mensagens")
+    
+    if run['listing_done'] or run['status'] == 'done':
+        message_ids = journal.pending_ids(run_id)
+        print(f"   - Pendentes: {len(message_ids)} mensagens")
+        if not message_ids:
+            print("✅ Nada a fazer: a execução já foi concluída.")
+            journal.finish_run(run_id)
+            return 0
+    else:
+        print("   - Listagem continua a partir da última página processada")
+    
+    confirm = input("🤔 Retomar? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return 0
+    
+    if run['listing_done'] or run['status'] == 'done':
+        processed_count = delete_messages(
+            service, message_ids, add_labels=add_labels, remove_labels=remove_labels,
+            trash=trash, pool=pool, on_chunk=on_chunk, index=MessageIndex(journal.conn)
+        )
+    else:
+        processed_count, failed_count = stream_delete_messages(
+            service, build_service(creds), run['query'],
+            add_labels=add_labels, remove_labels=remove_labels, trash=trash, pool=pool,
+            journal=journal, run_id=run_id, page_token=run['page_token'], predicate=predicate
+        )
+        if failed_count:
+            print(f"⚠️  Nota: {failed_count} mensagens não puderam ser processadas.")
+    
+    journal.finish_run(run_id)
+    print(f"🎉 Execução {run_id} retomada: {processed_count} mensagens processadas.")
+    return processed_count
+
+def display_recent_runs(journal, limit=10):
+    """
+    Exibe as execuções mais recentes do diário (para escolher o ID de --undo).
+    """
+    runs = journal.recent_runs(limit)
+    if not runs:
+        print("📭 Nenhuma execução registrada no diário.")
+        return
+    print(f"\n📓 Execuções recentes:")
+    print(f"   {'ID':<24} {'modo':<8} {'estado':<8} {'mensagens':>9}  query")
+    for run in runs:
+        query = run['query'].replace('\n', ' | ')
+        print(f"   {run['run_id']:<24} {run['kind']:<8} {run['status']:<8} {run['done']:>9}  {query}")
+
+def restore_run_messages(service, journal, run_id, pool=None, verbose=True):
+    """
+    Aplica as alterações de labels inversas às mensagens processadas com
+    sucesso por uma execução, sem pedir confirmação (usado por --undo e pelo
+    modo frota).
+    
+    Cada lote restaurado é marcado no diário como 'restored'; se todos forem
+    restaurados, a execução é marcada como 'undone'.
+    
+    Returns:
+        Tupla (número de mensagens restauradas, lista de IDs com falha)
+    """
+    run = journal.get_run(run_id)
+    message_ids = journal.ids_with_status(run_id, 'done')
+    
+    def on_chunk(chunk, failed):
+        failed = set(failed)
+        journal.mark_messages(run_id, [message_id for message_id in chunk if message_id not in failed], 'restored')
+    
+    restored_count, failed_ids = bulk_modify_messages(
+        service, message_ids, run['remove_label_ids'], run['add_label_ids'],
+        pool=pool, verbose=verbose, on_chunk=on_chunk, index=MessageIndex(journal.conn)
+    )
+    metrics.increment('messages_restored', restored_count)
+    if not failed_ids:
+        journal.finish_run(run_id, status='undone')
+    return restored_count, failed_ids
+
+def undo_run(service, creds, journal, run_id, pool=None):
+    """
+    Desfaz uma execução registrada no diário (--undo).
+    
+    Aplica as alterações de labels inversas às mensagens processadas com
+    sucesso: remove o TRASH (restaurando da Lixeira) e os labels adicionados
+    e adiciona de volta os removidos (ex: INBOX de --archive). Usa
+    batchModify com 1000 IDs por chamada, em paralelo, e marca cada lote
+    restaurado no diário; se for interrompido, basta repetir o comando.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        creds: Credenciais (para criar o pool quando não há --workers)
+        journal: RunJournal com a execução
+        run_id: ID da execução a desfazer
+        pool: ServicePool opcional
+    
+    Returns:
+        Número de mensagens restauradas
+    """
+    run = journal.get_run(run_id)
+    if run is None:
+        print(f"❌ Execução '{run_id}' não encontrada no diário.")
+        display_recent_runs(journal)
+        return 0
+    
+    message_ids = journal.ids_with_status(run_id, 'done')
+    restored_before = journal.count(run_id, 'restored')
+    add_label_ids = run['remove_label_ids']
+    remove_label_ids = run['add_label_ids']
+    
+    print(f"↩️  Desfazendo execução {run_id}")
+    print(f"   - Query: '{run['query']}'")
+    print(f"   - Labels a remover: {remove_label_ids or '-'}; a adicionar de volta: {add_label_ids or '-'}")
+    if restored_before:
+        print(f"   - Já restauradas: {restored_before} mensagens")
+    print(f"   - A restaurar: {len(message_ids)} mensagens")
+    if not message_ids:
+        print("✅ Nada a desfazer.")
+        return 0
+    if add_label_ids:
+        print(f"⚠️  {add_label_ids} será adicionado a todas as mensagens da execução, inclusive às que "
+              f"não o tinham antes (ex: mensagens que já estavam lidas ou arquivadas).")
+    
+    confirm = input("🤔 Desfazer? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return 0
+    
+    chunks = -(-len(message_ids) // BATCH_MODIFY_MAX_IDS)
+    undo_pool = pool or (ServicePool(creds, min(UNDO_WORKERS, chunks)) if chunks > 1 else None)
+    try:
+        restored_count, failed_ids = restore_run_messages(service, journal, run_id, undo_pool)
+    finally:
+        if undo_pool is not pool:
+            undo_pool.close()
+    
+    print(f"🎉 Execução {run_id} desfeita: {restored_count} mensagens restauradas.")
+    if failed_ids:
+        print(f"⚠️  Nota: {len(failed_ids)} mensagens não puderam ser restauradas "
+              f"(ex: apagadas definitivamente); repita o comando para tentar de novo.")
+    return restored_count
+
+def run_rules(service, creds, args, rules, modify_labels, pool=None):
+    """
+    Executa várias regras (queries) em uma única passada de deleção.
+    
+    Lista todas as regras com o mesmo serviço autenticado, une os IDs sem
+    repetições e processa o conjunto com um único bulk_modify_messages.
+    """
+    if args.stream or args.incremental:
+        print("⚠️  --stream e --incremental são ignorados com várias regras.")
+    
+    print(f"\n🔍 Listando {len(rules)} regras...")
+    list_pool = pool or ServicePool(creds, min(len(rules), MULTI_QUERY_LIST_WORKERS))
+    try:
+        message_ids, stats = search_messages_multi(service, rules, list_pool)
+    finally:
+        if list_pool is not pool:
+            list_pool.close()
+    display_rule_stats(stats, len(message_ids))
+    
+    index = None if args.no_cache else MessageIndex(open_db(args.db))
+    if args.predicate and message_ids:
+        print(f"\n🔬 Aplicando o filtro local a {len(message_ids)} mensagens...")
+        message_ids = filter_messages(service, message_ids, args.predicate, index, args.cache_ttl, pool=pool)
+    
+    if not message_ids:
+        print("📭 Nenhuma mensagem encontrada.")
+        return
+    
+    sample_ids = message_ids[:args.max_results]
+    print(f"\n📋 Obtendo detalhes da amostra de {len(sample_ids)} mensagens...")
+    details_by_id = fetch_message_details_cached(
+        service, sample_ids, index, max_age_hours=args.cache_ttl, pool=pool
     )
-    parser.add_argument(
-        '--max-results', 
-        type=int, 
-        default=50,
-        help='Número máximo de mensagens para buscar (padrão: 50)'
+    display_messages([details_by_id[message_id] for message_id in sample_ids if message_id in details_by_id])
+    
+    if not (args.delete or modify_labels):
+        print(f"\n💡 Para deletar estas {len(message_ids)} mensagens, execute o comando com --delete.")
+        return
+    
+    action = "deletar" if args.delete else "alterar os labels de"
+    print(f"\n⚠️  ATENÇÃO: Você está prestes a {action} {len(message_ids)} mensagens de {len(rules)} regras!")
+    confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return
+    
+    # A união das regras é registrada como uma única query equivalente
+    journal, run_id = _start_journal(args, ' OR '.join(f'({rule})' for rule in rules))
+    journal.add_pending(run_id, message_ids)
+    processed_count = delete_messages(
+        service, message_ids,
+        archive=args.archive, mark_read=args.mark_read,
+        add_labels=args.add_label, remove_labels=args.remove_label,
+        trash=args.delete, pool=pool,
+        on_chunk=lambda chunk, failed: journal.record_chunk(run_id, chunk, failed),
+        index=MessageIndex(journal.conn)
     )
-    parser.add_argument(
-        '--test',
-        action='store_true',
-        help='Executar teste de conexão e mostrar estatísticas básicas'
+    journal.finish_run(run_id)
+    
+    done = "deletadas" if args.delete else "alteradas"
+    print(f"🎉 Operação concluída! {processed_count} mensagens foram {done}.")
+    if processed_count != len(message_ids):
+        print(f"⚠️  Nota: {len(message_ids) - processed_count} mensagens não puderam ser {done}.")
+
+def start_mailbox_watch(service, topic):
+    """
+    Pede ao Gmail que publique as mudanças da caixa no tópico do Cloud Pub/Sub.
+    
+    Returns:
+        Instante (epoch em segundos) em que o watch expira
+    """
+    response = execute_request(service.users().watch(
+        userId='me', body={'topicName': topic, 'labelFilterBehavior': 'include'}
+    ), 'watch')
+    return int(response['expiration']) / 1000
+
+def _date_windows(dates, max_windows=MATCH_MAX_WINDOWS):
+    """
+    Agrupa datas (em segundos) em até max_windows janelas [início, fim),
+    separando-as nos maiores intervalos sem nenhuma data.
+    """
+    dates = sorted(set(dates))
+    gaps = sorted(range(1, len(dates)), key=lambda i: dates[i] - dates[i - 1], reverse=True)
+    cuts = sorted(gaps[:max_windows - 1])
+    return [(dates[first], dates[last - 1] + 1) for first, last in zip([0] + cuts, cuts + [len(dates)])]
+
+def match_new_messages(service, message_ids, rules, predicate=None, index=None, pool=None):
+    """
+    Aplica as regras apenas às mensagens que acabaram de chegar (ou mudaram).
+    
+    Busca os metadados das mensagens e lista cada regra restrita às janelas
+    de datas (internalDate) em que elas estão (_date_windows), mantendo só
+    esses IDs. Assim cada verificação custa poucas chamadas, qualquer que
+    seja o tamanho da caixa, mesmo quando uma das mensagens é antiga.
+    
+    Args:
+        service: Serviço Gmail autenticado
+        message_ids: IDs das mensagens novas
+        rules: Lista de queries
+        predicate: Filtro local opcional (--where)
+        index: MessageIndex opcional
+        pool: ServicePool opcional
+    
+    Returns:
+        Lista dos detalhes das mensagens novas que combinam com alguma regra
+    """
+    details = fetch_message_details_batch(service, message_ids, pool=pool)
+    if index is not None and details:
+        index.upsert_many(details.values())
+    dates = [d['internal_date'] // 1000 for d in details.values() if d.get('internal_date')]
+    if not dates:
+        return []
+    
+    windows = _date_windows(dates)
+    windowed = [_shard_query(rule.strip(), window) for rule in rules for window in windows]
+    matched = set()
+    for _, rule_ids in _run_tasks(service, pool, _list_query_ids, windowed):
+        matched.update(message_id for message_id in rule_ids if message_id in details)
+    
+    return [details[message_id] for message_id in message_ids
+            if message_id in matched and (predicate is None or predicate(details[message_id]))]
+
+def watch_mailbox(service, rules, subscriber, add_label_ids=None, remove_label_ids=None,
+                  predicate=None, index=None, pool=None, journal=None, run_id=None,
+                  sync_state=None, state_key=None, topic=None):
+    """
+    Laço do modo daemon: a cada notificação (ou intervalo de polling),
+    descobre as mensagens novas com users.history.list e aplica as regras
+    apenas a elas.
+    
+    Uma verificação sem mudanças custa uma única chamada getProfile. Sem
+    alterações de labels, apenas exibe as mensagens que seriam processadas.
+    
+    Args:
+        service: Serviço Gmail autenticado (mantido durante toda a execução)
+        rules: Lista de queries
+        subscriber: Fonte de notificação (ver gmail_watch.py)
+        add_label_ids: IDs de labels a adicionar (ex: ['TRASH'])
+        remove_label_ids: IDs de labels a remover
+        predicate: Filtro local opcional (--where)
+        index: MessageIndex opcional
+        pool: ServicePool opcional
+        journal: RunJournal opcional onde os IDs processados são gravados
+        run_id: ID da execução no diário
+        sync_state: SyncState opcional para continuar de onde parou ao reiniciar
+        state_key: Chave do estado no SyncState
+        topic: Tópico do Cloud Pub/Sub para users.watch (opcional)
+    
+    Returns:
+        Tupla (número de mensagens processadas, número de mensagens com falha)
+    """
+    act = bool(add_label_ids or remove_label_ids)
+    on_chunk = (lambda chunk, failed: journal.record_chunk(run_id, chunk, failed)) if journal else None
+    stale_index = index if index is not None else (MessageIndex(journal.conn) if journal else None)
+    processed_count = failed_count = 0
+    watch_expires_at = 0
+    
+    state = sync_state.get(state_key) if sync_state else None
+    history_id = state['history_id'] if state else get_mailbox_history_id(service)
+    checked_at = state['synced_at'] if state else time.time()
+    if state:
+        print(f"🔄 Continuando a partir do historyId {history_id} gravado")
+    
+    while True:
+        try:
+            if topic and time.time() > watch_expires_at - WATCH_RENEW_SECONDS:
+                watch_expires_at = start_mailbox_watch(service, topic)
+                print(f"📡 users.watch ativo até {datetime.fromtimestamp(watch_expires_at):%d/%m/%Y %H:%M}")
+            
+            current_history_id = get_mailbox_history_id(service)
+            if str(current_history_id) != str(history_id):
+                try:
+                    new_ids = list(dict.fromkeys(iter_history_added_ids(service, history_id)))
+                except HistoryExpiredError:
+                    since = int(checked_at) - INCREMENTAL_SLACK_SECONDS
+                    print("⚠️  historyId expirado - verificando as mensagens desde a última verificação")
+                    new_ids = [msg['id'] for results in iter_message_pages(service, f"after:{since}")
+                               for msg in results.get('messages', [])]
+                
+                matched = match_new_messages(service, new_ids, rules, predicate, index, pool) if new_ids else []
+                if new_ids:
+                    print(f"📬 {datetime.now():%H:%M:%S} {len(new_ids)} mensagens novas, "
+                          f"{len(matched)} combinam com as regras")
+                for details in matched:
+                    print(f"   ✉️  {details['from']} - {details['subject']}")
+                
+                if matched and act:
+                    matched_ids = [details['id'] for details in matched]
+                    if journal:
+                        journal.add_pending(run_id, matched_ids)
+                    ok, failed = bulk_modify_messages(
+                        service, matched_ids, add_label_ids, remove_label_ids,
+                        pool=pool, verbose=False, on_chunk=on_chunk, index=stale_index
+                    )
+                    processed_count += ok
+                    failed_count += len(failed)
+                    print(f"   ✅ Processadas: {ok} (total: {processed_count}, falhas: {failed_count})")
+                
+                history_id = current_history_id
+                checked_at = time.time()
+                if sync_state:
+                    sync_state.save(state_key, history_id)
+        except (HttpError, OSError) as error:
+            # Um daemon não deve parar por uma falha temporária; tenta de novo na próxima verificação
+            print(f"⚠️  Erro ao verificar a caixa (nova tentativa na próxima verificação): {error}")
+        
+        if not subscriber.wait():
+            break
+    
+    return processed_count, failed_count
+
+def run_watch(service, args, rules, pool=None):
+    """
+    Executa o modo daemon (--watch) até receber SIGINT ou SIGTERM.
+    """
+    if args.stream or args.incremental or args.threads:
+        print("⚠️  --stream, --incremental e --threads são ignorados com --watch.")
+    if args.push_topic and args.push_port is None:
+        print("❌ --push-topic requer --push-port (as notificações chegam pelo servidor local).")
+        return
+    
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=args.delete, archive=args.archive, mark_read=args.mark_read,
+        add_labels=args.add_label, remove_labels=args.remove_label
     )
+    if (add_label_ids or remove_label_ids) and not all(rule.strip() for rule in rules):
+        print("❌ O modo daemon não revisa cada mensagem: use apenas regras não vazias junto com uma ação.")
+        return
+    if (add_label_ids or remove_label_ids) and not args.yes:
+        action = "mover para a Lixeira" if args.delete else "alterar os labels de"
+        print(f"\n⚠️  ATENÇÃO: o modo daemon vai {action} TODAS as mensagens novas que combinarem com as regras:")
+        for rule in rules:
+            print(f"   - '{rule}'")
+        try:
+            confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+        except EOFError:
+            confirm = ''
+        if confirm.upper() != 'SIM':
+            print("❌ Operação cancelada pelo usuário. (Para rodar como serviço, sem terminal, use --yes.)")
+            return
+    subscriber = create_subscriber(args.push_port, args.watch_interval)
+    previous_handlers = {sig: signal.signal(sig, lambda *_: subscriber.stop())
+                         for sig in (signal.SIGINT, signal.SIGTERM)}
     
-    args = parser.parse_args()
+    conn = open_db(args.db)
+    journal = run_id = None
+    if add_label_ids or remove_label_ids:
+        journal, run_id = _start_journal(args, query='\n'.join(rules), kind='watch')
+    index = None if args.no_cache else MessageIndex(conn)
     
-    print("🔐 Autenticando com o Gmail...")
-    service = authenticate_gmail()
+    print(f"\n👀 Modo daemon: {len(rules)} regras, {subscriber.describe()}")
+    for rule in rules:
+        print(f"   - '{rule}'")
+    if not (add_label_ids or remove_label_ids):
+        print("ℹ️  Nenhuma ação informada (--delete, --archive...): as mensagens que combinam serão apenas exibidas")
+    print("   (Ctrl+C ou SIGTERM para encerrar)")
     
-    if not service:
-        print("❌ Falha na autenticação. Verifique suas credenciais.")
+    try:
+        processed_count, failed_count = watch_mailbox(
+            service, rules, subscriber, add_label_ids, remove_label_ids,
+            predicate=args.predicate, index=index, pool=pool, journal=journal, run_id=run_id,
+            sync_state=SyncState(conn), state_key='watch:' + '\n'.join(rules), topic=args.push_topic
+        )
+    finally:
+        subscriber.close()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+        if journal:
+            journal.finish_run(run_id)
+    
+    print(f"\n🛑 Modo daemon encerrado: {processed_count} mensagens processadas, {failed_count} falhas.")
+
+def run_cleaner(service, creds, args, modify_labels, pool=None):
+    """
+    Executa o teste, a amostra e a deleção conforme os argumentos da linha de comando.
+    """
+    if args.resume:
+        args.run_id = args.resume
+        resume_run(service, creds, RunJournal(open_db(args.db)), args.resume, pool)
         return
     
-    print("✅ Autenticação realizada com sucesso!")
+    if args.undo:
+        undo_run(service, creds, RunJournal(open_db(args.db)), args.undo, pool)
+        return
+    
+    if args.runs:
+        display_recent_runs(RunJournal(open_db(args.db)), args.runs)
+        return
+    
+    if args.count:
+        print(f"\n🔢 Contando mensagens com filtro: '{args.filter}'")
+        if args.where:
+            print("⚠️  --where é ignorado com --count (a contagem não busca os metadados).")
+        count_pool = pool
+        if count_pool is None and args.count_shards > 1:
+            count_pool = ServicePool(creds, min(args.count_shards, MULTI_QUERY_LIST_WORKERS))
+        try:
+            count_messages(service, args.filter, count_pool, args.count_shards)
+        finally:
+            if count_pool is not pool:
+                count_pool.close()
+        return
+    
+    if args.permanent or args.empty_trash:
+        if args.permanent and not args.delete:
+            print("❌ --permanent deve ser usado junto com --delete.")
+            return
+        run_permanent_delete(service, args, pool)
+        return
+    
+    if args.threads:
+        run_threads(service, args, modify_labels, pool)
+        return
+    
+    if args.report:
+        print(f"\n📊 Relatório das mensagens com filtro: '{args.filter}'")
+        index = None if args.no_cache else MessageIndex(open_db(args.db))
+        report = report_messages(service, build_service(creds), args.filter, pool=pool,
+                                 index=index, max_age_hours=args.cache_ttl, predicate=args.predicate)
+        report.print(args.top)
+        if args.report_json:
+            with open(args.report_json, 'w') as report_file:
+                json.dump(report.to_dict(args.top), report_file, indent=2)
+            print(f"💾 Relatório gravado em {args.report_json}")
+        return
+    
+    rules = list(args.rule)
+    if args.rules:
+        rules.extend(load_rules(args.rules))
+    if args.watch:
+        if args.filter or not rules:
+            rules.insert(0, args.filter)
+        run_watch(service, args, list(dict.fromkeys(rules)), pool)
+        return
+    if rules:
+        if args.filter:
+            rules.insert(0, args.filter)
+        run_rules(service, creds, args, list(dict.fromkeys(rules)), modify_labels, pool)
+        return
     
     # Se o modo teste estiver ativado, executa testes de conexão
     if args.test:
@@ -343,8 +2585,10 @@ def main():
         
         if success and sample_messages:
             print("\n📋 Amostra de mensagens disponíveis:")
-            for i, msg in enumerate(sample_messages[:3], 1):
-                details = get_message_details(service, msg['id'])
+            sample_ids = [msg['id'] for msg in sample_messages[:3]]
+            details_by_id = fetch_message_details_batch(service, sample_ids)
+            for i, message_id in enumerate(sample_ids, 1):
+                details = details_by_id.get(message_id)
                 if details:
                     print(f"{i}. {details['subject']} - {details['from']}")
         
@@ -367,51 +2611,383 @@ def main():
     
     # Obtém detalhes das mensagens da amostra
     print(f"\n📋 Obtendo detalhes da amostra de {len(sample_messages)} mensagens...")
-    sample_details = []
-    
-    for msg in sample_messages:
-        details = get_message_details(service, msg['id'])
-        if details:
-            sample_details.append(details)
+    sample_ids = [msg['id'] for msg in sample_messages]
+    index = None if args.no_cache else MessageIndex(open_db(args.db))
+    details_by_id = fetch_message_details_cached(
+        service, sample_ids, index, max_age_hours=args.cache_ttl, pool=pool
+    )
+    sample_details = _apply_sample_predicate(
+        [details_by_id[message_id] for message_id in sample_ids if message_id in details_by_id], args.predicate
+    )
     
     # Exibe as mensagens da amostra
     display_messages(sample_details)
     
-    if args.delete:
+    if (args.delete or modify_labels) and args.stream and not args.incremental:
+        action = "deletar" if args.delete else "alterar os labels de"
+        print(f"\n⚠️  ATENÇÃO: Você está prestes a {action} TODAS as mensagens que combinam com o filtro!")
+        print(f"   (Modo streaming: o total só é conhecido ao final. Amostra mostrada acima: {len(sample_details)} mensagens)")
+        
+        confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+        
+        if confirm.upper() == 'SIM':
+            journal, run_id = _start_journal(args)
+            processed_count, failed_count = stream_delete_messages(
+                service, build_service(creds), args.filter,
+                archive=args.archive, mark_read=args.mark_read,
+                add_labels=args.add_label, remove_labels=args.remove_label,
+                trash=args.delete, pool=pool, journal=journal, run_id=run_id,
+                predicate=args.predicate, index=index
+            )
+            journal.finish_run(run_id)
+            done = "deletadas" if args.delete else "alteradas"
+            print(f"🎉 Operação concluída! {processed_count} mensagens foram {done}.")
+            if failed_count:
+                print(f"⚠️  Nota: {failed_count} mensagens não puderam ser {done}.")
+        else:
+            print("❌ Operação cancelada pelo usuário.")
+    elif args.delete or modify_labels:
         # Busca TODAS as mensagens que combinam com o filtro
         print(f"\n🔍 Buscando TODAS as mensagens que combinam com o filtro para deleção...")
-        all_messages = search_messages(service, args.filter, args.max_results, get_all=True)
+        sync_state = history_id = None
+        if args.incremental:
+            sync_state = SyncState(open_db(args.db))
+            all_messages, history_id = search_messages_incremental(
+                service, args.filter, sync_state, RunJournal(sync_state.conn)
+            )
+        else:
+            all_messages = search_messages(service, args.filter, args.max_results, get_all=True, pool=pool)
+        
+        if args.predicate and all_messages:
+            print(f"\n🔬 Aplicando o filtro local a {len(all_messages)} mensagens...")
+            passed_ids = filter_messages(service, [msg['id'] for msg in all_messages], args.predicate,
+                                         index, args.cache_ttl, pool=pool)
+            all_messages = [{'id': message_id} for message_id in passed_ids]
         
         if not all_messages:
             print("❌ Nenhuma mensagem encontrada para deletar.")
+            if sync_state:
+                sync_state.save(args.filter, history_id)
             return
         
         total_to_delete = len(all_messages)
-        print(f"\n⚠️  ATENÇÃO: Você está prestes a deletar {total_to_delete} mensagens!")
+        action = "deletar" if args.delete else "alterar os labels de"
+        print(f"\n⚠️  ATENÇÃO: Você está prestes a {action} {total_to_delete} mensagens!")
         print(f"   (Amostra mostrada acima: {len(sample_details)} mensagens)")
         
         confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
         
         if confirm.upper() == 'SIM':
             message_ids = [msg['id'] for msg in all_messages]
-            deleted_count = delete_messages(service, message_ids)
+            journal, run_id = _start_journal(args)
+            journal.add_pending(run_id, message_ids)
+            deleted_count = delete_messages(
+                service, message_ids,
+                archive=args.archive, mark_read=args.mark_read,
+                add_labels=args.add_label, remove_labels=args.remove_label,
+                trash=args.delete, pool=pool,
+                on_chunk=lambda chunk, failed: journal.record_chunk(run_id, chunk, failed),
+                index=MessageIndex(journal.conn)
+            )
+            journal.finish_run(run_id)
+            if sync_state:
+                sync_state.save(args.filter, history_id, run_id)
             
+            done = "deletadas" if args.delete else "alteradas"
             if deleted_count > 0:
-                print(f"🎉 Operação concluída! {deleted_count} mensagens foram deletadas.")
+                print(f"🎉 Operação concluída! {deleted_count} mensagens foram {done}.")
                 if deleted_count != total_to_delete:
-                    print(f"⚠️  Nota: {total_to_delete - deleted_count} mensagens não puderam ser deletadas.")
+                    print(f"⚠️  Nota: {total_to_delete - deleted_count} mensagens não puderam ser {done}.")
             else:
-                print("❌ Nenhuma mensagem foi deletada.")
+                print(f"❌ Nenhuma mensagem foi {done[:-1]}.")
         else:
             print("❌ Operação cancelada pelo usuário.")
     else:
         # Mostra informações sobre o total estimado
+        where = f" --where {shlex.quote(args.where)}" if args.where else ""
         if len(sample_messages) < args.max_results:
             print(f"\n💡 Para deletar estas mensagens, execute o comando com --delete:")
-            print(f"   python gmail_cleaner.py '{args.filter}' --delete")
         else:
             print(f"\n💡 Esta é apenas uma amostra! Para deletar TODAS as mensagens que combinam com o filtro:")
-            print(f"   python gmail_cleaner.py '{args.filter}' --delete")
+        print(f"   python gmail_cleaner.py '{args.filter}'{where} --delete")
+
+def main():
+    """
+    Função principal do script.
+    """
+    parser = argparse.ArgumentParser(
+        description='Script para deletar mensagens do Gmail com base em filtros'
+    )
+    parser.add_argument(
+        'filter', 
+        nargs='?',
+        default='',
+        help='Filtro de busca Gmail (ex: "gmail", "from:exemplo@gmail.com", "subject:importante"). Deixe vazio para buscar todas as mensagens.'
+    )
+    parser.add_argument(
+        '--delete', 
+        action='store_true',
+        help='Deletar as mensagens encontradas (sem este flag apenas mostra as mensagens)'
+    )
+    parser.add_argument(
+        '--max-results', 
+        type=int, 
+        default=50,
+        help='Número máximo de mensagens para buscar (padrão: 50)'
+    )
+    parser.add_argument(
+        '--test',
+        action='store_true',
+        help='Executar teste de conexão e mostrar estatísticas básicas'
+    )
+    parser.add_argument(
+        '--permanent',
+        action='store_true',
+        help='Com --delete, deletar PERMANENTEMENTE (batchDelete, sem passar pela Lixeira; exige o escopo completo)'
+    )
+    parser.add_argument(
+        '--empty-trash',
+        action='store_true',
+        help='Deletar PERMANENTEMENTE as mensagens da Lixeira que combinam com o filtro (exige o escopo completo)'
+    )
+    parser.add_argument(
+        '--archive',
+        action='store_true',
+        help='Arquivar as mensagens encontradas (remove o label INBOX)'
+    )
+    parser.add_argument(
+        '--mark-read',
+        action='store_true',
+        help='Marcar as mensagens encontradas como lidas (remove o label UNREAD)'
+    )
+    parser.add_argument(
+        '--add-label',
+        action='append',
+        default=[],
+        metavar='LABEL_ID',
+        help='ID de label a adicionar às mensagens encontradas (pode ser repetido)'
+    )
+    parser.add_argument(
+        '--remove-label',
+        action='append',
+        default=[],
+        metavar='LABEL_ID',
+        help='ID de label a remover das mensagens encontradas (pode ser repetido)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Número de threads paralelas, cada uma com sua própria conexão (padrão: 1)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Deletar enquanto lista (pipeline com fila limitada, memória constante)'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Processar apenas as mensagens que chegaram desde a última execução da mesma query (users.history.list)'
+    )
+    parser.add_argument(
+        '--resume',
+        metavar='RUN_ID',
+        help='Retomar uma execução de deleção interrompida a partir do diário'
+    )
+    parser.add_argument(
+        '--undo',
+        metavar='RUN_ID',
+        help='Desfazer uma execução do diário: restaura da Lixeira (e reverte os labels) as mensagens processadas'
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        nargs='?',
+        const=10,
+        metavar='N',
+        help='Listar as N execuções mais recentes do diário (padrão: 10)'
+    )
+    parser.add_argument(
+        '--db',
+        default=DEFAULT_DB_PATH,
+        help=f'Arquivo SQLite do diário de execuções e do índice local (padrão: {DEFAULT_DB_PATH})'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=DEFAULT_CACHE_TTL_HOURS,
+        metavar='HORAS',
+        help=f'Idade máxima dos metadados no índice local antes de buscar de novo (padrão: {DEFAULT_CACHE_TTL_HOURS})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Não usar o índice local de metadados'
+    )
+    parser.add_argument(
+        '--quota-per-second',
+        type=int,
+        default=DEFAULT_QUOTA_PER_SECOND,
+        help=f'Limite de unidades de quota da API por segundo (padrão: {DEFAULT_QUOTA_PER_SECOND})'
+    )
+    parser.add_argument(
+        '--transport',
+        choices=TRANSPORTS,
+        default=DEFAULT_TRANSPORT,
+        help='Transporte HTTP: uma conexão por worker (httplib2), pool compartilhado (httpx) '
+             f'ou HTTP/2 multiplexado (http2) (padrão: {DEFAULT_TRANSPORT})'
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        help='Número máximo de conexões do pool compartilhado httpx/http2 (padrão: número de workers)'
+    )
+    parser.add_argument(
+        '--rule',
+        action='append',
+        default=[],
+        metavar='QUERY',
+        help='Query adicional processada na mesma execução (pode ser repetido)'
+    )
+    parser.add_argument(
+        '--rules',
+        metavar='ARQUIVO',
+        help='Arquivo com uma query Gmail por linha, processadas juntas em uma única passada'
+    )
+    parser.add_argument(
+        '--where',
+        metavar='EXPRESSAO',
+        help='Filtro local sobre os metadados, aplicado depois da busca '
+             '(ex: "subject ~ /fatura/i and size > 1MB"; ver gmail_predicate.py)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Modo daemon: aplica as regras apenas às mensagens novas, continuamente (users.history.list)'
+    )
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        metavar='SEGUNDOS',
+        help='Intervalo entre as verificações do modo daemon (padrão: 10; com --push-port: 300)'
+    )
+    parser.add_argument(
+        '--push-port',
+        type=int,
+        metavar='PORTA',
+        help='Recebe notificações push (formato Cloud Pub/Sub) em http://127.0.0.1:PORTA/ no modo daemon'
+    )
+    parser.add_argument(
+        '--push-topic',
+        metavar='TOPICO',
+        help='Tópico do Cloud Pub/Sub registrado com users.watch (ex: projects/meu-projeto/topics/gmail)'
+    )
+    parser.add_argument(
+        '--yes',
+        action='store_true',
+        help='Com --watch e uma ação, começar sem pedir confirmação (ex: ao rodar como serviço)'
+    )
+    parser.add_argument(
+        '--threads',
+        action='store_true',
+        help='Trabalhar com conversas inteiras (threads.list/threads.trash) em vez de mensagens'
+    )
+    parser.add_argument(
+        '--report',
+        action='store_true',
+        help='Relatório de uso das mensagens do filtro: top remetentes, domínios, labels, meses e tamanhos'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=20,
+        help='Número de linhas das tabelas do relatório (padrão: 20)'
+    )
+    parser.add_argument(
+        '--report-json',
+        metavar='ARQUIVO',
+        help='Gravar o relatório (--report) em JSON'
+    )
+    parser.add_argument(
+        '--count',
+        action='store_true',
+        help='Apenas contar exatamente as mensagens que combinam com o filtro'
+    )
+    parser.add_argument(
+        '--count-shards',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Dividir a contagem em até N janelas de datas contadas em paralelo (padrão: 1)'
+    )
+    parser.add_argument(
+        '--metrics-json',
+        metavar='ARQUIVO',
+        help='Gravar as métricas das chamadas à API em JSON ao final da execução'
+    )
+    parser.add_argument(
+        '--metrics-prom',
+        metavar='ARQUIVO',
+        help='Gravar as métricas das chamadas à API no formato de texto do Prometheus'
+    )
+    
+    args = parser.parse_args()
+    # ID da execução retomável em andamento (preenchido por _start_journal)
+    args.run_id = None
+    try:
+        args.predicate = compile_predicate(args.where) if args.where else None
+    except PredicateError as error:
+        print(f"❌ Filtro local (--where) inválido: {error}")
+        return
+    rate_limiter.units_per_second = args.quota_per_second
+    try:
+        configure_transport(args.transport, args.pool_size or args.workers)
+    except RuntimeError as error:
+        print(f"❌ {error}")
+        return
+    modify_labels = args.archive or args.mark_read or args.add_label or args.remove_label
+    
+    print("🔐 Autenticando com o Gmail...")
+    creds = load_credentials(FULL_MAIL_SCOPES if args.permanent or args.empty_trash else SCOPES)
+    if not creds:
+        print("❌ Falha na autenticação. Verifique suas credenciais.")
+        return
+    
+    # Renova o token em segundo plano, antes de expirar, para todos os workers
+    credential_manager = CredentialManager(creds).start()
+    creds = credential_manager.credentials()
+    service = authenticate_gmail(creds)
+    
+    if not service:
+        print("❌ Falha na autenticação. Verifique suas credenciais.")
+        credential_manager.stop()
+        return
+    
+    print("✅ Autenticação realizada com sucesso!")
+    
+    pool = None
+    if args.workers > 1:
+        print(f"🧵 Usando {args.workers} workers em paralelo")
+        pool = ServicePool(creds, args.workers)
+    
+    try:
+        run_cleaner(service, creds, args, modify_labels, pool)
+    except KeyboardInterrupt:
+        print("\n⛔ Execução interrompida pelo usuário.")
+        if args.run_id:
+            print(f"💡 O progresso foi gravado no diário; retome com --resume {args.run_id}.")
+    finally:
+        if pool:
+            pool.close()
+        credential_manager.stop()
+        traffic = metrics.traffic_summary()
+        if traffic:
+            print(f"📉 Tráfego: {traffic}")
+        if args.metrics_json or args.metrics_prom:
+            metrics.write(args.metrics_json, args.metrics_prom)
+            print(f"📈 Métricas gravadas em {', '.join(filter(None, [args.metrics_json, args.metrics_prom]))}")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Modo frota do Gmail Cleaner: limpeza em paralelo de muitas caixas de um
+domínio Google Workspace.
+
+Cada caixa é processada em um processo do pool, com o seu próprio limitador
+de quota (a quota da Gmail API é por usuário). As credenciais vêm de uma
+conta de serviço com delegação em todo o domínio ou de uma pasta com um
+token por usuário (<pasta>/<usuario>.json).
+
+As alterações de cada caixa são gravadas no diário local (--db) como uma
+execução do modo 'fleet'; o relatório (--report) guarda o ID da execução de
+cada usuário, e --undo <relatório> restaura todas as caixas.
+
+Uso:
+    python gmail_fleet.py usuarios.txt "older_than:2y" --service-account chave.json
+    python gmail_fleet.py usuarios.txt --rules regras.txt --token-dir tokens/ --delete --report frota.json
+    python gmail_fleet.py --undo frota.json --token-dir tokens/
+"""
+
+import io
+import os
+import json
+import time
+import sqlite3
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import gmail_cleaner
+from gmail_cleaner import (DEFAULT_QUOTA_PER_SECOND, SCOPES, API_ROOT_URL, RateLimiter, ServicePool,
+                           build_service, build_label_changes, search_messages_multi, bulk_modify_messages,
+                           load_rules, restore_run_messages)
+from gmail_metrics import metrics
+from gmail_store import DEFAULT_DB_PATH, open_db, RunJournal, MessageIndex
+from gmail_auth import CredentialManager, read_token
+
+# Número padrão de caixas processadas ao mesmo tempo
+DEFAULT_FLEET_PROCESSES = os.cpu_count() or 4
+
+def load_users(users_path):
+    """
+    Lê a lista de usuários: um endereço por linha ('#' inicia um comentário).
+    """
+    with open(users_path, encoding='utf-8') as users_file:
+        users = [line.split('#', 1)[0].strip() for line in users_file]
+    return list(dict.fromkeys(user for user in users if user))
+
+def load_user_credentials(user, service_account_file=None, token_dir=None):
+    """
+    Carrega as credenciais de um usuário da frota.
+
+    Args:
+        user: Endereço de email do usuário
+        service_account_file: Chave JSON de conta de serviço com delegação em todo o domínio
+        token_dir: Pasta com um token salvo por usuário (<pasta>/<usuario>.json)
+
+    Returns:
+        CredentialManager do usuário (ainda não iniciado)
+    """
+    if API_ROOT_URL:
+        return CredentialManager(gmail_cleaner.load_credentials(), token_path=None)
+
+    if service_account_file:
+        from google.oauth2 import service_account
+        creds = service_account.Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+        return CredentialManager(creds.with_subject(user), token_path=None)
+
+    token_path = os.path.join(token_dir, f'{user}.json')
+    creds = read_token(token_path, SCOPES)
+    if creds is None:
+        raise FileNotFoundError(f"Token não encontrado: {token_path}")
+    return CredentialManager(creds, token_path=token_path)
+
+def _process_mailbox(user, options, work):
+    """
+    Autentica a caixa e executa work(service, pool, result), medindo o tempo
+    e a quota gastos.
+
+    Executado em um processo do pool; a saída detalhada vai para o log do
+    usuário (se houver pasta de logs) e nunca interrompe as demais caixas.
+
+    Returns:
+        Dicionário com o resultado da caixa
+    """
+    result = {'user': user, 'matched': 0, 'processed': 0, 'failed': 0,
+              'quota_units': 0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    quota_before = metrics.snapshot()['quota_units_total']
+
+    # A quota é por usuário: cada caixa começa com um limitador novo
+    gmail_cleaner.rate_limiter = RateLimiter(options['quota_per_second'])
+
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            credential_manager = load_user_credentials(user, options['service_account'], options['token_dir'])
+            credential_manager.refresh()
+            credential_manager.start()
+            creds = credential_manager.credentials()
+            service = build_service(creds)
+            pool = ServicePool(creds, options['workers']) if options['workers'] > 1 else None
+            try:
+                work(service, pool, result)
+            finally:
+                if pool:
+                    pool.close()
+                credential_manager.stop()
+    except Exception as error:
+        result['error'] = f"{type(error).__name__}: {error}"
+
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    result['quota_units'] = metrics.snapshot()['quota_units_total'] - quota_before
+    if options['log_dir']:
+        with open(os.path.join(options['log_dir'], f'{user}.log'), 'w', encoding='utf-8') as log_file:
+            log_file.write(log.getvalue())
+    return result
+
+def _journal_recorder(journal, run_id, index=None):
+    """
+    Cria o on_chunk que grava os lotes de uma caixa no diário compartilhado
+    (e remove as mensagens alteradas do índice local, se houver).
+
+    Todos os processos da frota gravam no mesmo banco; se ele continuar
+    bloqueado além do timeout de open_db, o lote fica guardado e é gravado
+    junto com o próximo (ou por flush(), ao final), em vez de interromper a
+    caixa no meio da execução.
+
+    Returns:
+        Tupla (on_chunk, flush); flush() grava os lotes pendentes e propaga o erro se não conseguir
+    """
+    backlog = []
+
+    def flush():
+        while backlog:
+            chunk, failed = backlog[0]
+            journal.record_chunk(run_id, chunk, failed)
+            if index is not None:
+                index.delete_many([message_id for message_id in chunk if message_id not in failed])
+            backlog.pop(0)
+
+    def on_chunk(chunk, failed):
+        backlog.append((chunk, failed))
+        try:
+            flush()
+        except sqlite3.OperationalError as error:
+            print(f"⚠️  Diário ocupado ({error}); {len(backlog)} lotes serão gravados depois")
+
+    return on_chunk, flush
+
+def clean_mailbox(user, options):
+    """
+    Processa uma caixa: lista as regras, une os IDs e aplica as alterações,
+    gravando os IDs processados no diário (execução do modo 'fleet').
+
+    Returns:
+        Dicionário com o resultado da caixa
+    """
+    def work(service, pool, result):
+        message_ids, stats = search_messages_multi(service, options['rules'], pool)
+        result['matched'] = len(message_ids)
+        result['rules'] = stats
+        if options['add_label_ids'] or options['remove_label_ids']:
+            journal = RunJournal(open_db(options['db']))
+            run_id = journal.create_run(f"[{user}] " + '\n'.join(options['rules']),
+                                        options['add_label_ids'], options['remove_label_ids'], kind='fleet')
+            result['run_id'] = run_id
+            journal.add_pending(run_id, message_ids)
+            on_chunk, flush = _journal_recorder(journal, run_id, MessageIndex(journal.conn))
+            processed, failed_ids = bulk_modify_messages(
+                service, message_ids, options['add_label_ids'], options['remove_label_ids'],
+                pool=pool, verbose=False, on_chunk=on_chunk
+            )
+            flush()
+            journal.finish_run(run_id)
+            result['processed'] = processed
+            result['failed'] = len(failed_ids)
+
+    return _process_mailbox(user, options, work)
+
+def undo_mailbox(user, options):
+    """
+    Desfaz a execução do modo frota de uma caixa (options['run_ids'][user]).
+
+    Returns:
+        Dicionário com o resultado da caixa
+    """
+    def work(service, pool, result):
+        journal = RunJournal(open_db(options['db']))
+        run_id = options['run_ids'][user]
+        if journal.get_run(run_id) is None:
+            raise LookupError(f"execução {run_id} não encontrada no diário {options['db']}")
+        result['run_id'] = run_id
+        result['matched'] = journal.count(run_id, 'done')
+        restored, failed_ids = restore_run_messages(service, journal, run_id, pool, verbose=False)
+        result['processed'] = restored
+        result['failed'] = len(failed_ids)
+
+    return _process_mailbox(user, options, work)
+
+def run_fleet(users, options, processes=DEFAULT_FLEET_PROCESSES, task=clean_mailbox):
+    """
+    Processa todas as caixas em um pool de processos (task: clean_mailbox ou undo_mailbox).
+
+    Todas as caixas são enviadas ao pool de uma vez, de modo que cada
+    processo pega a próxima caixa assim que termina a anterior.
+
+    Returns:
+        Lista de resultados por usuário, na ordem em que terminaram
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=min(processes, len(users))) as executor:
+        futures = {executor.submit(task, user, options): user for user in users}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = {'user': futures[future], 'matched': 0, 'processed': 0, 'failed': 0,
+                          'quota_units': 0, 'seconds': 0.0, 'error': f"{type(error).__name__}: {error}"}
+            results.append(result)
+            status = f"❌ {result['error']}" if result['error'] else \
+                f"✅ {result['matched']} encontradas, {result['processed']} processadas"
+            print(f"   [{done}/{len(users)}] {result['user']}: {status} ({result['seconds']}s)")
+    return results
+
+def summarize(results):
+    """
+    Agrega os resultados de todas as caixas.
+    """
+    return {
+        'users': len(results),
+        'succeeded': sum(1 for result in results if not result['error']),
+        'failed_users': [result['user'] for result in results if result['error']],
+        'matched': sum(result['matched'] for result in results),
+        'processed': sum(result['processed'] for result in results),
+        'failed_messages': sum(result['failed'] for result in results),
+        'quota_units': sum(result['quota_units'] for result in results),
+    }
+
+def run_undo(args):
+    """
+    Desfaz, em todas as caixas, as execuções registradas no relatório da frota.
+    """
+    with open(args.undo, encoding='utf-8') as report_file:
+        report = json.load(report_file)
+    run_ids = {result['user']: result['run_id'] for result in report['users'] if result.get('run_id')}
+    if not run_ids:
+        print("📭 O relatório não tem execuções com alterações a desfazer.")
+        return
+
+    print(f"↩️  Desfazendo as alterações de {len(run_ids)} caixas registradas em {args.undo}")
+    confirm = input("🤔 Desfazer? Digite 'SIM' para confirmar: ")
+    if confirm.upper() != 'SIM':
+        print("❌ Operação cancelada pelo usuário.")
+        return
+
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+    options = {
+        'run_ids': run_ids,
+        'service_account': args.service_account,
+        'token_dir': args.token_dir,
+        'workers': args.workers,
+        'quota_per_second': args.quota_per_second,
+        'log_dir': args.log_dir,
+        'db': args.db,
+    }
+    results = run_fleet(list(run_ids), options, args.processes, task=undo_mailbox)
+    summary = summarize(results)
+    print(f"\n📊 Resumo: {summary['processed']} mensagens restauradas em {summary['succeeded']}/{summary['users']} caixas")
+    if summary['failed_messages']:
+        print(f"   - Mensagens com falha: {summary['failed_messages']}")
+    if summary['failed_users']:
+        print(f"   - Caixas com erro: {', '.join(summary['failed_users'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Limpeza em paralelo de várias caixas do Gmail (Google Workspace)')
+    parser.add_argument('users', nargs='?', help='Arquivo com um endereço de email por linha')
+    parser.add_argument('filter', nargs='?', default='', help='Filtro de busca Gmail aplicado a todas as caixas')
+    parser.add_argument('--rule', action='append', default=[], metavar='QUERY',
+                        help='Query adicional (pode ser repetido)')
+    parser.add_argument('--rules', metavar='ARQUIVO', help='Arquivo com uma query Gmail por linha')
+    credentials = parser.add_mutually_exclusive_group()
+    credentials.add_argument('--service-account', metavar='CHAVE_JSON',
+                             help='Chave de conta de serviço com delegação em todo o domínio')
+    credentials.add_argument('--token-dir', metavar='PASTA',
+                             help='Pasta com um token por usuário (<pasta>/<usuario>.json)')
+    parser.add_argument('--delete', action='store_true', help='Mover as mensagens encontradas para a Lixeira')
+    parser.add_argument('--archive', action='store_true', help='Remover o label INBOX')
+    parser.add_argument('--mark-read', action='store_true', help='Remover o label UNREAD')
+    parser.add_argument('--processes', type=int, default=DEFAULT_FLEET_PROCESSES,
+                        help=f'Número de caixas processadas ao mesmo tempo (padrão: {DEFAULT_FLEET_PROCESSES})')
+    parser.add_argument('--workers', type=int, default=1, help='Threads por caixa (padrão: 1)')
+    parser.add_argument('--quota-per-second', type=int, default=DEFAULT_QUOTA_PER_SECOND,
+                        help=f'Limite de unidades de quota por segundo de cada usuário (padrão: {DEFAULT_QUOTA_PER_SECOND})')
+    parser.add_argument('--log-dir', metavar='PASTA', help='Pasta onde gravar o log de cada usuário')
+    parser.add_argument('--report', metavar='ARQUIVO', help='Arquivo JSON onde gravar o relatório da frota')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'Banco SQLite do diário das execuções (padrão: {DEFAULT_DB_PATH})')
+    parser.add_argument('--undo', metavar='RELATORIO',
+                        help='Desfazer as alterações registradas no relatório JSON de uma execução anterior da frota')
+    args = parser.parse_args()
+
+    if not (args.service_account or args.token_dir or API_ROOT_URL):
+        parser.error('informe --service-account ou --token-dir')
+    if args.undo:
+        run_undo(args)
+        return
+    if not args.users:
+        parser.error('informe o arquivo de usuários')
+
+    users = load_users(args.users)
+    rules = ([args.filter] if args.filter else []) + args.rule + (load_rules(args.rules) if args.rules else [])
+    rules = list(dict.fromkeys(rules)) or ['']
+    add_label_ids, remove_label_ids = build_label_changes(
+        trash=args.delete, archive=args.archive, mark_read=args.mark_read
+    )
+    if not users:
+        print("📭 Nenhum usuário na lista.")
+        return
+
+    print(f"👥 Frota: {len(users)} caixas, {len(rules)} regras, {min(args.processes, len(users))} processos")
+    if add_label_ids or remove_label_ids:
+        action = "deletar" if args.delete else "alterar os labels de"
+        print(f"\n⚠️  ATENÇÃO: Você está prestes a {action} as mensagens que combinam com as regras em {len(users)} caixas!")
+        confirm = input("🤔 Tem certeza? Digite 'SIM' para confirmar: ")
+        if confirm.upper() != 'SIM':
+            print("❌ Operação cancelada pelo usuário.")
+            return
+    else:
+        print("🔍 Apenas contagem (use --delete, --archive ou --mark-read para alterar as mensagens)")
+
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+    options = {
+        'rules': rules,
+        'add_label_ids': add_label_ids,
+        'remove_label_ids': remove_label_ids,
+        'service_account': args.service_account,
+        'token_dir': args.token_dir,
+        'workers': args.workers,
+        'quota_per_second': args.quota_per_second,
+        'log_dir': args.log_dir,
+        'db': args.db,
+    }
+
+    start = time.perf_counter()
+    results = run_fleet(users, options, args.processes)
+    summary = summarize(results)
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+
+    print(f"\n📊 Resumo da frota ({summary['seconds']}s):")
+    print(f"   - Caixas processadas: {summary['succeeded']}/{summary['users']}")
+    print(f"   - Mensagens encontradas: {summary['matched']}")
+    print(f"   - Mensagens processadas: {summary['processed']}")
+    if summary['failed_messages']:
+        print(f"   - Mensagens com falha: {summary['failed_messages']}")
+    if summary['failed_users']:
+        print(f"   - Caixas com erro: {', '.join(summary['failed_users'])}")
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump({'summary': summary, 'users': sorted(results, key=lambda r: r['user'])},
+                      report_file, indent=2)
+        print(f"💾 Relatório gravado em {args.report}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Métricas das chamadas à Gmail API: contagem, latência, bytes, status HTTP,
+novas tentativas, backoff e unidades de quota por método, além do
+reaproveitamento das conexões HTTP.
+
+Exporta em JSON e no formato de texto do Prometheus ao final da execução.
+"""
+
+import json
+import time
+import bisect
+import threading
+from collections import defaultdict
+
+# Limites (em segundos) dos buckets do histograma de latência
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Método da API em execução na thread atual (definido por execute_request)
+current_call = threading.local()
+
+class _MethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.quota_units = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_received_wire = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.statuses = defaultdict(int)
+
+class Metrics:
+    """
+    Coletor de métricas compartilhado por todas as threads do processo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = defaultdict(_MethodStats)
+        self._counters = defaultdict(int)
+        self.started_at = time.time()
+
+    def record_call(self, method, latency, quota_units, error=False):
+        """Registra uma tentativa de chamada à API."""
+        with self._lock:
+            stats = self._methods[method]
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.quota_units += quota_units
+            stats.latency_sum += latency
+            stats.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def record_retry(self, method, backoff_seconds=0.0, count=1):
+        """Registra novas tentativas (e o tempo de espera do backoff)."""
+        with self._lock:
+            stats = self._methods[method]
+            stats.retries += count
+            stats.backoff_seconds += backoff_seconds
+
+    def record_http(self, method, status, bytes_sent, bytes_received, bytes_received_wire=None):
+        """
+        Registra uma resposta HTTP (status e bytes transferidos).
+
+        bytes_received é o tamanho do corpo descompactado; bytes_received_wire,
+        o tamanho recebido pela rede (compactado), quando conhecido.
+        """
+        with self._lock:
+            stats = self._methods[method]
+            stats.statuses[status] += 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.bytes_received_wire += bytes_received if bytes_received_wire is None else bytes_received_wire
+
+    def increment(self, name, value=1):
+        """Incrementa um contador da execução (ex: 'messages_modified')."""
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self):
+        """
+        Retorna todas as métricas como um dicionário serializável em JSON.
+        """
+        with self._lock:
+            duration = time.time() - self.started_at
+            methods = {}
+            for method, stats in sorted(self._methods.items()):
+                methods[method] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'backoff_seconds': round(stats.backoff_seconds, 3),
+                    'quota_units': stats.quota_units,
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                    'bytes_received_wire': stats.bytes_received_wire,
+                    'latency_seconds_sum': round(stats.latency_sum, 6),
+                    'latency_seconds_avg': round(stats.latency_sum / stats.calls, 6) if stats.calls else 0.0,
+                    'latency_buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'],
+                                                stats.latency_buckets)),
+                    'http_statuses': {str(status): count for status, count in sorted(stats.statuses.items())},
+                }
+            counters = dict(self._counters)
+
+        throughput = {
+            name: round(value / duration, 2) if duration else 0.0
+            for name, value in counters.items() if name.startswith('messages_')
+        }
+        return {
+            'duration_seconds': round(duration, 3),
+            'quota_units_total': sum(m['quota_units'] for m in methods.values()),
+            'compression_saved_bytes': sum(m['bytes_received'] - m['bytes_received_wire'] for m in methods.values()),
+            'counters': counters,
+            'throughput_per_second': throughput,
+            'methods': methods,
+        }
+
+    def traffic_summary(self):
+        """
+        Resume os bytes recebidos e a economia da compactação gzip, ou None se
+        nenhuma resposta foi recebida.
+        """
+        data = self.snapshot()
+        received = sum(m['bytes_received'] for m in data['methods'].values())
+        if not received:
+            return None
+        saved = data['compression_saved_bytes']
+        wire = received - saved
+        if saved <= 0:
+            return f"{wire / 1024:.0f} KB recebidos pela rede"
+        return (f"{wire / 1024:.0f} KB recebidos pela rede ({received / 1024:.0f} KB descompactados, "
+                f"{saved / received:.0%} economizados com gzip)")
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='gmail_cleaner'):
+        """
+        Formata as métricas no formato de texto do Prometheus.
+        """
+        data = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f'{prefix}_{name}{{{label_text}}} {value}' if label_text
+                             else f'{prefix}_{name} {value}')
+
+        methods = data['methods']
+        metric('api_calls_total', 'counter', 'Chamadas à Gmail API (incluindo novas tentativas).',
+               [({'method': m}, s['calls']) for m, s in methods.items()])
+        metric('api_errors_total', 'counter', 'Chamadas à Gmail API que falharam.',
+               [({'method': m}, s['errors']) for m, s in methods.items()])
+        metric('api_retries_total', 'counter', 'Novas tentativas após erros temporários.',
+               [({'method': m}, s['retries']) for m, s in methods.items()])
+        metric('api_backoff_seconds_total', 'counter', 'Tempo de espera em backoff.',
+               [({'method': m}, s['backoff_seconds']) for m, s in methods.items()])
+        metric('api_quota_units_total', 'counter', 'Unidades de quota estimadas.',
+               [({'method': m}, s['quota_units']) for m, s in methods.items()])
+        metric('api_bytes_sent_total', 'counter', 'Bytes enviados.',
+               [({'method': m}, s['bytes_sent']) for m, s in methods.items()])
+        metric('api_bytes_received_total', 'counter', 'Bytes recebidos (descompactados).',
+               [({'method': m}, s['bytes_received']) for m, s in methods.items()])
+        metric('api_bytes_received_wire_total', 'counter', 'Bytes recebidos pela rede (compactados).',
+               [({'method': m}, s['bytes_received_wire']) for m, s in methods.items()])
+        metric('api_responses_total', 'counter', 'Respostas HTTP por código de status.',
+               [({'method': m, 'status': status}, count)
+                for m, s in methods.items() for status, count in s['http_statuses'].items()])
+
+        lines.append(f'# HELP {prefix}_api_request_duration_seconds Latência das chamadas à Gmail API.')
+        lines.append(f'# TYPE {prefix}_api_request_duration_seconds histogram')
+        for m, s in methods.items():
+            cumulative = 0
+            for bound, count in s['latency_buckets'].items():
+                cumulative += count
+                lines.append(f'{prefix}_api_request_duration_seconds_bucket{{method="{m}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_api_request_duration_seconds_sum{{method="{m}"}} {s["latency_seconds_sum"]}')
+            lines.append(f'{prefix}_api_request_duration_seconds_count{{method="{m}"}} {s["calls"]}')
+
+        metric('messages_total', 'counter', 'Mensagens processadas na execução.',
+               [({'operation': name[len('messages_'):]}, value)
+                for name, value in data['counters'].items() if name.startswith('messages_')])
+        metric('http_connections_total', 'counter', 'Requisições HTTP por uso de conexão (nova ou reaproveitada).',
+               [({'state': state}, data['counters'].get(f'http_connections_{state}', 0))
+                for state in ('opened', 'reused')])
+        metric('run_duration_seconds', 'gauge', 'Duração da execução.', [({}, data['duration_seconds'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path=None, prometheus_path=None):
+        """Grava as métricas nos arquivos indicados."""
+        if json_path:
+            with open(json_path, 'w') as output:
+                output.write(self.to_json())
+        if prometheus_path:
+            with open(prometheus_path, 'w') as output:
+                output.write(self.to_prometheus())
+
+metrics = Metrics()
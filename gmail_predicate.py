@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Filtro local (--where) aplicado aos metadados das mensagens depois da busca
+do Gmail, para critérios que a sintaxe de busca não expressa.
+
+A expressão é compilada uma única vez em funções Python; cada mensagem é
+avaliada sobre os detalhes já buscados em lote (ou lidos do índice local).
+
+Sintaxe:
+    campo operador valor, combinados com and, or, not e parênteses
+
+Campos de texto: subject, from, from_name, from_address, from_domain,
+from_org (nome do domínio registrado, ex: "paypal" em mail.paypal.com.br;
+aproximado: apenas os sufixos de SECOND_LEVEL_SUFFIXES são reconhecidos
+como sufixos de dois níveis), snippet, date, label
+Campos numéricos: size (bytes; aceita B, KB, MB, GB) e age (idade; aceita
+h, d, w, m = 30 dias, y = 365 dias)
+
+Operadores: ~ e !~ (regex, ex: /fatura|boleto/i), = e != (texto sem
+diferenciar maiúsculas), contains e !contains, < <= > >= (numéricos).
+Um valor @campo compara com outro campo da mesma mensagem.
+
+Exemplos:
+    subject ~ /^\\[ALERTA\\]/ and size > 1MB
+    age > 2y and not label = STARRED
+    from_name ~ /paypal|banco/i and from_name !contains @from_org
+"""
+
+import re
+import time
+from email.utils import parseaddr
+
+# Multiplicadores das unidades de tamanho (em bytes)
+SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+
+# Multiplicadores das unidades de idade (em segundos)
+AGE_UNITS = {'': 86400, 's': 1, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+
+# Sufixos públicos de dois níveis mais comuns (o restante é tratado como sufixo de um nível)
+SECOND_LEVEL_SUFFIXES = frozenset((
+    'com.br', 'net.br', 'org.br', 'gov.br', 'edu.br', 'co.uk', 'org.uk', 'ac.uk', 'gov.uk',
+    'com.au', 'net.au', 'org.au', 'co.nz', 'co.jp', 'ne.jp', 'or.jp', 'co.kr', 'co.in', 'co.za',
+    'co.il', 'com.ar', 'com.mx', 'com.pt', 'com.es', 'com.tr', 'com.cn', 'com.hk', 'com.sg', 'com.tw',
+))
+
+TEXT_FIELDS = ('subject', 'from', 'from_name', 'from_address', 'from_domain', 'from_org', 'snippet', 'date')
+NUMERIC_FIELDS = {'size': SIZE_UNITS, 'age': AGE_UNITS}
+
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<regex>/(?:\\.|[^/\\])*/[aimsx]*)
+      | (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+      | (?P<op>!~|~|!=|>=|<=|=|>|<|\(|\))
+      | (?P<word>[!@]?[\w.+-]+)
+    )''', re.VERBOSE)
+
+class PredicateError(ValueError):
+    """Expressão do filtro local inválida."""
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise PredicateError(f"Caractere inesperado na posição {position}: {expression[position:]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+def message_fields(details, now=None, wanted=None):
+    """
+    Calcula os campos do filtro a partir dos detalhes de uma mensagem
+    (formato de gmail_cleaner._parse_message_details).
+
+    Args:
+        wanted: Campos usados pela expressão (padrão: todos)
+    """
+    sender = details.get('from') or ''
+    internal_date = details.get('internal_date')
+    fields = {
+        'subject': details.get('subject') or '',
+        'from': sender,
+        'snippet': details.get('snippet') or '',
+        'date': details.get('date') or '',
+        'labels': [label.upper() for label in details.get('label_ids') or []],
+        'size': details.get('size_estimate'),
+        'age': (now or time.time()) - internal_date / 1000 if internal_date else None,
+    }
+    if wanted is None or any(field.startswith('from_') for field in wanted):
+        name, address = parseaddr(sender)
+        domain = address.rpartition('@')[2].lower()
+        parts = domain.split('.')
+        suffix_size = 2 if len(parts) >= 3 and '.'.join(parts[-2:]) in SECOND_LEVEL_SUFFIXES else 1
+        org = parts[-suffix_size - 1] if len(parts) > suffix_size else domain
+        fields.update(from_name=name, from_address=address.lower(), from_domain=domain, from_org=org)
+    return fields
+
+class _Parser:
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.fields = set()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise PredicateError("Expressão incompleta")
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == 'word' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        if not self.tokens:
+            raise PredicateError("Expressão vazia")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise PredicateError(f"Trecho inesperado: {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.keyword('or'):
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else (lambda fields: any(term(fields) for term in terms))
+
+    def parse_and(self):
+        terms = [self.parse_not()]
+        while self.keyword('and'):
+            terms.append(self.parse_not())
+        return terms[0] if len(terms) == 1 else (lambda fields: all(term(fields) for term in terms))
+
+    def parse_not(self):
+        if self.keyword('not'):
+            term = self.parse_not()
+            return lambda fields: not term(fields)
+        if self.peek() == ('op', '('):
+            self.take()
+            node = self.parse_or()
+            if self.take() != ('op', ')'):
+                raise PredicateError("Falta ')'")
+            return node
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, field = self.take()
+        field = field.lower() if kind == 'word' else field
+        if kind != 'word' or (field not in TEXT_FIELDS and field not in NUMERIC_FIELDS and field != 'label'):
+            raise PredicateError(f"Campo desconhecido: {field!r}")
+        self.fields.add(field)
+        kind, operator = self.take()
+        if kind == 'word' and operator.lower() in ('contains', '!contains'):
+            operator = operator.lower()
+        elif kind != 'op' or operator in ('(', ')'):
+            raise PredicateError(f"Operador inválido depois de {field!r}: {operator!r}")
+        value_kind, value = self.take()
+        if value_kind == 'word' and value.startswith('@'):
+            self.fields.add(value[1:].lower())
+
+        if field in NUMERIC_FIELDS:
+            return _numeric_comparison(field, operator, value_kind, value)
+        return _text_comparison(field, operator, value_kind, value)
+
+def _regex(value_kind, value):
+    if value_kind != 'regex':
+        return re.compile(re.escape(_literal(value_kind, value)), re.IGNORECASE)
+    body, _, flags = value[1:].rpartition('/')
+    flag_bits = 0
+    for flag in flags:
+        flag_bits |= {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE, 'a': re.ASCII}[flag]
+    try:
+        return re.compile(body, flag_bits)
+    except re.error as error:
+        raise PredicateError(f"Regex inválida {value}: {error}")
+
+def _literal(value_kind, value):
+    if value_kind == 'string':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+def _text_comparison(field, operator, value_kind, value):
+    if operator in ('~', '!~'):
+        pattern = _regex(value_kind, value)
+        if field == 'label':
+            test = lambda fields: any(pattern.search(label) for label in fields['labels'])
+        else:
+            test = lambda fields: pattern.search(fields[field]) is not None
+        return test if operator == '~' else (lambda fields: not test(fields))
+
+    if value_kind == 'word' and value.startswith('@'):
+        other = value[1:].lower()
+        if other not in TEXT_FIELDS:
+            raise PredicateError(f"Campo de texto desconhecido: {value!r}")
+        expected = lambda fields: fields[other].lower()
+    elif value_kind == 'regex':
+        raise PredicateError(f"Use ~ ou !~ para comparar com a regex {value}")
+    else:
+        literal = _literal(value_kind, value).lower()
+        expected = lambda fields: literal
+
+    if field == 'label':
+        if operator not in ('=', '!='):
+            raise PredicateError("O campo label aceita apenas =, !=, ~ e !~")
+        test = lambda fields: expected(fields).upper() in fields['labels']
+        return test if operator == '=' else (lambda fields: not test(fields))
+    if operator in ('=', '!='):
+        test = lambda fields: fields[field].lower() == expected(fields)
+        return test if operator == '=' else (lambda fields: not test(fields))
+    if operator in ('contains', '!contains'):
+        test = lambda fields: bool(expected(fields)) and expected(fields) in fields[field].lower()
+        return test if operator == 'contains' else (lambda fields: not test(fields))
+    raise PredicateError(f"Operador {operator!r} não se aplica ao campo de texto {field!r}")
+
+def _numeric_comparison(field, operator, value_kind, value):
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([a-zA-Z]*)', value) if value_kind == 'word' else None
+    units = NUMERIC_FIELDS[field]
+    if not match or match.group(2).lower() not in units:
+        raise PredicateError(f"Valor inválido para {field}: {value!r} (unidades: {', '.join(u for u in units if u)})")
+    limit = float(match.group(1)) * units[match.group(2).lower()]
+    compare = {
+        '<': lambda v: v < limit, '<=': lambda v: v <= limit,
+        '>': lambda v: v > limit, '>=': lambda v: v >= limit,
+        '=': lambda v: v == limit, '!=': lambda v: v != limit,
+    }.get(operator)
+    if compare is None:
+        raise PredicateError(f"Operador {operator!r} não se aplica ao campo numérico {field!r}")
+    return lambda fields: fields[field] is not None and compare(fields[field])
+
+def compile_predicate(expression, now=None):
+    """
+    Compila a expressão do filtro local.
+
+    Args:
+        expression: Expressão (ver a sintaxe no início do módulo)
+        now: Instante (epoch em segundos) usado para calcular a idade; padrão: agora
+
+    Returns:
+        Função predicate(detalhes) -> bool
+
+    Raises:
+        PredicateError: Se a expressão for inválida
+    """
+    now = now or time.time()
+    parser = _Parser(expression)
+    test = parser.parse()
+    return lambda details: test(message_fields(details, now, parser.fields))
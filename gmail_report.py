@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Relatório de uso da caixa (modo --report do Gmail Cleaner).
+
+Agrega os metadados das mensagens à medida que chegam, sem guardá-las:
+por remetente, domínio, label, mês e faixa de tamanho (sizeEstimate). Labels,
+meses e faixas têm poucos valores e são contados exatamente; remetentes e
+domínios usam sketches de heavy hitters (Misra-Gries ponderado) de tamanho
+fixo, que são exatos até o número de valores distintos passar da capacidade
+e depois mantêm apenas os maiores, com erro máximo conhecido.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parseaddr
+
+# Número de valores distintos mantidos por sketch de heavy hitters
+HEAVY_HITTER_CAPACITY = 5000
+
+# Limites superiores (em bytes) das faixas de tamanho das mensagens
+SIZE_BUCKETS = (
+    (10 * 1024, '< 10 KB'),
+    (100 * 1024, '10-100 KB'),
+    (1024 * 1024, '100 KB-1 MB'),
+    (10 * 1024 * 1024, '1-10 MB'),
+    (float('inf'), '> 10 MB'),
+)
+
+# Limites superiores (em dias) das faixas de idade das mensagens
+AGE_BUCKETS = (
+    (30, '< 1 mês'),
+    (365, '1 mês-1 ano'),
+    (2 * 365, '1-2 anos'),
+    (5 * 365, '2-5 anos'),
+    (float('inf'), '> 5 anos'),
+)
+
+def format_bytes(size):
+    """Formata um tamanho em bytes (ex: 1536 -> '1.5 KB')."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+class HeavyHitters:
+    """
+    Sketch Misra-Gries ponderado com [mensagens, bytes] por chave.
+
+    Mantém no máximo 2 * capacity chaves. Ao passar disso, subtrai de todas
+    o peso da (capacity + 1)-ésima maior e descarta as que zeraram; o total
+    subtraído (error) é o quanto o peso de qualquer chave pode estar
+    subestimado. Qualquer chave com mais de total / capacity do peso é
+    mantida. weight escolhe o peso: 'count' (mensagens) ou 'bytes'.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY, weight='count'):
+        self.capacity = capacity
+        self._weight = 0 if weight == 'count' else 1
+        self.counters = {}
+        self.error = 0
+
+    @property
+    def approximate(self):
+        return self.error > 0
+
+    def add(self, key, size):
+        entry = self.counters.get(key)
+        if entry is None:
+            self.counters[key] = [1, size]
+            if len(self.counters) > 2 * self.capacity:
+                self._prune()
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def _prune(self):
+        weights = sorted((entry[self._weight] for entry in self.counters.values()), reverse=True)
+        threshold = weights[self.capacity]
+        self.error += threshold
+        for key in list(self.counters):
+            entry = self.counters[key]
+            entry[self._weight] -= threshold
+            if entry[self._weight] <= 0:
+                del self.counters[key]
+
+    def top(self, n):
+        """Retorna as n maiores chaves como [(chave, mensagens, bytes)]."""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][self._weight], reverse=True)
+        return [(key, count, size) for key, (count, size) in ranked[:n]]
+
+class MailboxReport:
+    """
+    Agregador em memória constante dos metadados das mensagens.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY, now=None):
+        self.now = now or time.time()
+        self.messages = 0
+        self.bytes = 0
+        self.oldest = None
+        self.newest = None
+        self.senders = HeavyHitters(capacity, 'count')
+        self.senders_by_bytes = HeavyHitters(capacity, 'bytes')
+        self.domains = HeavyHitters(capacity, 'count')
+        self.domains_by_bytes = HeavyHitters(capacity, 'bytes')
+        self.labels = defaultdict(lambda: [0, 0])
+        self.months = defaultdict(lambda: [0, 0])
+        self.sizes = {label: [0, 0] for _, label in SIZE_BUCKETS}
+        self.ages = {label: [0, 0] for _, label in AGE_BUCKETS}
+
+    @staticmethod
+    def _bump(table, key, size):
+        entry = table[key]
+        entry[0] += 1
+        entry[1] += size
+
+    def add(self, details):
+        """
+        Agrega os detalhes de uma mensagem (formato de _parse_message_details).
+        """
+        size = details.get('size_estimate') or 0
+        self.messages += 1
+        self.bytes += size
+
+        address = (parseaddr(details.get('from') or '')[1] or details.get('from') or '?').lower()
+        domain = address.rpartition('@')[2] or '?'
+        self.senders.add(address, size)
+        self.senders_by_bytes.add(address, size)
+        self.domains.add(domain, size)
+        self.domains_by_bytes.add(domain, size)
+
+        for label in details.get('label_ids') or []:
+            self._bump(self.labels, label, size)
+
+        self._bump(self.sizes, next(label for limit, label in SIZE_BUCKETS if size < limit), size)
+
+        internal_date = details.get('internal_date')
+        if internal_date:
+            seconds = internal_date / 1000
+            self.oldest = seconds if self.oldest is None else min(self.oldest, seconds)
+            self.newest = seconds if self.newest is None else max(self.newest, seconds)
+            month = datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m')
+            self._bump(self.months, month, size)
+            age_days = (self.now - seconds) / 86400
+            self._bump(self.ages, next(label for limit, label in AGE_BUCKETS if age_days < limit), size)
+
+    def to_dict(self, top=20):
+        """
+        Retorna o relatório como um dicionário serializável em JSON.
+        """
+        def rows(entries):
+            return [{'key': key, 'messages': count, 'bytes': size} for key, count, size in entries]
+
+        def table(values):
+            return [{'key': key, 'messages': count, 'bytes': size} for key, (count, size) in values]
+
+        def sketch(hitters):
+            return {'approximate': hitters.approximate, 'max_error': hitters.error, 'top': rows(hitters.top(top))}
+
+        return {
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'oldest': self.oldest,
+            'newest': self.newest,
+            'senders_by_messages': sketch(self.senders),
+            'senders_by_bytes': sketch(self.senders_by_bytes),
+            'domains_by_messages': sketch(self.domains),
+            'domains_by_bytes': sketch(self.domains_by_bytes),
+            'labels': table(sorted(self.labels.items(), key=lambda item: item[1][1], reverse=True)),
+            'months': table(sorted(self.months.items())),
+            'sizes': table(self.sizes.items()),
+            'ages': table(self.ages.items()),
+        }
+
+    def print(self, top=20):
+        """
+        Exibe as tabelas do relatório.
+        """
+        def show(title, entries, note=''):
+            print(f"\n{title}{note}")
+            print(f"   {'mensagens':>10} {'tamanho':>10} {'%':>6}  chave")
+            for key, count, size in entries:
+                share = size / self.bytes if self.bytes else 0
+                print(f"   {count:>10} {format_bytes(size):>10} {share:>6.1%}  {key}")
+
+        def approx(hitters):
+            return f" (aproximado, erro máx. {hitters.error})" if hitters.approximate else ''
+
+        print(f"\n📊 Relatório: {self.messages} mensagens, {format_bytes(self.bytes)}")
+        if self.oldest:
+            oldest = datetime.fromtimestamp(self.oldest).strftime('%d/%m/%Y')
+            newest = datetime.fromtimestamp(self.newest).strftime('%d/%m/%Y')
+            print(f"   De {oldest} a {newest}")
+
+        show(f"👤 Top {top} remetentes por tamanho", self.senders_by_bytes.top(top),
+             approx(self.senders_by_bytes))
+        show(f"👤 Top {top} remetentes por mensagens", self.senders.top(top), approx(self.senders))
+        show(f"🌐 Top {top} domínios por tamanho", self.domains_by_bytes.top(top),
+             approx(self.domains_by_bytes))
+        show(f"🌐 Top {top} domínios por mensagens", self.domains.top(top), approx(self.domains))
+        labels = sorted(self.labels.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        show("🏷️  Labels", [(key, count, size) for key, (count, size) in labels])
+        show("📏 Tamanho das mensagens", [(key, count, size) for key, (count, size) in self.sizes.items()])
+        show("⏳ Idade das mensagens", [(key, count, size) for key, (count, size) in self.ages.items()])
+        show("📅 Mensagens por mês", [(key, count, size) for key, (count, size) in sorted(self.months.items())])
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Armazenamento local (SQLite) do Gmail Cleaner: diário de execuções para
+retomada, índice local de metadados das mensagens e estado do modo incremental.
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+
+# Arquivo SQLite padrão, criado na pasta atual
+DEFAULT_DB_PATH = 'gmail_cleaner.db'
+
+# Idade máxima (em horas) de uma entrada do índice antes de ser buscada novamente
+DEFAULT_CACHE_TTL_HOURS = 24
+
+# Tempo máximo (em segundos) de espera por um banco bloqueado por outro processo (ex: modo frota)
+DB_BUSY_TIMEOUT = 60
+
+# Número máximo de parâmetros por consulta "IN (...)"
+_SQL_CHUNK = 500
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def open_db(db_path=DEFAULT_DB_PATH, timeout=DB_BUSY_TIMEOUT):
+    """
+    Abre (e cria, se necessário) o banco SQLite do Gmail Cleaner.
+    
+    Vários processos podem gravar no mesmo banco; uma escrita espera até
+    `timeout` segundos enquanto outro processo grava.
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class RunJournal:
+    """
+    Diário de uma execução de limpeza, gravado a cada lote processado.
+
+    Guarda a query, as alterações de labels, o último nextPageToken já
+    processado e o estado de cada ID ('pending', 'done', 'failed' e, depois
+    de --undo, 'restored'), permitindo retomar com --resume e desfazer com
+    --undo.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    add_label_ids TEXT NOT NULL,
+                    remove_label_ids TEXT NOT NULL,
+                    page_token TEXT,
+                    where_expr TEXT,
+                    kind TEXT NOT NULL DEFAULT 'clean',
+                    listing_done INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS run_messages (
+                    run_id TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    PRIMARY KEY (run_id, message_id)
+                ) WITHOUT ROWID;
+            ''')
+            # Bancos criados por versões anteriores não têm as colunas mais novas
+            columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(runs)')}
+            if 'where_expr' not in columns:
+                self.conn.execute('ALTER TABLE runs ADD COLUMN where_expr TEXT')
+            if 'kind' not in columns:
+                self.conn.execute("ALTER TABLE runs ADD COLUMN kind TEXT NOT NULL DEFAULT 'clean'")
+
+    def create_run(self, query, add_label_ids, remove_label_ids, where_expr=None, kind='clean'):
+        """
+        Registra uma nova execução e retorna o seu ID.
+
+        where_expr é a expressão do filtro local (--where), reaplicada por
+        --resume. kind identifica o modo: apenas as execuções 'clean' podem
+        ser retomadas; as demais ('watch', 'threads'...) servem apenas para
+        --runs e --undo.
+        """
+        run_id = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO runs (run_id, query, add_label_ids, remove_label_ids, where_expr, kind, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, query, json.dumps(add_label_ids), json.dumps(remove_label_ids), where_expr, kind,
+                 _now(), _now())
+            )
+        return run_id
+
+    def get_run(self, run_id):
+        """
+        Retorna os dados de uma execução, ou None se não existir.
+        """
+        row = self.conn.execute('SELECT * FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run['add_label_ids'] = json.loads(run['add_label_ids'])
+        run['remove_label_ids'] = json.loads(run['remove_label_ids'])
+        return run
+
+    def _update_run(self, run_id, **fields):
+        fields['updated_at'] = _now()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.conn:
+            self.conn.execute(
+                f'UPDATE runs SET {assignments} WHERE run_id = ?',
+                (*fields.values(), run_id)
+            )
+
+    def save_page_token(self, run_id, page_token):
+        """Grava o nextPageToken a partir do qual a listagem deve continuar."""
+        self._update_run(run_id, page_token=page_token)
+
+    def add_pending(self, run_id, message_ids):
+        """Registra os IDs listados que ainda serão processados e marca a listagem como completa."""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO run_messages (run_id, message_id, status) VALUES (?, ?, ?)',
+                ((run_id, message_id, 'pending') for message_id in message_ids)
+            )
+        self._update_run(run_id, listing_done=1)
+
+    def mark_messages(self, run_id, message_ids, status):
+        """Grava o estado ('done' ou 'failed') de um lote de IDs."""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO run_messages (run_id, message_id, status) VALUES (?, ?, ?)',
+                ((run_id, message_id, status) for message_id in message_ids)
+            )
+
+    def record_chunk(self, run_id, chunk, failed_ids):
+        """Grava o resultado de um lote de batchModify."""
+        failed = set(failed_ids)
+        self.mark_messages(run_id, [message_id for message_id in chunk if message_id not in failed], 'done')
+        self.mark_messages(run_id, failed, 'failed')
+
+    def filter_unprocessed(self, run_id, message_ids):
+        """
+        Retorna os IDs (na ordem recebida) que ainda não foram processados nesta execução.
+        """
+        if not message_ids:
+            return []
+        placeholders = ','.join('?' * len(message_ids))
+        done = {
+            row[0] for row in self.conn.execute(
+                f"SELECT message_id FROM run_messages WHERE run_id = ? AND status = 'done' "
+                f"AND message_id IN ({placeholders})",
+                (run_id, *message_ids)
+            )
+        }
+        return [message_id for message_id in message_ids if message_id not in done]
+
+    def pending_ids(self, run_id):
+        """Retorna os IDs registrados que ainda não foram processados com sucesso."""
+        return self.ids_with_status(run_id, 'pending', 'failed')
+
+    def ids_with_status(self, run_id, *statuses):
+        """Retorna os IDs da execução em um dos estados indicados."""
+        placeholders = ','.join('?' * len(statuses))
+        return [
+            row[0] for row in self.conn.execute(
+                f'SELECT message_id FROM run_messages WHERE run_id = ? AND status IN ({placeholders})',
+                (run_id, *statuses)
+            )
+        ]
+
+    def recent_runs(self, limit=10):
+        """Retorna as execuções mais recentes, com o número de IDs processados."""
+        rows = self.conn.execute(
+            "SELECT r.run_id, r.query, r.kind, r.status, r.created_at, "
+            "(SELECT COUNT(*) FROM run_messages m WHERE m.run_id = r.run_id AND m.status = 'done') AS done "
+            "FROM runs r ORDER BY r.created_at DESC LIMIT ?",
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def count(self, run_id, status):
+        """Conta os IDs da execução em um determinado estado."""
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM run_messages WHERE run_id = ? AND status = ?',
+            (run_id, status)
+        ).fetchone()[0]
+
+    def finish_run(self, run_id, status='done'):
+        """Marca a execução como concluída (ou 'undone', depois de --undo)."""
+        self._update_run(run_id, status=status)
+
+class MessageIndex:
+    """
+    Índice local dos metadados das mensagens, chaveado pelo ID da mensagem.
+
+    Evita buscar novamente na API os cabeçalhos de mensagens já vistas.
+    """
+
+    COLUMNS = ('id', 'thread_id', 'label_ids', 'subject', 'sender', 'date', 'snippet',
+               'size_estimate', 'internal_date', 'history_id', 'fetched_at')
+
+    def __init__(self, conn):
+        self.conn = conn
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id TEXT PRIMARY KEY,
+                    thread_id TEXT,
+                    label_ids TEXT,
+                    subject TEXT,
+                    sender TEXT,
+                    date TEXT,
+                    snippet TEXT,
+                    size_estimate INTEGER,
+                    internal_date INTEGER,
+                    history_id TEXT,
+                    fetched_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (sender);
+                CREATE INDEX IF NOT EXISTS idx_messages_internal_date ON messages (internal_date);
+            ''')
+
+    @staticmethod
+    def _to_details(row):
+        return {
+            'id': row['id'],
+            'thread_id': row['thread_id'],
+            'label_ids': json.loads(row['label_ids'] or '[]'),
+            'subject': row['subject'],
+            'from': row['sender'],
+            'date': row['date'],
+            'snippet': row['snippet'],
+            'size_estimate': row['size_estimate'],
+            'internal_date': row['internal_date'],
+            'history_id': row['history_id'],
+        }
+
+    def get_many(self, message_ids, max_age_hours=DEFAULT_CACHE_TTL_HOURS):
+        """
+        Retorna {id: detalhes} para os IDs presentes no índice e ainda não expirados.
+        """
+        min_fetched_at = time.time() - max_age_hours * 3600
+        found = {}
+        for i in range(0, len(message_ids), _SQL_CHUNK):
+            chunk = message_ids[i:i + _SQL_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT * FROM messages WHERE fetched_at >= ? AND id IN ({placeholders})',
+                (min_fetched_at, *chunk)
+            )
+            for row in rows:
+                found[row['id']] = self._to_details(row)
+        return found
+
+    def upsert_many(self, details_list):
+        """Grava (ou atualiza) os detalhes de várias mensagens."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO messages ({", ".join(self.COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(self.COLUMNS))})',
+                (
+                    (
+                        details['id'], details.get('thread_id'), json.dumps(details.get('label_ids', [])),
+                        details.get('subject'), details.get('from'), details.get('date'),
+                        details.get('snippet'), details.get('size_estimate'),
+                        details.get('internal_date'), details.get('history_id'), now
+                    )
+                    for details in details_list
+                )
+            )
+
+    def delete_many(self, message_ids):
+        """Remove mensagens do índice (ex: após deleção permanente)."""
+        with self.conn:
+            self.conn.executemany('DELETE FROM messages WHERE id = ?', ((message_id,) for message_id in message_ids))
+
+class SyncState:
+    """
+    Último historyId da caixa processado por cada query (modo --incremental),
+    com o ID da execução que o gravou.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    query TEXT PRIMARY KEY,
+                    history_id TEXT NOT NULL,
+                    synced_at REAL NOT NULL,
+                    run_id TEXT
+                )
+            ''')
+            # Bancos criados por versões anteriores não têm a coluna run_id
+            columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(sync_state)')}
+            if 'run_id' not in columns:
+                self.conn.execute('ALTER TABLE sync_state ADD COLUMN run_id TEXT')
+
+    def get(self, query):
+        """Retorna {'history_id', 'synced_at', 'run_id'} da última execução da query, ou None."""
+        row = self.conn.execute(
+            'SELECT history_id, synced_at, run_id FROM sync_state WHERE query = ?', (query,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save(self, query, history_id, run_id=None):
+        """
+        Grava o historyId a partir do qual a próxima execução da query continua
+        e a execução (do diário) que alterou as mensagens, se houver.
+        """
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sync_state (query, history_id, synced_at, run_id) VALUES (?, ?, ?, ?)',
+                (query, str(history_id), time.time(), run_id)
+            )
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Transportes HTTP usados pelos serviços Gmail do Gmail Cleaner.
+
+- httplib2 (padrão): cada serviço (um por worker) mantém a sua própria
+  conexão keep-alive.
+- httpx: um único pool de conexões keep-alive, compartilhado por todos os
+  workers e dimensionado por pool_size.
+- http2: httpx com HTTP/2, multiplexando as requisições simultâneas em
+  poucas conexões TLS.
+
+Todos pedem respostas compactadas com gzip (a Gmail API exige
+Accept-Encoding e um User-Agent contendo "gzip") e registram nas métricas o
+status, os bytes (antes e depois da descompactação) e se a conexão foi
+reaproveitada. Os modos httpx e http2 requerem o pacote opcional httpx
+(pip install httpx; para HTTP/2: pip install 'httpx[http2]').
+"""
+
+import atexit
+import threading
+
+import httplib2
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from gmail_metrics import metrics, current_call
+
+# Transportes disponíveis
+TRANSPORTS = ('httplib2', 'httpx', 'http2')
+
+# Transporte padrão
+DEFAULT_TRANSPORT = 'httplib2'
+
+# Tamanho padrão do pool de conexões compartilhado (httpx/http2)
+DEFAULT_POOL_SIZE = 10
+
+# Tempo máximo (em segundos) de uma requisição no pool compartilhado
+REQUEST_TIMEOUT = 60
+
+_transport = DEFAULT_TRANSPORT
+_pool_size = DEFAULT_POOL_SIZE
+_shared_client = None
+_client_lock = threading.Lock()
+
+def _with_gzip(headers):
+    """Retorna uma cópia dos cabeçalhos que pede a resposta compactada com gzip."""
+    headers = dict(headers or {})
+    names = {name.lower(): name for name in headers}
+    if 'accept-encoding' not in names:
+        headers['accept-encoding'] = 'gzip, deflate'
+    user_agent_name = names.get('user-agent', 'user-agent')
+    user_agent = headers.get(user_agent_name, '')
+    if 'gzip' not in user_agent:
+        headers[user_agent_name] = f'{user_agent} (gzip)'.strip()
+    return headers
+
+def _record(status, body, content, wire_bytes, reused):
+    method = getattr(current_call, 'method', 'other')
+    metrics.record_http(method, status, len(body) if body else 0, len(content) if content else 0, wire_bytes)
+    metrics.increment('http_connections_reused' if reused else 'http_connections_opened')
+
+class InstrumentedHttp(httplib2.Http):
+    """
+    httplib2.Http que registra status, bytes e reaproveitamento de conexão
+    de cada resposta no método da API em execução.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wire_bytes = 0
+
+    def _conn_request(self, conn, request_uri, method, body, headers):
+        # Conta os bytes lidos do socket (antes da descompactação feita pelo httplib2)
+        getresponse = conn.getresponse
+
+        def counting_getresponse():
+            response = getresponse()
+            read = response.read
+
+            def counting_read(*args):
+                data = read(*args)
+                self._wire_bytes += len(data)
+                return data
+
+            response.read = counting_read
+            return response
+
+        conn.getresponse = counting_getresponse
+        try:
+            return super()._conn_request(conn, request_uri, method, body, headers)
+        finally:
+            del conn.getresponse
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        scheme, authority, _, _ = httplib2.urlnorm(uri)
+        connection = self.connections.get(f'{scheme}:{authority}')
+        reused = connection is not None and connection.sock is not None
+        self._wire_bytes = 0
+        response, content = super().request(uri, method, body, _with_gzip(headers), *args, **kwargs)
+        _record(response.status, body, content, self._wire_bytes, reused)
+        return response, content
+
+class HttpxTransport:
+    """
+    Adaptador com a interface de httplib2.Http.request sobre um httpx.Client
+    compartilhado (thread-safe) entre todos os serviços.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5,
+                connection_type=None, **kwargs):
+        opened = []
+
+        def trace(event_name, info):
+            if event_name == 'connection.connect_tcp.complete':
+                opened.append(event_name)
+
+        try:
+            response = self.client.request(method, uri, content=body, headers=_with_gzip(headers),
+                                           extensions={'trace': trace})
+        except httpx.TransportError as error:
+            # Mesmo tipo de erro de rede que googleapiclient trata com httplib2
+            raise ConnectionError(str(error)) from error
+
+        # Como o httplib2, entrega o corpo já descompactado
+        info = {name: value for name, value in response.headers.items()
+                if name not in ('content-encoding', 'content-length')}
+        info['status'] = str(response.status_code)
+        result = httplib2.Response(info)
+        result.reason = response.reason_phrase
+        result.version = 20 if response.http_version == 'HTTP/2' else 11
+        _record(response.status_code, body, response.content, response.num_bytes_downloaded, reused=not opened)
+        return result, response.content
+
+def configure(transport=DEFAULT_TRANSPORT, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Define o transporte usado pelos serviços criados a partir de agora.
+
+    Args:
+        transport: 'httplib2', 'httpx' ou 'http2'
+        pool_size: Número máximo de conexões do pool compartilhado (httpx/http2)
+    """
+    global _transport, _pool_size
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Transporte desconhecido: {transport}")
+    if transport != 'httplib2' and httpx is None:
+        raise RuntimeError("O transporte httpx requer o pacote httpx: pip install 'httpx[http2]'")
+    _transport = transport
+    _pool_size = max(1, pool_size)
+
+def _get_shared_client():
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            limits = httpx.Limits(max_connections=_pool_size, max_keepalive_connections=_pool_size)
+            try:
+                _shared_client = httpx.Client(http2=_transport == 'http2', limits=limits,
+                                              timeout=REQUEST_TIMEOUT, follow_redirects=True)
+            except ImportError:
+                raise RuntimeError("O modo HTTP/2 requer o pacote h2: pip install 'httpx[http2]'")
+            atexit.register(_shared_client.close)
+        return _shared_client
+
+def create_http():
+    """
+    Cria o objeto HTTP (interface httplib2) de um novo serviço Gmail.
+    """
+    if _transport == 'httplib2':
+        return InstrumentedHttp()
+    return HttpxTransport(_get_shared_client())
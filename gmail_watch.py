@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Fontes de notificação do modo daemon (--watch) do Gmail Cleaner.
+
+O daemon chama subscriber.wait() em laço e, a cada retorno, verifica o
+historyId da caixa e processa as mensagens novas. Qualquer objeto com os
+métodos wait(), notify(), stop() e close() pode ser usado como fonte:
+
+- PollingSubscriber (padrão): acorda a cada `interval` segundos.
+- LocalPushSubscriber: servidor HTTP local que acorda o daemon a cada POST
+  recebido, no formato das notificações push do Cloud Pub/Sub (ou com o
+  corpo vazio). Pode receber as notificações de uma assinatura push atrás de
+  um proxy reverso, ou de um script local que repasse uma assinatura pull
+  (ex: gcloud pubsub subscriptions pull). O intervalo de polling continua
+  valendo como garantia, caso alguma notificação se perca.
+"""
+
+import json
+import base64
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Intervalo padrão (em segundos) entre as verificações do modo polling
+DEFAULT_POLL_INTERVAL = 10
+
+# Intervalo (em segundos) das verificações de garantia quando há notificações push
+PUSH_FALLBACK_INTERVAL = 300
+
+class PollingSubscriber:
+    """
+    Fonte de notificação por polling: acorda o daemon a cada `interval`
+    segundos, ou antes disso se notify() for chamado.
+    """
+
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self.stopped = False
+        self.last_history_id = None
+        self._event = threading.Event()
+
+    def wait(self):
+        """
+        Bloqueia até a próxima verificação.
+
+        Returns:
+            False se o daemon deve parar
+        """
+        self._event.wait(self.interval)
+        self._event.clear()
+        return not self.stopped
+
+    def notify(self, history_id=None):
+        """Antecipa a próxima verificação (ex: uma notificação recebida)."""
+        if history_id is not None:
+            self.last_history_id = history_id
+        self._event.set()
+
+    def stop(self):
+        """Pede a parada do daemon (ex: SIGTERM)."""
+        self.stopped = True
+        self._event.set()
+
+    def close(self):
+        """Libera os recursos da fonte."""
+
+    def describe(self):
+        return f"polling a cada {self.interval:g}s"
+
+def _parse_push_history_id(body):
+    # Notificação push do Pub/Sub: {"message": {"data": base64({"emailAddress", "historyId"})}}
+    try:
+        data = json.loads(body)['message']['data']
+        return json.loads(base64.b64decode(data)).get('historyId')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+class LocalPushSubscriber(PollingSubscriber):
+    """
+    Fonte de notificação push: servidor HTTP local que acorda o daemon a cada
+    POST recebido.
+    """
+
+    def __init__(self, port, host='127.0.0.1', interval=PUSH_FALLBACK_INTERVAL):
+        super().__init__(interval)
+        subscriber = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                subscriber.notify(_parse_push_history_id(body))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = f"http://{host}:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def describe(self):
+        return f"notificações push em {self.address} (verificação de garantia a cada {self.interval:g}s)"
+
+def create_subscriber(push_port=None, interval=None, host='127.0.0.1'):
+    """
+    Cria a fonte de notificação do daemon.
+
+    Args:
+        push_port: Porta do servidor local de notificações push (None = polling)
+        interval: Intervalo entre as verificações (padrão depende da fonte)
+        host: Endereço em que o servidor de notificações escuta
+
+    Returns:
+        PollingSubscriber ou LocalPushSubscriber
+    """
+    if push_port is None:
+        return PollingSubscriber(interval or DEFAULT_POLL_INTERVAL)
+    return LocalPushSubscriber(push_port, host, interval or PUSH_FALLBACK_INTERVAL)
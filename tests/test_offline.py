@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Testes offline do Gmail Cleaner contra a Gmail API falsa (fake_gmail_server.py).
+
+Cobrem os caminhos mais arriscados: o filtro local (--where), --resume,
+--undo, o modo incremental e a divisão dos lotes do batchDelete. Cada teste
+usa uma caixa sintética nova e um banco SQLite temporário; nenhum acessa a
+rede nem exige credenciais.
+
+Uso:
+    python -m unittest discover tests
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gmail_cleaner
+from fake_gmail_server import FakeGmailApi, FakeMailbox, start_fake_server
+from gmail_predicate import PredicateError, compile_predicate, message_fields
+from gmail_store import open_db, RunJournal, SyncState
+
+def quiet():
+    """Descarta a saída (emojis e progresso) do gmail_cleaner."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+class PredicateTest(unittest.TestCase):
+
+    def test_from_org_strips_only_known_suffixes(self):
+        for domain, org in (('email.ups.com', 'ups'), ('mail.aol.com', 'aol'), ('news.bbc.com', 'bbc'),
+                            ('mail.paypal.com.br', 'paypal'), ('bbc.co.uk', 'bbc'), ('localhost', 'localhost')):
+            with self.subTest(domain=domain):
+                self.assertEqual(message_fields({'from': f'X <x@{domain}>'})['from_org'], org)
+
+    def test_operators_and_boolean_logic(self):
+        details = {'subject': 'Sua Fatura de Maio', 'from': 'PayPal <no-reply@mail.paypal.com.br>',
+                   'size_estimate': 2 * 1024 ** 2, 'label_ids': ['INBOX'], 'internal_date': 1000}
+        self.assertTrue(compile_predicate('subject ~ /fatura/i and size > 1MB')(details))
+        self.assertFalse(compile_predicate('subject ~ /fatura/ and size > 1MB')(details))
+        self.assertTrue(compile_predicate('not label = STARRED and (size < 1KB or age > 1y)')(details))
+        self.assertTrue(compile_predicate('from_domain = mail.paypal.com.br')(details))
+
+    def test_field_reference(self):
+        predicate = compile_predicate('from_name ~ /paypal/i and from_name !contains @from_org')
+        self.assertFalse(predicate({'from': 'PayPal <x@paypal.com>'}))
+        self.assertTrue(predicate({'from': 'PayPal <x@phish.example>'}))
+
+    def test_invalid_expressions(self):
+        for expression in ('size >', 'unknown = 1', 'subject ~ /(/', 'size > banana', '(subject = a'):
+            with self.subTest(expression=expression):
+                with self.assertRaises(PredicateError):
+                    compile_predicate(expression)
+
+class FakeServerTestCase(unittest.TestCase):
+    """
+    Sobe uma Gmail API falsa com uma caixa sintética nova para cada teste.
+    """
+
+    MESSAGES = 2000
+
+    def setUp(self):
+        self.api = FakeGmailApi(FakeMailbox(self.MESSAGES))
+        self.server, url = start_fake_server(self.api)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # O documento de descoberta guarda a URL raiz: é refeito para cada servidor
+        for name, value in (('API_ROOT_URL', url), ('_discovery_document', None)):
+            patcher = mock.patch.object(gmail_cleaner, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(gmail_cleaner.rate_limiter, 'units_per_second', 10 ** 9)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.conn = open_db(os.path.join(temp_dir.name, 'gmail_cleaner.db'))
+        self.addCleanup(self.conn.close)
+        self.journal = RunJournal(self.conn)
+
+        self.creds = gmail_cleaner.load_credentials()
+        self.service = gmail_cleaner.build_service(self.creds)
+
+    def list_ids(self, query):
+        with quiet():
+            return [msg['id'] for msg in gmail_cleaner.search_messages(self.service, query, get_all=True)]
+
+    def trashed_ids(self):
+        return {FakeMailbox.message_id(index) for index in self.api.mailbox.trashed}
+
+class ResumeUndoTest(FakeServerTestCase):
+
+    def test_resume_processes_only_pending_ids(self):
+        message_ids = self.list_ids('from:domain1')
+        run_id = self.journal.create_run('from:domain1', ['TRASH'], [])
+        self.journal.add_pending(run_id, message_ids)
+        record = lambda chunk, failed: self.journal.record_chunk(run_id, chunk, failed)
+        with quiet():
+            gmail_cleaner.bulk_modify_messages(self.service, message_ids[:100], ['TRASH'], [], on_chunk=record)
+        self.assertEqual(len(self.journal.pending_ids(run_id)), len(message_ids) - 100)
+
+        with quiet(), mock.patch('builtins.input', return_value='SIM'):
+            processed = gmail_cleaner.resume_run(self.service, self.creds, self.journal, run_id)
+
+        self.assertEqual(processed, len(message_ids) - 100)
+        self.assertEqual(self.journal.pending_ids(run_id), [])
+        self.assertEqual(self.trashed_ids(), set(message_ids))
+
+    def test_resume_refuses_watch_runs(self):
+        run_id = self.journal.create_run('from:domain1', ['TRASH'], [], kind='watch')
+        with quiet(), mock.patch('builtins.input', return_value='SIM'):
+            processed = gmail_cleaner.resume_run(self.service, self.creds, self.journal, run_id)
+        self.assertEqual(processed, 0)
+        self.assertEqual(self.trashed_ids(), set())
+
+    def test_undo_restores_trashed_and_archived_messages(self):
+        message_ids = self.list_ids('in:inbox from:domain2')
+        run_id = self.journal.create_run('in:inbox from:domain2', ['TRASH'], ['INBOX'])
+        self.journal.add_pending(run_id, message_ids)
+        with quiet():
+            gmail_cleaner.bulk_modify_messages(
+                self.service, message_ids, ['TRASH'], ['INBOX'],
+                on_chunk=lambda chunk, failed: self.journal.record_chunk(run_id, chunk, failed)
+            )
+        self.assertEqual(self.trashed_ids(), set(message_ids))
+
+        with quiet():
+            restored, failed_ids = gmail_cleaner.restore_run_messages(self.service, self.journal, run_id)
+
+        self.assertEqual((restored, failed_ids), (len(message_ids), []))
+        self.assertEqual(self.trashed_ids(), set())
+        self.assertEqual(sorted(self.list_ids('in:inbox from:domain2')), sorted(message_ids))
+
+class IncrementalTest(FakeServerTestCase):
+
+    QUERY = 'in:inbox from:domain1'
+
+    def run_incremental(self, sync_state):
+        """Uma execução --incremental --archive; retorna os IDs que ela alterou."""
+        with quiet():
+            messages, history_id = gmail_cleaner.search_messages_incremental(
+                self.service, self.QUERY, sync_state, self.journal
+            )
+        message_ids = [msg['id'] for msg in messages]
+        run_id = None
+        if message_ids:
+            run_id = self.journal.create_run(self.QUERY, [], ['INBOX'])
+            self.journal.add_pending(run_id, message_ids)
+            with quiet():
+                gmail_cleaner.bulk_modify_messages(
+                    self.service, message_ids, [], ['INBOX'],
+                    on_chunk=lambda chunk, failed: self.journal.record_chunk(run_id, chunk, failed)
+                )
+        sync_state.save(self.QUERY, history_id, run_id)
+        return message_ids
+
+    def test_own_changes_are_not_reprocessed(self):
+        sync_state = SyncState(self.conn)
+        first = self.run_incremental(sync_state)
+        self.assertTrue(first)
+        self.assertEqual(self.run_incremental(sync_state), [])
+
+    def test_new_and_relabelled_messages_are_found(self):
+        sync_state = SyncState(self.conn)
+        archived = self.run_incremental(sync_state)
+
+        old_id = archived[-1]
+        self.api.mailbox.modify(int(old_id, 16), ['INBOX'])
+        self.api.mailbox.add_messages(50)
+        expected = set(self.list_ids(self.QUERY))
+
+        self.assertEqual(set(self.run_incremental(sync_state)), expected)
+        self.assertIn(old_id, expected)
+        self.assertEqual(self.list_ids(self.QUERY), [])
+
+    def test_date_windows_are_bounded(self):
+        self.assertEqual(gmail_cleaner._date_windows([5, 0, 10, 11, 1000], max_windows=2), [(0, 12), (1000, 1001)])
+        self.assertEqual(len(gmail_cleaner._date_windows(range(0, 100000, 7), max_windows=8)), 8)
+
+class BatchDeleteTest(FakeServerTestCase):
+
+    def test_invalid_ids_are_isolated(self):
+        message_ids = self.list_ids('from:domain3')[:300]
+        unknown_id = FakeMailbox.message_id(10 ** 9)
+        chunk = message_ids[:150] + [unknown_id] + message_ids[150:]
+
+        deleted, failed_ids, error = gmail_cleaner._batch_delete_chunk(self.service, chunk)
+
+        self.assertEqual((deleted, failed_ids, error.resp.status), (len(message_ids), [unknown_id], 404))
+        self.assertFalse(set(message_ids) & set(self.list_ids('')))
+
+    def test_persistent_server_errors_are_not_bisected(self):
+        message_ids = self.list_ids('')[:1000]
+        self.api.error_rate = 1.0
+        requests_before = self.api.request_count
+
+        with quiet(), mock.patch.object(gmail_cleaner, '_backoff_delay', return_value=0):
+            deleted, failed_ids, error = gmail_cleaner._batch_delete_chunk(self.service, message_ids)
+
+        self.assertEqual((deleted, len(failed_ids), error.resp.status), (0, 1000, 503))
+        self.assertLessEqual(self.api.request_count - requests_before, gmail_cleaner.MAX_RETRIES + 1)
+
+if __name__ == '__main__':
+    unittest.main()